@@ -1,14 +1,22 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import os
-from litellm import Router
+import asyncio
+import threading
 from dotenv import load_dotenv
 import json
 from datetime import datetime
 import logging
-from drug_fibrosis_agent.agent import evaluate_drug
+from contextlib import asynccontextmanager
+from drug_fibrosis_agent.agent import FibrosisEvaluator, aclose_transport, get_evaluator
+from drug_fibrosis_agent.metrics import default_metrics, enable_otel
+from drug_fibrosis_agent.routing import Backend, HedgedRouter
+from drug_fibrosis_agent.usage import (
+    UsageAccumulator, cost_of, requests_from_events, set_default_usage, usage_from_events,
+)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -17,8 +25,41 @@ logger = logging.getLogger(__name__)
 # Load environment variables from current directory
 load_dotenv(".env")
 
+# LLM usage per model, endpoint and screen.  With USAGE_DB_PATH set it is
+# flushed to that SQLite file in the background every USAGE_FLUSH_INTERVAL
+# seconds and on shutdown; otherwise it lives only in this process.
+usage = UsageAccumulator(os.getenv("USAGE_DB_PATH"))
+set_default_usage(usage)
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "60"))
+
+async def flush_usage_periodically():
+    while True:
+        await asyncio.sleep(USAGE_FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(usage.flush)
+        except Exception as e:
+            logger.error(f"Flushing usage to {usage.path} failed: {e}")
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Trace events become OpenTelemetry spans when asked for and installed
+    if os.getenv("FIBROSIS_OTEL", "").lower() in ("1", "true", "yes"):
+        if not enable_otel():
+            logger.warning("FIBROSIS_OTEL is set but opentelemetry is not installed")
+    flusher = asyncio.create_task(flush_usage_periodically())
+    # build the LLM routers and the fibrosis evaluator off the event loop
+    # while the app starts serving
+    warm = [asyncio.create_task(asyncio.to_thread(f)) for f in (warm_routers, warm_evaluator)]
+    yield
+    for task in warm:
+        task.cancel()
+    flusher.cancel()
+    await asyncio.to_thread(usage.close)
+    # Release the pooled PubChem connections shared by every request
+    await aclose_transport()
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware with more specific configuration
 app.add_middleware(
@@ -31,14 +72,11 @@ app.add_middleware(
     max_age=600,  # Cache preflight requests for 10 minutes
 )
 
-# Modal Configuration (Primary)
+# Modal Configuration (Primary).  A missing key only disables the Modal
+# endpoints (503), so the app still starts and serves the analysis routes.
 MODAL_API_KEY = os.getenv("MODAL_API_KEY")
 if not MODAL_API_KEY:
-    raise ValueError("MODAL_API_KEY not found in environment variables")
-
-# Modal pricing (per 1M tokens)
-MODAL_INPUT_COST_PER_MILLION = 0.25  # $0.25 per 1M input tokens
-MODAL_OUTPUT_COST_PER_MILLION = 0.25  # $0.25 per 1M output tokens
+    logger.warning("MODAL_API_KEY not found in environment variables; Modal endpoints disabled")
 
 MODAL_CONFIG = {
     "model_list": [
@@ -56,24 +94,98 @@ MODAL_MODEL_NAME = "llama3.1-modal"
 
 # OpenAI Configuration (Fallback)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if OPENAI_API_KEY:
-    OPENAI_CONFIG = {
-        "model_list": [
-            {
-                "model_name": "gpt-4o-mini",
-                "litellm_params": {
-                    "model": "gpt-4o-mini",
-                    "api_key": OPENAI_API_KEY,
-                },
-            }
-        ]
-    }
-    OPENAI_MODEL_NAME = "gpt-4o-mini"
+OPENAI_CONFIG = {
+    "model_list": [
+        {
+            "model_name": "gpt-4o-mini",
+            "litellm_params": {
+                "model": "gpt-4o-mini",
+                "api_key": OPENAI_API_KEY,
+            },
+        }
+    ]
+}
+OPENAI_MODEL_NAME = "gpt-4o-mini"
+
+# litellm and its routers are heavy to import and build, so each router is
+# built on first use (or by the warm-up started with the app) rather than
+# when this module is imported.
+ROUTER_CONFIGS = {"modal": (MODAL_API_KEY, MODAL_CONFIG), "openai": (OPENAI_API_KEY, OPENAI_CONFIG)}
+LITELLM_VERBOSE = os.getenv("LITELLM_VERBOSE", "").lower() in ("1", "true", "yes")
+_routers: Dict[str, Any] = {}
+_routers_lock = threading.Lock()
+
+def get_router(name: str):
+    """The litellm Router for ``name`` ("modal" or "openai"), built once."""
+    router = _routers.get(name)
+    if router is not None:
+        return router
+    api_key, config = ROUTER_CONFIGS[name]
+    if not api_key:
+        raise HTTPException(status_code=503, detail=f"{name.capitalize()} service not configured")
+    with _routers_lock:
+        if name not in _routers:
+            from litellm import Router
+            _routers[name] = Router(model_list=config["model_list"], set_verbose=LITELLM_VERBOSE)
+        return _routers[name]
+
+async def aget_router(name: str):
+    """get_router for request handlers: a router that is not built yet (the
+    warm-up may still be running) is built in a thread, since importing
+    litellm and waiting on the build lock would stall the event loop."""
+    router = _routers.get(name)
+    if router is not None:
+        return router
+    return await asyncio.to_thread(get_router, name)
+
+def warm_routers():
+    for name, (api_key, _config) in ROUTER_CONFIGS.items():
+        if api_key:
+            try:
+                get_router(name)
+            except Exception as e:  # retried on the first request
+                logger.error(f"Building the {name} router failed: {e}")
 
-# Initialize routers with cost tracking
-modal_router = Router(model_list=MODAL_CONFIG["model_list"], set_verbose=True)
-if OPENAI_API_KEY:
-    openai_router = Router(model_list=OPENAI_CONFIG["model_list"], set_verbose=True)
+# The fibrosis evaluator imports langchain_openai and langgraph, compiles the
+# graph and opens the verdict cache when it is first built, so that happens
+# in the startup thread (or in a thread on the first request), never on the
+# event loop.
+_evaluator: Optional[FibrosisEvaluator] = None
+
+def warm_evaluator():
+    global _evaluator
+    try:
+        _evaluator = get_evaluator()
+    except Exception as e:  # retried on the first request
+        logger.error(f"Building the fibrosis evaluator failed: {e}")
+
+async def aget_evaluator() -> FibrosisEvaluator:
+    """get_evaluator for request handlers, built in a thread if the warm-up
+    has not finished yet."""
+    global _evaluator
+    if _evaluator is None:
+        _evaluator = await asyncio.to_thread(get_evaluator)
+    return _evaluator
+
+def _router_backend(name: str, model: str) -> Backend:
+    async def call(messages: List[Dict[str, str]]):
+        router = await aget_router(name)
+        return await router.acompletion(model=model, messages=messages)
+    return Backend(name, call)
+
+# /completion: Modal first; once it runs past its own recent p95 (or the
+# initial deadline while cold), the same request is hedged on OpenAI and
+# whichever answers first wins.  Only services with a key take part; with
+# none, /completion answers 503.
+COMPLETION_MODELS = {
+    name: model
+    for name, model in (("modal", MODAL_MODEL_NAME), ("openai", OPENAI_MODEL_NAME))
+    if ROUTER_CONFIGS[name][0]
+}
+completion_router = HedgedRouter(
+    [_router_backend(name, model) for name, model in COMPLETION_MODELS.items()],
+    initial_deadline=float(os.getenv("LLM_HEDGE_INITIAL_DEADLINE", "10")),
+) if COMPLETION_MODELS else None
 
 class Message(BaseModel):
     role: str
@@ -90,33 +202,27 @@ class CostResponse(BaseModel):
 
 class DrugAnalysisRequest(BaseModel):
     drug_name: str
+    # groups the compounds of one screening run in /usage
+    screen: Optional[str] = None
 
-def calculate_modal_cost(usage: Dict[str, int]) -> float:
-    """Calculate cost based on Modal's pricing model."""
-    input_cost = (usage.get("prompt_tokens", 0) / 1_000_000) * MODAL_INPUT_COST_PER_MILLION
-    output_cost = (usage.get("completion_tokens", 0) / 1_000_000) * MODAL_OUTPUT_COST_PER_MILLION
-    return input_cost + output_cost
-
-def log_cost_info(response: Any, model_name: str):
-    """Log cost information from the response."""
+def log_cost_info(response: Any, model_name: str, endpoint: str):
+    """Price the response for its own model, record it in /usage and log it."""
     try:
-        # Calculate cost based on usage for Modal
-        cost = calculate_modal_cost(response.usage)
-        usage = response.usage
-        timestamp = datetime.now().isoformat()
-        
+        tokens = response.usage
+        details = getattr(tokens, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or 0
+        usage.record(model_name, endpoint, tokens.prompt_tokens, tokens.completion_tokens, cached)
         cost_info = {
-            "cost": cost,
+            "cost": cost_of(model_name, tokens.prompt_tokens, tokens.completion_tokens, cached),
             "model": model_name,
-            "timestamp": timestamp,
+            "timestamp": datetime.now().isoformat(),
             "usage": {
-                "prompt_tokens": usage.prompt_tokens,
-                "completion_tokens": usage.completion_tokens,
-                "total_tokens": usage.total_tokens
+                "prompt_tokens": tokens.prompt_tokens,
+                "completion_tokens": tokens.completion_tokens,
+                "total_tokens": tokens.total_tokens
             }
         }
-        
-        logger.info(f"Cost information: {json.dumps(cost_info, indent=2)}")
+        logger.debug(f"Cost information: {json.dumps(cost_info)}")
         return cost_info
     except Exception as e:
         logger.error(f"Error logging cost info: {str(e)}")
@@ -124,29 +230,39 @@ def log_cost_info(response: Any, model_name: str):
 
 @app.post("/completion")
 async def get_completion(request: CompletionRequest):
-    """Default endpoint that uses Modal's model"""
+    """Default endpoint: Modal's model, hedged on OpenAI when Modal is slow"""
+    if completion_router is None:
+        raise HTTPException(status_code=503, detail="No completion service configured")
     try:
-        response = await modal_router.acompletion(
-            model=MODAL_MODEL_NAME,
+        routed = await completion_router.acompletion(
             messages=[{"role": msg.role, "content": msg.content} for msg in request.messages],
         )
-        cost_info = log_cost_info(response, MODAL_MODEL_NAME)
+        logger.info(f"Completion served by {routed.backend} "
+                    f"(hedged={routed.hedged}) in {routed.latency:.2f}s")
+        default_metrics().observe("llm_completion_duration_seconds", routed.latency,
+                                  backend=routed.backend, hedged=routed.hedged)
+        cost_info = log_cost_info(routed.response, COMPLETION_MODELS[routed.backend], "/completion")
         return {
-            "response": response,
-            "cost_info": cost_info
+            "response": routed.response,
+            "cost_info": cost_info,
+            "backend": routed.backend,
+            "hedged": routed.hedged,
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/modal/completion")
 async def get_modal_completion(request: CompletionRequest):
     """Explicit Modal endpoint"""
+    router = await aget_router("modal")
     try:
-        response = await modal_router.acompletion(
+        response = await router.acompletion(
             model=MODAL_MODEL_NAME,
             messages=[{"role": msg.role, "content": msg.content} for msg in request.messages],
         )
-        cost_info = log_cost_info(response, MODAL_MODEL_NAME)
+        cost_info = log_cost_info(response, MODAL_MODEL_NAME, "/modal/completion")
         return {
             "response": response,
             "cost_info": cost_info
@@ -157,14 +273,13 @@ async def get_modal_completion(request: CompletionRequest):
 @app.post("/openai/completion")
 async def get_openai_completion(request: CompletionRequest):
     """OpenAI fallback endpoint"""
-    if not OPENAI_API_KEY:
-        raise HTTPException(status_code=503, detail="OpenAI service not configured")
+    router = await aget_router("openai")
     try:
-        response = await openai_router.acompletion(
+        response = await router.acompletion(
             model=OPENAI_MODEL_NAME,
             messages=[{"role": msg.role, "content": msg.content} for msg in request.messages],
         )
-        cost_info = log_cost_info(response, OPENAI_MODEL_NAME)
+        cost_info = log_cost_info(response, OPENAI_MODEL_NAME, "/openai/completion")
         return {
             "response": response,
             "cost_info": cost_info
@@ -176,17 +291,78 @@ async def get_openai_completion(request: CompletionRequest):
 async def analyze_fibrosis(request: DrugAnalysisRequest):
     """Analyze a drug's effect on cardiac fibrosis using LangChain agent"""
     try:
-        result = evaluate_drug(request.drug_name)
+        evaluator = await aget_evaluator()
+        result = await evaluator.aevaluate(request.drug_name)
+        spent = record_analysis_usage(evaluator, result, "/analyze_fibrosis", request.screen)
         return {
             "conclusion": result["conclusion"],
             "rationale": result["rationale"],
             "tool_trace": result["tool_trace"],
             "relevance": result["relevance"],
             "confidence": result["confidence"],
+            "trace_events": result["trace_events"],
+            "usage": spent,
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def record_analysis_usage(evaluator: FibrosisEvaluator, result: Dict[str, Any],
+                          endpoint: str, screen: Optional[str]) -> Dict[str, int]:
+    """Record the tokens and LLM requests this analysis spent (none when
+    served from a cache or settled without the model), under the model of
+    the ``evaluator`` that served it."""
+    events = result.get("trace_events", [])
+    spent = usage_from_events(events)
+    model = getattr(evaluator.llm, "model_name", None) or "unknown"
+    usage.record(model, endpoint, compounds=1, screen=screen,
+                 requests=requests_from_events(events), **spent)
+    return spent
+
+@app.get("/usage")
+async def get_usage(since: Optional[float] = None, screen: Optional[str] = None):
+    """LLM requests, tokens, tokens/sec and cost over the last ``since``
+    seconds (all retained windows by default), in total and per model,
+    endpoint and screen."""
+    return await asyncio.to_thread(usage.snapshot, since, screen)
+
+@app.get("/metrics")
+async def metrics():
+    """Node, PubChem and LLM metrics in the Prometheus text format."""
+    return PlainTextResponse(
+        default_metrics().render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+def sse_event(event: str, data: Any) -> str:
+    """One server-sent event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@app.get("/analyze_fibrosis/stream")
+async def analyze_fibrosis_stream(drug_name: str, screen: Optional[str] = None):
+    """Same analysis as /analyze_fibrosis, streamed as server-sent events.
+
+    Events: cid, record (one per PubChem record), brief, token (LLM output
+    as it is generated), verdict, then result with the /analyze_fibrosis
+    payload -- or error if the analysis fails part way.
+    """
+    async def events():
+        try:
+            evaluator = await aget_evaluator()
+            async for event in evaluator.astream(drug_name):
+                if event["event"] == "result":
+                    record_analysis_usage(evaluator, event["data"],
+                                          "/analyze_fibrosis/stream", screen)
+                yield sse_event(event["event"], event["data"])
+        except Exception as e:
+            logger.error(f"Streaming analysis of {drug_name} failed: {e}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
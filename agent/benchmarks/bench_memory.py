@@ -0,0 +1,158 @@
+"""
+Memory benchmark: peak RSS of overlapping evaluations with large PubChem
+records, carrying the raw records through the graph state (the layout
+before CompoundBrief) against keeping only the brief.
+
+    python benchmarks/bench_memory.py [--evaluations 24] [--rows 50000]
+                                      [--interval 0.05] [--llm-latency 1.0]
+
+Requests arrive every ``interval`` seconds and each LLM call takes
+``llm-latency`` seconds, so roughly latency / interval evaluations wait on
+the model at once.  Each mode runs in a fresh subprocess so ru_maxrss is
+its own.
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from langgraph.graph import START, StateGraph  # noqa: E402
+
+from drug_fibrosis_agent.agent import (  # noqa: E402
+    CompoundBrief,
+    FibrosisEvaluator,
+    FibrosisState,
+    PubChemTool,
+    aanalyze_fibrosis,
+    afetch_records,
+    aidentify_cid,
+    conclude,
+)
+
+
+class SyntheticPubChem(PubChemTool):
+    """Answers every lookup locally with a freshly built assay table."""
+
+    rows: int = 50_000
+
+    def _run(self, path: str) -> Dict[str, Any]:
+        parts = path.split("/")
+        if parts[2] == "name":
+            return {"IdentifierList": {"CID": [abs(hash(parts[3])) % 10**6]}}
+        if parts[4] == "assaysummary":
+            return {"AssayTable": {"Rows": [
+                {"AID": i, "Name": f"qHTS luciferase counter screen {i}",
+                 "ActivityOutcome": "Inactive", "ActivityValue": i * 0.1}
+                for i in range(self.rows)]}}
+        return {}
+
+    async def _arun(self, path: str) -> Dict[str, Any]:
+        return self._run(path)
+
+
+class SlowLLM:
+    model_name, temperature = "slow-llm", 0.0
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+
+    def bind(self, **kwargs):
+        return self
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self.latency)
+        return type("Msg", (), {"content": json.dumps({
+            "conclusion": "INDETERMINATE", "relevance": 50, "confidence": 0,
+            "rationale": "synthetic"})})()
+
+
+class RawState(FibrosisState, total=False):
+    raw_records: Dict[str, Any]
+
+
+def raw_state_graph(llm: SlowLLM, tool: PubChemTool):
+    """The previous wiring: records ride in the state until the LLM step."""
+
+    async def identify(s):
+        return await aidentify_cid(s, tool)
+
+    async def fetch(s):
+        records = await afetch_records(s["cid"], tool)
+        return {"raw_records": records, "trace": s["trace"] + list(records)}
+
+    async def analyze(s):
+        brief = await asyncio.to_thread(CompoundBrief.from_records, s["raw_records"])
+        return await aanalyze_fibrosis({**s, "brief": brief}, llm, None)
+
+    g = StateGraph(RawState)
+    g.add_node("identify_cid", identify)
+    g.add_node("fetch_details", fetch)
+    g.add_node("analyze_fibrosis", analyze)
+    g.add_node("conclude", conclude)
+    g.add_edge(START, "identify_cid")
+    g.add_edge("identify_cid", "fetch_details")
+    g.add_edge("fetch_details", "analyze_fibrosis")
+    g.add_edge("analyze_fibrosis", "conclude")
+    g.set_finish_point("conclude")
+    return g.compile()
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+async def run(mode: str, args: argparse.Namespace) -> None:
+    llm = SlowLLM(args.llm_latency)
+    tool = SyntheticPubChem(rows=args.rows, use_cache=False)
+    if mode == "raw":
+        graph = raw_state_graph(llm, tool)
+    else:
+        # the synthetic rows carry no fibrosis evidence; with the fast path on
+        # the rule layer would settle every compound without waiting on the LLM
+        graph = FibrosisEvaluator(llm, tool=tool, result_ttl=0, fast_path=False).graph
+
+    async def one(i: int) -> None:
+        await asyncio.sleep(i * args.interval)
+        await graph.ainvoke({"drug_name": f"drug{i}", "trace": []})
+
+    await one(0)  # warm up: thread pool, imports, first allocations
+    baseline = max_rss_mb()
+    await asyncio.gather(*(one(i) for i in range(1, args.evaluations + 1)))
+    print(json.dumps({"baseline": baseline, "peak": max_rss_mb()}))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--evaluations", type=int, default=24)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--child", choices=["raw", "brief"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(run(args.child, args))
+        return
+
+    in_flight = max(1.0, min(args.evaluations, args.llm_latency / args.interval))
+    print(f"evaluations {args.evaluations}, {args.rows:,} assay rows each, "
+          f"~{in_flight:.0f} waiting on the LLM at once")
+    for mode, label in (("raw", "raw records in state"), ("brief", "CompoundBrief only")):
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", mode] + sys.argv[1:],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        rss = json.loads(out.strip().splitlines()[-1])
+        growth = rss["peak"] - rss["baseline"]
+        print(f"{label:<22} peak RSS {rss['peak']:>8.1f} MB   "
+              f"growth {growth:>7.1f} MB   per evaluation {growth / in_flight:>6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Cold-start benchmark: time to import the package, build the first
+evaluator, spawn a batch worker and import the API app, each in a fresh
+interpreter.
+
+    python benchmarks/bench_startup.py [--repeat 5]
+
+``import`` is measured inside the child around the snippet; ``process``
+is the parent's wall time for the whole child, interpreter start-up
+included.  Medians over ``repeat`` runs.  The API row runs without
+MODAL_API_KEY, which the app no longer needs in order to start.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_STUB_LLM = (
+    "class LLM:\n"
+    "    model_name, temperature = 'stub', 0\n"
+    "    def bind(self, **kw): return self\n"
+)
+
+SNIPPETS = {
+    "import drug_fibrosis_agent": "import drug_fibrosis_agent",
+    "import .cache": "import drug_fibrosis_agent.cache",
+    "import .agent": "import drug_fibrosis_agent.agent",
+    "first evaluator": _STUB_LLM
+    + "from drug_fibrosis_agent import FibrosisEvaluator\nFibrosisEvaluator(LLM())",
+    "default LLM": "from drug_fibrosis_agent.agent import _default_llm\n_default_llm()",
+    "batch worker": "import drug_fibrosis_agent.batch",
+    "import api": "import api",
+}
+
+_CHILD = (
+    "import time, sys\n"
+    "t = time.perf_counter()\n"
+    "exec(compile(sys.argv[1], '<snippet>', 'exec'))\n"
+    "print(time.perf_counter() - t)\n"
+)
+
+
+def run_once(snippet: str) -> tuple:
+    env = {k: v for k, v in os.environ.items() if k != "MODAL_API_KEY"}
+    env.setdefault("OPENAI_API_KEY", "sk-startup-bench")  # ChatOpenAI wants one
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", _CHILD, snippet], cwd=ROOT, env=env,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError((proc.stderr.strip().splitlines() or ["failed"])[-1])
+    return float(proc.stdout.strip().splitlines()[-1]), wall
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'':<28}{'import':>10}{'process':>10}   (median of {args.repeat}, ms)")
+    for label, snippet in SNIPPETS.items():
+        try:
+            runs = [run_once(snippet) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{label:<28}  skipped ({e})")
+            continue
+        inner = statistics.median(r[0] for r in runs) * 1000
+        wall = statistics.median(r[1] for r in runs) * 1000
+        print(f"{label:<28}{inner:>10.1f}{wall:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Offline end-to-end benchmark: ``evaluate_drug``, batch mode and the
+FastAPI endpoint under concurrent load, against a local PubChem stand-in
+and a fake LLM (see ``standin.py``).
+
+    python benchmarks/bench_suite.py [--compounds 200] [--concurrency 16]
+        [--pubchem-latency 0.05] [--pubchem-rate RPS] [--client-rate 50]
+        [--llm-delay 0.2] [--llm-batch 1] [--assay-rows 500]
+        [--fixtures DIR] [--scenarios evaluate,batch,api]
+
+Reports compounds/sec, p50/p95/p99 per request and per graph node, and
+peak RSS.  Each scenario runs in a fresh subprocess so ru_maxrss and the
+process-wide caches are its own.  ``--pubchem-rate`` makes the stand-in
+answer 503 past that many requests per second, like PubChem does;
+``--client-rate`` is the agent's own token bucket.  A scenario that
+cannot start (say, a missing server dependency) is reported as skipped.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from langchain_core.callbacks import BaseCallbackHandler  # noqa: E402
+from langchain_core.tracers.context import register_configure_hook  # noqa: E402
+
+from benchmarks.standin import FakeLLM, PubChemStandIn  # noqa: E402
+from drug_fibrosis_agent import agent  # noqa: E402
+from drug_fibrosis_agent.agent import PubChemTool, PubChemTransport  # noqa: E402
+from drug_fibrosis_agent.ratelimit import TokenBucket, set_default_limiter  # noqa: E402
+
+SCENARIOS = ("evaluate", "batch", "api")
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Wall time of every graph node run, by node name."""
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = {}
+        self._started: Dict[UUID, tuple] = {}
+        self._lock = threading.Lock()
+
+    def on_chain_start(self, serialized: Any, inputs: Any, *, run_id: UUID,
+                       metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        node = (metadata or {}).get("langgraph_node")
+        # the node's own run, not the runnables nested inside it
+        if node is not None and kwargs.get("name") == node:
+            with self._lock:
+                self._started[run_id] = (node, time.perf_counter())
+
+    def _finish(self, run_id: UUID) -> None:
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started is not None:
+                node, t0 = started
+                self.samples.setdefault(node, []).append(time.perf_counter() - t0)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+
+# a default value reaches every thread and task without copying contexts
+_timer = NodeTimer()
+register_configure_hook(ContextVar("bench_node_timer", default=_timer), True)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def rank(q: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+    return {"p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99), "n": len(ordered)}
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def drug_names(n: int) -> List[str]:
+    # every 20th name is unknown to the stand-in, like misspelt inputs
+    return [f"unknown{i}" if i % 20 == 19 else f"drug{i}" for i in range(n)]
+
+
+def scenario_evaluate(names: List[str], llm: FakeLLM, args: argparse.Namespace) -> List[float]:
+    def one(name: str) -> float:
+        start = time.perf_counter()
+        agent.evaluate_drug(name, llm)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        return list(pool.map(one, names))
+
+
+def scenario_batch(names: List[str], llm: FakeLLM, args: argparse.Namespace) -> List[float]:
+    from drug_fibrosis_agent.batch import run_batch
+
+    tool = PubChemTool(transport=PubChemTransport(
+        base_url=args.base_url,
+        max_connections=args.concurrency, max_keepalive_connections=args.concurrency,
+    ))
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "results.jsonl")
+        asyncio.run(run_batch(
+            names, output, llm, pubchem_concurrency=args.concurrency,
+            llm_concurrency=args.concurrency, tool=tool, llm_batch=args.llm_batch,
+        ))
+        with open(output, encoding="utf-8") as f:
+            return [json.loads(line).get("elapsed_s", 0.0) for line in f]
+
+
+def scenario_api(names: List[str], llm: FakeLLM, args: argparse.Namespace) -> List[float]:
+    import api
+    import httpx
+
+    agent._shared_llm = llm  # what the endpoint's evaluator will use
+
+    async def run() -> List[float]:
+        gate = asyncio.Semaphore(args.concurrency)
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                     timeout=None) as client:
+
+            async def one(name: str) -> float:
+                async with gate:
+                    start = time.perf_counter()
+                    r = await client.post("/analyze_fibrosis", json={"drug_name": name})
+                    r.raise_for_status()
+                    return time.perf_counter() - start
+
+            return await asyncio.gather(*(one(n) for n in names))
+
+    return asyncio.run(run())
+
+
+def child(scenario: str, args: argparse.Namespace) -> None:
+    agent.set_transport(PubChemTransport(
+        base_url=args.base_url,
+        max_connections=args.concurrency, max_keepalive_connections=args.concurrency,
+    ))
+    set_default_limiter(TokenBucket(args.client_rate, max(1.0, args.client_rate)))
+    llm = FakeLLM(args.llm_delay)
+    run = {"evaluate": scenario_evaluate, "batch": scenario_batch, "api": scenario_api}[scenario]
+
+    # warm up imports, pools and first allocations on CIDs the run never uses
+    run([f"warmup{900_000 + i}" for i in range(2)], llm, args)
+    _timer.samples.clear()
+    llm.calls = 0
+    names = drug_names(args.compounds)
+    start = time.perf_counter()
+    latencies = run(names, llm, args)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "compounds_per_s": len(names) / elapsed,
+        "elapsed_s": elapsed,
+        "request": percentiles(latencies),
+        "nodes": {node: percentiles(s) for node, s in sorted(_timer.samples.items())},
+        "llm_calls": llm.calls,
+        "peak_rss_mb": max_rss_mb(),
+    }))
+
+
+def ms(stats: Dict[str, float]) -> str:
+    if not stats:
+        return "-"
+    return (f"p50 {stats['p50'] * 1000:>7.1f}  p95 {stats['p95'] * 1000:>7.1f}  "
+            f"p99 {stats['p99'] * 1000:>7.1f} ms  (n={stats['n']})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--compounds", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--pubchem-latency", type=float, default=0.05)
+    parser.add_argument("--pubchem-rate", type=float, default=None)
+    parser.add_argument("--client-rate", type=float, default=50.0)
+    parser.add_argument("--llm-delay", type=float, default=0.2)
+    parser.add_argument("--llm-batch", type=int, default=1)
+    parser.add_argument("--assay-rows", type=int, default=500)
+    parser.add_argument("--fixtures", default=None,
+                        help="directory of recorded responses (standin.record_fixtures)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args)
+        return
+
+    standin = PubChemStandIn(latency=args.pubchem_latency, rate=args.pubchem_rate,
+                             assay_rows=args.assay_rows, fixtures=args.fixtures)
+    print(f"{args.compounds} compounds, concurrency {args.concurrency}, "
+          f"PubChem {args.pubchem_latency * 1000:.0f} ms"
+          f"{f' / {args.pubchem_rate:g} rps' if args.pubchem_rate else ''}, "
+          f"LLM {args.llm_delay * 1000:.0f} ms, llm batch {args.llm_batch}")
+    with standin:
+        for scenario in args.scenarios.split(","):
+            proc = subprocess.run(
+                [sys.executable, __file__, "--child", scenario,
+                 "--base-url", standin.base_url] + sys.argv[1:],
+                capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                reason = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+                print(f"\n{scenario}: skipped ({reason})")
+                continue
+            out = json.loads(proc.stdout.strip().splitlines()[-1])
+            print(f"\n{scenario}: {out['compounds_per_s']:.1f} compounds/s  "
+                  f"peak RSS {out['peak_rss_mb']:.1f} MB  LLM calls {out['llm_calls']}")
+            print(f"  {'request':<18}{ms(out['request'])}")
+            for node, stats in out["nodes"].items():
+                print(f"  {node:<18}{ms(stats)}")
+        print(f"\nstand-in: {standin.requests} requests, {standin.throttled} throttled")
+
+
+if __name__ == "__main__":
+    main()
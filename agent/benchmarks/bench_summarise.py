@@ -0,0 +1,128 @@
+"""
+Micro-benchmark: _summarise_pubchem on a large synthetic assaysummary blob
+against the per-term substring scan it replaced, and select_assays over a
+batch of compounds sharing AIDs against matching every row's title.
+
+    python benchmarks/bench_summarise.py [--rows 50000] [--repeat 5]
+                                         [--compounds 200] [--assays 5000]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from drug_fibrosis_agent.agent import (  # noqa: E402
+    _ASSAY_MATCHER, _FIBROSIS_TERMS, _MAX_ASSAYS, _select_assays, _summarise_pubchem,
+)
+
+_FILLER = (
+    "qhts assay for inhibitors of human luciferase reporter cell viability "
+    "counter screen yeast growth binding affinity dose response toxicity"
+).split()
+_HITS = ["tgf-beta induced", "cardiac fibroblast", "brd4 bromodomain", "collagen i"]
+
+
+def make_blob(rows: int, hit_rate: float = 0.1, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    table = []
+    for aid in range(rows):
+        words = [rng.choice(_FILLER) for _ in range(10)]
+        if rng.random() < hit_rate:
+            words.insert(rng.randrange(len(words)), rng.choice(_HITS))
+        table.append({
+            "AID": aid,
+            "Name": " ".join(words).title(),
+            "ActivityOutcome": "Active" if rng.random() < 0.3 else "Inactive",
+        })
+    return {"/compound/cid/1/assaysummary/JSON": {"AssayTable": {"Rows": table}}}
+
+
+def make_batch(compounds: int, rows: int, pool: int, seed: int = 0) -> list:
+    """Tables for ``compounds`` compounds drawing rows from ``pool`` shared AIDs."""
+    rng = random.Random(seed)
+    shared = make_blob(pool, seed=seed)["/compound/cid/1/assaysummary/JSON"]["AssayTable"]["Rows"]
+    return [[[dict(row, ActivityOutcome="Active") for row in rng.sample(shared, rows)]]
+            for _ in range(compounds)]
+
+
+def legacy_assay_scan(records: dict) -> list:
+    """The pre-matcher assay loop: one substring search per term per row."""
+    assays = []
+    for blob in records.values():
+        for row in blob["AssayTable"]["Rows"]:
+            title = row.get("Name", "").lower()
+            outcome = row.get("ActivityOutcome", "")
+            ("brd4" in title or "bromodomain" in title or "bet" in title) and outcome == "Active"
+            any(t in title for t in ["anti-fibrotic", "antifibrotic", "fibrosis inhibit"])
+            ("tgf" in title or "transforming growth factor" in title) and outcome == "Active"
+            if any(t in title for t in _FIBROSIS_TERMS):
+                assays.append(row)
+    return assays
+
+
+def per_row_selection(tables: list) -> list:
+    """Assay selection matching each row's title, as before select_assays."""
+    out = []
+    for blobs in tables:
+        kept, evidence = [], set()
+        for rows in blobs:
+            for row in rows:
+                outcome = row.get("ActivityOutcome", "")
+                cats = _ASSAY_MATCHER.categories(row.get("Name", "").lower())
+                if outcome == "Active":
+                    evidence |= cats
+                if "fibrosis" in cats:
+                    kept.append(row)
+                if len(kept) >= _MAX_ASSAYS and outcome != "Active":
+                    break
+        out.append((kept, evidence))
+    return out
+
+
+def best_of(fn, arg, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--compounds", type=int, default=200)
+    parser.add_argument("--assays", type=int, default=5_000,
+                        help="distinct assays shared by the batch")
+    args = parser.parse_args()
+
+    # every row is scanned: the 15-assay cap only stops at inactive rows,
+    # so keep all rows active to measure a full pass
+    records = make_blob(args.rows)
+    for row in records["/compound/cid/1/assaysummary/JSON"]["AssayTable"]["Rows"]:
+        row["ActivityOutcome"] = "Active"
+
+    legacy = best_of(legacy_assay_scan, records, args.repeat)
+    current = best_of(_summarise_pubchem, records, args.repeat)
+    print(f"rows                 {args.rows:>10,}")
+    print(f"legacy term scan     {legacy * 1e3:>10.1f} ms")
+    print(f"_summarise_pubchem   {current * 1e3:>10.1f} ms")
+    print(f"speedup              {legacy / current:>10.2f}x")
+
+    per = min(args.rows // 10, args.assays)
+    tables = make_batch(args.compounds, per, args.assays)
+    assert per_row_selection(tables) == _select_assays(tables)
+    per_row = best_of(per_row_selection, tables, args.repeat)
+    batched = best_of(_select_assays, tables, args.repeat)
+    print(f"batch rows           {args.compounds * per:>10,}")
+    print(f"per-row matching     {per_row * 1e3:>10.1f} ms")
+    print(f"select_assays        {batched * 1e3:>10.1f} ms")
+    print(f"speedup              {per_row / batched:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
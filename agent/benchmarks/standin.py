@@ -0,0 +1,263 @@
+"""
+Local stand-ins for the agent's external services, for offline benchmarks.
+
+``PubChemStandIn`` is a threaded HTTP server answering the PUG-REST paths
+the agent requests.  Answers come from recorded fixtures when a fixture
+directory holds them (see ``record_fixtures``) and are otherwise generated
+deterministically per CID, including the multi-CID bulk forms used by
+prefetching.  Every response waits ``latency`` seconds and carries an
+``X-Throttling-Control`` header; with ``rate`` set, requests beyond that
+rate get 503 like the real service.
+
+``FakeLLM`` answers the scoring prompts (single and batched) with a
+deterministic verdict after a tunable delay and reports token usage.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import unquote
+
+from langchain_core.messages import AIMessage
+
+_PREFIX = "/rest/pug"
+_FILLER = (
+    "qhts assay for inhibitors of human luciferase reporter cell viability "
+    "counter screen yeast growth binding affinity dose response toxicity"
+).split()
+_HITS = ["tgf-beta induced", "cardiac fibroblast", "brd4 bromodomain", "collagen i"]
+
+
+def fixture_name(path: str) -> str:
+    return hashlib.sha1(path.encode()).hexdigest()[:16] + ".json"
+
+
+def record_fixtures(paths: Iterable[str], directory: str,
+                    base_url: str = "https://pubchem.ncbi.nlm.nih.gov/rest/pug") -> int:
+    """Save live PUG-REST answers for ``paths`` as fixtures (needs network)."""
+    import httpx
+
+    out = Path(directory)
+    out.mkdir(parents=True, exist_ok=True)
+    saved = 0
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        for path in paths:
+            r = client.get(path)
+            body = r.json() if r.headers.get("content-type", "").startswith("application/json") else None
+            (out / fixture_name(path)).write_text(json.dumps(
+                {"path": path, "status": r.status_code, "body": body}))
+            saved += 1
+            time.sleep(0.25)  # stay inside PubChem's 5 requests/second
+    return saved
+
+
+# ----  synthetic records  ---------------------------------------------------
+
+def _cid_of(name: str) -> Optional[int]:
+    # "drug17" -> 18; names starting with "unknown" are not in PubChem
+    if name.startswith("unknown"):
+        return None
+    digits = "".join(ch for ch in name if ch.isdigit())
+    return int(digits) + 1 if digits else int(hashlib.sha1(name.encode()).hexdigest()[:6], 16)
+
+
+@lru_cache(maxsize=4096)
+def _assay_rows(cid: int, rows: int) -> Tuple[Dict[str, Any], ...]:
+    rng = random.Random(cid)
+    out = []
+    for i in range(rows):
+        words = [rng.choice(_FILLER) for _ in range(8)]
+        if rng.random() < 0.05:
+            words.insert(rng.randrange(len(words)), rng.choice(_HITS))
+        out.append({
+            "CID": cid,
+            "AID": 1000 + rng.randrange(20 * rows),
+            "Name": " ".join(words).title(),
+            "ActivityOutcome": "Active" if rng.random() < 0.2 else "Inactive",
+        })
+    return tuple(out)
+
+
+def synthetic(path: str, assay_rows: int) -> Tuple[int, Any]:
+    parts = path.split("/")
+    if len(parts) < 5 or parts[1] != "compound":
+        return 400, {"Fault": {"Code": "PUGREST.BadRequest"}}
+    if parts[2] == "name":
+        cid = _cid_of(unquote(parts[3]))
+        if cid is None:
+            return 404, {"Fault": {"Code": "PUGREST.NotFound"}}
+        return 200, {"IdentifierList": {"CID": [cid]}}
+    cids = [int(c) for c in parts[3].split(",")]
+    operation = parts[4]
+    if operation == "property":
+        return 200, {"PropertyTable": {"Properties": [
+            {"CID": c, "MolecularFormula": f"C{c % 40 + 5}H{c % 30 + 8}N{c % 5}O{c % 6}",
+             "MolecularWeight": str(150 + c % 400), "CanonicalSMILES": "C" * (c % 20 + 1)}
+            for c in cids]}}
+    if operation == "assaysummary":
+        return 200, {"AssayTable": {"Rows": [row for c in cids for row in _assay_rows(c, assay_rows)]}}
+    if operation == "classification":
+        return 200, {"HierarchicalClassificationTree": {"ClassificationNode": {"ToOne": {
+            "NodeName": "Organic compounds", "ToOne": {"NodeName": "Benzenoids"}}}}}
+    if operation == "xrefs":
+        return 200, {"InformationList": {"Information": [
+            {"CID": c, "GeneID": [23476]} for c in cids]}}
+    # "description" and anything else: PUG-REST has no such record
+    return 404, {"Fault": {"Code": "PUGREST.NotFound"}}
+
+
+# ----  the server  ----------------------------------------------------------
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        # clients drop connections mid-response when they give up on a 503
+        pass
+
+
+class PubChemStandIn:
+    """
+    PUG-REST stand-in on ``127.0.0.1``; use as a context manager and point
+    ``PubChemTransport(base_url=standin.base_url)`` at it.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        rate: Optional[float] = None,
+        assay_rows: int = 500,
+        fixtures: Optional[str] = None,
+    ) -> None:
+        self.latency = latency
+        self.rate = rate
+        self.assay_rows = assay_rows
+        self.fixtures: Dict[str, Tuple[int, Any]] = {}
+        if fixtures:
+            for f in Path(fixtures).glob("*.json"):
+                rec = json.loads(f.read_text())
+                self.fixtures[rec["path"]] = (rec["status"], rec["body"])
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._window: List[float] = []
+        self._server = _QuietServer(("127.0.0.1", 0), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}{_PREFIX}"
+
+    def __enter__(self) -> "PubChemStandIn":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _admit(self) -> Tuple[bool, str]:
+        """Sliding one-second window: (allowed, X-Throttling-Control value)."""
+        with self._lock:
+            self.requests += 1
+            if self.rate is None:
+                return True, "Request Count status: Green (0%)"
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < 1.0]
+            used = len(self._window) / self.rate
+            if used >= 1.0:
+                self.throttled += 1
+                return False, "Request Count status: Black (100%)"
+            self._window.append(now)
+            status = "Green" if used < 0.5 else "Yellow" if used < 0.8 else "Red"
+            return True, f"Request Count status: {status} ({int(used * 100)}%)"
+
+    def answer(self, path: str) -> Tuple[int, Any]:
+        if path in self.fixtures:
+            return self.fixtures[path]
+        return synthetic(path, self.assay_rows)
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                time.sleep(standin.latency)
+                allowed, throttling = standin._admit()
+                if allowed:
+                    status, body = standin.answer(self.path[len(_PREFIX):])
+                else:
+                    status, body = 503, {"Fault": {"Code": "PUGREST.ServerBusy"}}
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("X-Throttling-Control", throttling)
+                if not allowed:
+                    self.send_header("Retry-After", "1")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        return Handler
+
+
+# ----  the LLM  -------------------------------------------------------------
+
+class FakeLLM:
+    """Deterministic stand-in for the chat model; ``delay`` seconds per call."""
+
+    model_name = "fake-llm"
+    temperature = 0.0
+
+    def __init__(self, delay: float = 0.2) -> None:
+        self.delay = delay
+        self.calls = 0
+
+    def bind(self, **_kwargs: Any) -> "FakeLLM":
+        return self
+
+    @staticmethod
+    def _verdict(seed: str) -> Dict[str, Any]:
+        h = int(hashlib.sha1(seed.encode()).hexdigest()[:8], 16)
+        conclusion = ("POSITIVE", "NEGATIVE", "INDETERMINATE")[h % 3]
+        return {"conclusion": conclusion, "relevance": h % 101, "confidence": (h >> 8) % 101,
+                "rationale": "deterministic fake verdict"}
+
+    def _reply(self, messages: Any) -> AIMessage:
+        self.calls += 1
+        text = messages[-1].content if isinstance(messages, list) else str(messages)
+        if text.startswith("COMPOUND_BRIEFS = "):
+            briefs = json.loads(text[len("COMPOUND_BRIEFS = "):])
+            body = {"results": [{"id": b["id"], **self._verdict(json.dumps(b["brief"]))}
+                                for b in briefs]}
+        else:
+            body = self._verdict(text)
+        content = json.dumps(body)
+        prompt = sum(len(getattr(m, "content", m)) for m in messages) // 4
+        completion = len(content) // 4
+        return AIMessage(content=content, usage_metadata={
+            "input_tokens": prompt, "output_tokens": completion,
+            "total_tokens": prompt + completion})
+
+    def invoke(self, messages: Any, *args: Any, **kwargs: Any) -> AIMessage:
+        time.sleep(self.delay)
+        return self._reply(messages)
+
+    async def ainvoke(self, messages: Any, *args: Any, **kwargs: Any) -> AIMessage:
+        await asyncio.sleep(self.delay)
+        return self._reply(messages)
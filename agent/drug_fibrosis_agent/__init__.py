@@ -1,8 +1,69 @@
 """
 Public re-export layer so users (and tests) can simply
     >>> from drug_fibrosis_agent import evaluate_drug
+
+Names are resolved on first access (PEP 562), so importing the package,
+or a light submodule such as ``drug_fibrosis_agent.cache``, does not pay
+for LangChain until something that needs it is used.
 """
 
-from .agent import evaluate_drug, PubChemTool, build_graph
+import importlib
+from typing import TYPE_CHECKING, Any
+
+_EXPORTS = {
+    "evaluate_drug": "agent",
+    "aevaluate_drug": "agent",
+    "astream_drug": "agent",
+    "evaluate_drugs": "agent",
+    "FibrosisEvaluator": "agent",
+    "get_evaluator": "agent",
+    "PubChemTool": "agent",
+    "PubChemTransport": "agent",
+    "build_graph": "agent",
+    "close_transport": "agent",
+    "aclose_transport": "agent",
+    "get_transport": "agent",
+    "set_transport": "agent",
+    "CacheMiss": "cache",
+    "DiskCache": "cache",
+    "MemoryCache": "cache",
+    "TieredCache": "cache",
+    "ResultStore": "results",
+    "SharedTokenBucket": "ratelimit",
+    "TokenBucket": "ratelimit",
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from .agent import (
+        evaluate_drug,
+        aevaluate_drug,
+        astream_drug,
+        evaluate_drugs,
+        FibrosisEvaluator,
+        get_evaluator,
+        PubChemTool,
+        PubChemTransport,
+        build_graph,
+        close_transport,
+        aclose_transport,
+        get_transport,
+        set_transport,
+    )
+    from .cache import CacheMiss, DiskCache, MemoryCache, TieredCache
+    from .ratelimit import SharedTokenBucket, TokenBucket
+    from .results import ResultStore
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value  # later lookups skip __getattr__
+    return value
+
 
-__all__ = ["evaluate_drug", "PubChemTool", "build_graph"]
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,78 +1,871 @@
 """
 Cardiac-fibrosis assessor (LangChain 0.2 + LangGraph 0.0.21)
+
+LangGraph, the message classes and langchain_openai are imported where
+they are first used (building a graph, a prompt or the default LLM), so
+importing this module stays cheap for workers that only fetch or
+summarise.
 """
 
 from __future__ import annotations
 
+import atexit
+import asyncio
 import collections
+import contextvars
+import importlib.util
 import json
+import logging
+import re
+import threading
 import time
-from typing import Any, Dict, List, TypedDict
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, TypedDict,
+)
 
 import httpx
 from langchain_core.tools import BaseTool
-from langchain_openai import ChatOpenAI
-from langgraph.graph import START, END, StateGraph
+
+from .metrics import collect_events, emit, timed
+from .ratelimit import default_limiter
+from .assays import Selection, select_assays
+from .singleflight import AsyncSingleFlight, SingleFlight
+from .streaming import aiter_json_array, iter_json_array
+from .cache import (
+    CacheMiss,
+    MemoryCache,
+    TieredCache,
+    VerdictCache,
+    brief_digest,
+    default_cache,
+    default_verdict_cache,
+    endpoint_of,
+    normalize_name,
+    verdict_key,
+)
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+    from langchain_openai import ChatOpenAI
+
+logger = logging.getLogger(__name__)
+
+_PUBCHEM_BASE = "https://pubchem.ncbi.nlm.nih.gov/rest/pug"
+
+class PubChemTransport:
+    """
+    Long-lived, pooled HTTP clients for PUG-REST.
+
+    One sync ``httpx.Client`` is shared by every thread; async clients are
+    kept per event loop because an ``httpx.AsyncClient`` pool cannot be
+    used from a loop other than the one that opened its connections.
+    """
+
+    def __init__(
+        self,
+        base_url: str = _PUBCHEM_BASE,
+        timeout: float = 30.0,
+        connect_timeout: float = 10.0,
+        max_connections: int = 10,
+        max_keepalive_connections: int = 5,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        transport: Optional[httpx.BaseTransport] = None,
+        async_transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        if http2 and importlib.util.find_spec("h2") is None:
+            # httpx needs the optional ``h2`` package for HTTP/2.
+            http2 = False
+        self.base_url = base_url
+        self.http2 = http2
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._transport = transport
+        self._async_transport = async_transport
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._aclients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _client_kwargs(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "timeout": self._timeout,
+            "limits": self._limits,
+            "http2": self.http2,
+        }
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None or self._client.is_closed:
+            with self._lock:
+                if self._client is None or self._client.is_closed:
+                    self._client = httpx.Client(
+                        transport=self._transport, **self._client_kwargs()
+                    )
+        return self._client
+
+    @property
+    def aclient(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._aclients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                transport=self._async_transport, **self._client_kwargs()
+            )
+            self._aclients[loop] = client
+        return client
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    async def aclose(self) -> None:
+        self.close()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        client = self._aclients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+_default_transport: Optional[PubChemTransport] = None
+_default_transport_lock = threading.Lock()
+
+def get_transport() -> PubChemTransport:
+    """Process-wide transport shared by every ``PubChemTool`` without its own."""
+    global _default_transport
+    if _default_transport is None:
+        with _default_transport_lock:
+            if _default_transport is None:
+                _default_transport = PubChemTransport()
+    return _default_transport
+
+def set_transport(transport: PubChemTransport) -> None:
+    global _default_transport
+    with _default_transport_lock:
+        old, _default_transport = _default_transport, transport
+    if old is not None and old is not transport:
+        old.close()
+
+def close_transport() -> None:
+    if _default_transport is not None:
+        _default_transport.close()
+
+async def aclose_transport() -> None:
+    if _default_transport is not None:
+        await _default_transport.aclose()
+
+atexit.register(close_transport)
+
+# PubChem signals an exceeded budget with 503 ("server busy"); 429 is
+# treated the same way.
+_RETRY_STATUSES = frozenset({429, 503})
 
 class PubChemTool(BaseTool):
     name: str = "pubchem_api"
     description: str = (
-        "Sync wrapper around PubChem PUG-REST. "
+        "Sync/async wrapper around PubChem PUG-REST. "
         "Call with the URL suffix beginning '/compound/...'."
     )
-    _BASE = "https://pubchem.ncbi.nlm.nih.gov/rest/pug"
-    _window: collections.deque = collections.deque(maxlen=5)
+    transport: Optional[PubChemTransport] = None
+    cache: Optional[Any] = None
+    use_cache: bool = True
+    # Serve from the cache only; uncached paths raise CacheMiss.
+    offline: bool = False
+    limiter: Optional[Any] = None
+    max_retries: int = 3
+    # Filter assaysummary tables while they download instead of decoding
+    # the whole body; only rows _summarise_pubchem would read are kept.
+    # Either way the cache holds the same filtered table.
+    stream_assays: bool = True
+
+    @property
+    def _transport(self) -> PubChemTransport:
+        return self.transport or get_transport()
+
+    @property
+    def _cache(self):
+        if not self.use_cache:
+            return None
+        return self.cache if self.cache is not None else default_cache()
+
+    def _cached(self, path: str) -> Optional[Dict[str, Any]]:
+        cache = self._cache
+        hit = cache.get(path) if cache is not None else None
+        if hit is None and self.offline:
+            raise CacheMiss(path)
+        return hit
+
+    def _store(self, path: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        cache = self._cache
+        if cache is not None:
+            cache.set(path, data)
+        return data
+
+    @property
+    def _limiter(self):
+        return self.limiter if self.limiter is not None else default_limiter()
+
+    def _should_retry(self, r: httpx.Response, attempt: int) -> float:
+        """Seconds to back off before retrying ``r``, or 0 to stop."""
+        limiter = self._limiter
+        limiter.observe(r.headers.get("X-Throttling-Control"))
+        if r.status_code not in _RETRY_STATUSES or attempt >= self.max_retries:
+            return 0.0
+        limiter.penalize()
+        return self._backoff(r, attempt)
+
+    async def _ashould_retry(self, r: httpx.Response, attempt: int) -> float:
+        # a shared (SQLite) limiter adapts its rate off the event loop
+        limiter = self._limiter
+        await limiter.aobserve(r.headers.get("X-Throttling-Control"))
+        if r.status_code not in _RETRY_STATUSES or attempt >= self.max_retries:
+            return 0.0
+        await limiter.apenalize()
+        return self._backoff(r, attempt)
+
+    @staticmethod
+    def _backoff(r: httpx.Response, attempt: int) -> float:
+        try:
+            return max(0.1, float(r.headers.get("Retry-After", "")))
+        except ValueError:
+            return 2.0 ** attempt
+
+    def _fetch(
+        self,
+        path: str,
+        stream_rows: bool = False,
+        keep_rows: Optional[Callable[[Iterator[Dict[str, Any]]], Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        GET ``path`` with rate limiting and retries.  With ``stream_rows``
+        the assay table is parsed as it downloads and only rows the summary
+        can use are kept: ``keep_rows`` reduces the row stream, by default
+        ``_keep_assay_rows``.
+        """
+        with timed("http", path=path, endpoint=endpoint_of(path), cache="miss",
+                   bytes=0, retries=0, limiter_wait_s=0.0) as event:
+            for attempt in range(self.max_retries + 1):
+                event["retries"] = attempt
+                event["limiter_wait_s"] += self._limiter.acquire()
+                with self._transport.client.stream("GET", path) as r:
+                    event["status"] = r.status_code
+                    backoff = self._should_retry(r, attempt)
+                    if not backoff:
+                        r.raise_for_status()
+                        if stream_rows:
+                            keep = keep_rows or _keep_assay_rows
+                            data = keep(iter_json_array(r.iter_text(), "Rows"))
+                            event["bytes"] = r.num_bytes_downloaded
+                            return data
+                        body = r.read()
+                        event["bytes"] = len(body)
+                        return json.loads(body)
+                time.sleep(backoff)
+
+    async def _afetch(self, path: str, stream_rows: bool = False) -> Dict[str, Any]:
+        with timed("http", path=path, endpoint=endpoint_of(path), cache="miss",
+                   bytes=0, retries=0, limiter_wait_s=0.0) as event:
+            for attempt in range(self.max_retries + 1):
+                event["retries"] = attempt
+                event["limiter_wait_s"] += await self._limiter.aacquire()
+                async with self._transport.aclient.stream("GET", path) as r:
+                    event["status"] = r.status_code
+                    backoff = await self._ashould_retry(r, attempt)
+                    if not backoff:
+                        r.raise_for_status()
+                        if stream_rows:
+                            data = await _akeep_assay_rows(aiter_json_array(r.aiter_text(), "Rows"))
+                            event["bytes"] = r.num_bytes_downloaded
+                            return data
+                        body = await r.aread()
+                        event["bytes"] = len(body)
+                        return json.loads(body)
+                await asyncio.sleep(backoff)
+
+    def _streams(self, path: str) -> bool:
+        return self.stream_assays and endpoint_of(path) == "assaysummary"
+
+    def _hit(self, path: str) -> Optional[Dict[str, Any]]:
+        hit = self._cached(path)
+        if hit is not None:
+            emit({"kind": "http", "path": path, "endpoint": endpoint_of(path),
+                  "cache": "hit", "start": time.time(), "duration_s": 0.0})
+        return hit
+
+    def _reduce(self, path: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        # a table decoded whole is cut down to what streaming would have kept
+        if endpoint_of(path) == "assaysummary" and not self._streams(path):
+            return _keep_assay_rows(iter(data.get("AssayTable", {}).get("Rows", [])))
+        return data
 
     def _run(self, path: str) -> Dict[str, Any]:
-        if len(self._window) == 5 and time.time() - self._window[0] < 1:
-            time.sleep(1 - (time.time() - self._window[0]))
-        self._window.append(time.time())
+        if (hit := self._hit(path)) is not None:
+            return hit
+        return self._store(path, self._reduce(path, self._fetch(path, self._streams(path))))
 
-        url = f"{self._BASE}{path}"
-        with httpx.Client(timeout=30) as client:
-            r = client.get(url)
-            r.raise_for_status()
-            return r.json()
+    @property
+    def _cache_on_loop(self) -> bool:
+        # only the in-process LRU is cheap enough to consult on the event
+        # loop; SQLite reads/writes and zlib (DiskCache) go to a thread
+        cache = self._cache
+        return cache is None or isinstance(cache, MemoryCache)
+
+    async def _ahit(self, path: str) -> Optional[Dict[str, Any]]:
+        if self._cache_on_loop:
+            return self._hit(path)
+        return await asyncio.to_thread(self._hit, path)
+
+    async def _astore(self, path: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        if self._cache_on_loop:
+            return self._store(path, data)
+        return await asyncio.to_thread(self._store, path, data)
+
+    async def _arun(self, path: str) -> Dict[str, Any]:
+        if (hit := await self._ahit(path)) is not None:
+            return hit
+        data = await self._afetch(path, self._streams(path))
+        return await self._astore(path, self._reduce(path, data))
+
+@dataclass(frozen=True, slots=True)
+class CompoundBrief:
+    """
+    Everything the LLM step needs from PubChem: the condensed summary and
+    its digest.  Built as soon as the detail records arrive, so the raw
+    responses are dropped inside fetch_details rather than carried through
+    the graph state for the rest of the evaluation.
+    """
+
+    summary: Dict[str, Any]
+    digest: str
+
+    @classmethod
+    def from_records(
+        cls, records: Dict[str, Any], max_tokens: Optional[int] = None
+    ) -> "CompoundBrief":
+        return cls.from_summary(_summarise_pubchem(records), max_tokens)
+
+    @classmethod
+    def from_summary(
+        cls, summary: Dict[str, Any], max_tokens: Optional[int] = None
+    ) -> "CompoundBrief":
+        summary = _trim_summary(summary, max_tokens)
+        return cls(summary, brief_digest(summary))
 
 class FibrosisState(TypedDict, total=False):
     drug_name: str
     cid: int
-    raw_records: Dict[str, Any]
+    brief: CompoundBrief
     relevance: int
     confidence: int
     conclusion: str
     rationale: str
+    brief_hash: str
+    verdict_cached: bool
+    usage: Dict[str, int]
+    llm_requests: int
+    route: str
     trace: List[str]
 
-def identify_cid(state: FibrosisState, tool: PubChemTool) -> FibrosisState:
-    path = f"/compound/name/{state['drug_name']}/cids/JSON"
-    data = tool.run(path)
+_NO_CIDS: Dict[str, Any] = {"IdentifierList": {"CID": []}}
+
+def _cid_path(drug_name: str) -> str:
+    return f"/compound/name/{drug_name}/cids/JSON"
+
+def _lookup_cids(tool: PubChemTool, path: str) -> Dict[str, Any]:
+    try:
+        return tool.run(path)
+    except httpx.HTTPStatusError as e:
+        # PUG-REST answers unknown names with 404 PUGREST.NotFound; cache the
+        # miss so the graph's identify_cid and later runs do not ask again
+        if e.response.status_code == 404:
+            return tool._store(path, _NO_CIDS)
+        raise
+
+async def _alookup_cids(tool: PubChemTool, path: str) -> Dict[str, Any]:
+    try:
+        return await tool.arun(path)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            return await tool._astore(path, _NO_CIDS)
+        raise
+
+def _cid_update(state: FibrosisState, path: str, data: Dict[str, Any]) -> FibrosisState:
     cids = data.get("IdentifierList", {}).get("CID", [])
     return {"cid": cids[0] if cids else None, "trace": state["trace"] + [path]}
 
-def fetch_details(state: FibrosisState, tool: PubChemTool) -> FibrosisState:
+def identify_cid(state: FibrosisState, tool: PubChemTool) -> FibrosisState:
+    if "cid" in state:
+        return {}  # resolved by the caller (see FibrosisEvaluator._evaluate)
+    path = _cid_path(state["drug_name"])
+    return _cid_update(state, path, _lookup_cids(tool, path))
+
+async def aidentify_cid(state: FibrosisState, tool: PubChemTool) -> FibrosisState:
+    if "cid" in state:
+        return {}
+    path = _cid_path(state["drug_name"])
+    return _cid_update(state, path, await _alookup_cids(tool, path))
+
+# Detail endpoints requested per CID.  "fast" is the original three calls;
+# "full" also pulls the compound's gene cross-references and depositor
+# descriptions, condensed by _summarise_pubchem.  PUG-REST answers 404
+# PUGREST.NotFound when a compound has neither; that absence is cached as an
+# empty record instead of failing the evaluation.  Other errors surface.
+_CORE_DETAIL_PATHS = (
+    "/compound/cid/{cid}/property/"
+    "MolecularFormula,MolecularWeight,CanonicalSMILES/JSON",
+    "/compound/cid/{cid}/classification/JSON",
+    "/compound/cid/{cid}/assaysummary/JSON",
+)
+_OPTIONAL_DETAIL_PATHS = (
+    "/compound/cid/{cid}/xrefs/GeneID/JSON",
+    "/compound/cid/{cid}/description/JSON",
+)
+DETAIL_PROFILES: Dict[str, tuple] = {
+    "fast": _CORE_DETAIL_PATHS,
+    "full": _CORE_DETAIL_PATHS + _OPTIONAL_DETAIL_PATHS,
+}
+
+def detail_paths(cid: int, profile: str = "fast") -> List[str]:
+    try:
+        templates = DETAIL_PROFILES[profile]
+    except KeyError:
+        raise ValueError(
+            f"Unknown detail profile {profile!r}; expected one of {sorted(DETAIL_PROFILES)}"
+        ) from None
+    return [t.format(cid=cid) for t in templates]
+
+def _fetch_one(tool: PubChemTool, path: str, optional: bool) -> Dict[str, Any]:
+    try:
+        return tool.run(path)
+    except CacheMiss:
+        if optional:
+            return {}
+        raise
+    except httpx.HTTPStatusError as e:
+        if optional and e.response.status_code == 404:
+            return tool._store(path, {})
+        raise
+
+async def _afetch_one(tool: PubChemTool, path: str, optional: bool) -> Dict[str, Any]:
+    try:
+        return await tool.arun(path)
+    except CacheMiss:
+        if optional:
+            return {}
+        raise
+    except httpx.HTTPStatusError as e:
+        if optional and e.response.status_code == 404:
+            return await tool._astore(path, {})
+        raise
+
+# Bounded pool for fanning out detail requests; the tool's rate limiter
+# still caps the combined request rate across every worker.
+_FETCH_WORKERS = 4
+_fetch_pool: Optional[ThreadPoolExecutor] = None
+_fetch_pool_lock = threading.Lock()
+
+def _get_fetch_pool() -> ThreadPoolExecutor:
+    global _fetch_pool
+    if _fetch_pool is None:
+        with _fetch_pool_lock:
+            if _fetch_pool is None:
+                _fetch_pool = ThreadPoolExecutor(
+                    max_workers=_FETCH_WORKERS, thread_name_prefix="pubchem-fetch"
+                )
+    return _fetch_pool
+
+def fetch_records(cid: int, tool: PubChemTool, profile: str = "fast") -> Dict[str, Any]:
+    """Detail records for ``cid`` keyed by request path, in profile order."""
+    paths = detail_paths(cid, profile)
+    optional = {t.format(cid=cid) for t in _OPTIONAL_DETAIL_PATHS}
+    # map() yields in submission order, so records and trace stay deterministic;
+    # each request runs in a copy of this context so its trace event is kept
+    contexts = [contextvars.copy_context() for _ in paths]
+    results = _get_fetch_pool().map(
+        lambda ctx, p: ctx.run(_fetch_one, tool, p, p in optional), contexts, paths
+    )
+    return dict(zip(paths, results))
+
+def _progress_writer():
+    # custom stream events for astream(); a no-op outside a graph run
+    try:
+        from langgraph.config import get_stream_writer
+
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda _event: None
+
+async def afetch_records(cid: int, tool: PubChemTool, profile: str = "fast") -> Dict[str, Any]:
+    paths = detail_paths(cid, profile)
+    optional = {t.format(cid=cid) for t in _OPTIONAL_DETAIL_PATHS}
+    write = _progress_writer()
+
+    async def fetch(path: str) -> Dict[str, Any]:
+        record = await _afetch_one(tool, path, path in optional)
+        write({"event": "record", "data": {"path": path, "empty": not record}})
+        return record
+
+    # gather() keeps argument order, same as the threaded map() above
+    results = await asyncio.gather(*(fetch(p) for p in paths))
+    return dict(zip(paths, results))
+
+def fetch_details(
+    state: FibrosisState,
+    tool: PubChemTool,
+    profile: str = "fast",
+    brief_tokens: Optional[int] = None,
+    briefs: Optional[Dict[int, CompoundBrief]] = None,
+) -> FibrosisState:
     cid = state.get("cid")
     if cid is None:
         return {}
-    paths = [
-        f"/compound/cid/{cid}/property/"
-        "MolecularFormula,MolecularWeight,CanonicalSMILES/JSON",
-        f"/compound/cid/{cid}/classification/JSON",
-        f"/compound/cid/{cid}/assaysummary/JSON",
-    ]
-    rec: Dict[str, Any] = {}
-    for p in paths:
-        rec[p] = tool.run(p)
+    records = fetch_records(cid, tool, profile)
+    # a brief built ahead by prepare_briefs is used once, then dropped
+    brief = briefs.pop(cid, None) if briefs is not None else None
+    return {
+        "brief": brief or CompoundBrief.from_records(records, brief_tokens),
+        "trace": state["trace"] + list(records),
+    }
+
+async def afetch_details(
+    state: FibrosisState,
+    tool: PubChemTool,
+    profile: str = "fast",
+    brief_tokens: Optional[int] = None,
+    briefs: Optional[Dict[int, CompoundBrief]] = None,
+) -> FibrosisState:
+    cid = state.get("cid")
+    if cid is None:
+        return {}
+    records = await afetch_records(cid, tool, profile)
+    brief = briefs.pop(cid, None) if briefs is not None else None
+    if brief is None:
+        # large assay tables make summarising CPU-bound; keep it off the loop
+        brief = await asyncio.to_thread(CompoundBrief.from_records, records, brief_tokens)
+    return {"brief": brief, "trace": state["trace"] + list(records)}
+
+# ----  batch prefetch  ----------------------------------------------------
+# PUG-REST accepts comma-separated CID lists for these operations and tags
+# every returned row with its CID, so one request can be split back into
+# the per-compound records fetch_details would have asked for.  The value
+# is the chunk size (assay tables are large, so fewer CIDs per request).
+_BULK_CHUNKS: Dict[str, int] = {"property": 100, "assaysummary": 10}
+
+def _chunks(items: List[Any], size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def resolve_cids(names: List[str], tool: PubChemTool) -> Dict[str, Optional[int]]:
+    """
+    Resolve many drug names to their first CID.
+
+    PUG-REST's name namespace takes a single name per request (names may
+    themselves contain commas), so lookups stay per-name but are deduped,
+    fanned out on the fetch pool and cached, which lets each evaluation's
+    own lookup answer from the cache.  A name whose lookup fails
+    maps to None; its own evaluation then retries it and fails alone.
+    """
+    unique = list(dict.fromkeys(names))
+    paths = [_cid_path(n) for n in unique]
+
+    def lookup(path: str) -> Dict[str, Any]:
+        try:
+            return _lookup_cids(tool, path)
+        except Exception as e:
+            logger.warning("resolving %s failed: %s", path, e)
+            return _NO_CIDS
+
+    results = _get_fetch_pool().map(lookup, paths)
+    out: Dict[str, Optional[int]] = {}
+    for name, data in zip(unique, results):
+        cids = data.get("IdentifierList", {}).get("CID", [])
+        out[name] = cids[0] if cids else None
+    return out
+
+def _split_properties(blob: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+    props = blob.get("PropertyTable", {}).get("Properties", [])
     return {
-        "raw_records": rec,
-        "trace": state["trace"] + paths,
+        p["CID"]: {"PropertyTable": {"Properties": [p]}} for p in props if "CID" in p
     }
 
+def _split_assay_rows(rows: Iterator[Dict[str, Any]], cids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Split a multi-CID assay table into per-CID tables as its rows stream
+    in.  Each CID keeps its own list, reduced like a streamed per-CID table
+    (see ``_keep_assay_rows``), so only the rows the summary reads are ever
+    held; the download stops once every CID's table is done.
+    """
+    kept: Dict[int, List[Dict[str, Any]]] = {cid: [] for cid in cids}
+    done: set = set()
+    for row in rows:
+        cid = row.get("CID")
+        if cid is None:
+            return {}  # cannot attribute rows; let fetch_details ask per CID
+        if cid in done:
+            continue
+        if not _keeps_row(row, kept.setdefault(cid, [])):
+            done.add(cid)
+            if len(done) == len(kept):
+                break
+    return {cid: {"AssayTable": {"Rows": r}} for cid, r in kept.items()}
+
+def _split_assays(blob: Dict[str, Any], cids: List[int]) -> Dict[int, Dict[str, Any]]:
+    return _split_assay_rows(iter(blob.get("AssayTable", {}).get("Rows", [])), cids)
+
+def _fetch_split(tool: PubChemTool, op: str, path: str, cids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Per-CID records from one bulk request; the combined blob is never cached."""
+    if op == "property":
+        return _split_properties(tool._fetch(path))
+    if tool.stream_assays:
+        # tables for up to a chunk of CIDs: split while streaming, never whole
+        return tool._fetch(path, True, lambda rows: _split_assay_rows(rows, cids))
+    return _split_assays(tool._fetch(path), cids)
+
+def prefetch_details(cids: List[int], tool: PubChemTool, profile: str = "fast") -> int:
+    """
+    Warm ``tool``'s cache with per-CID detail records fetched in bulk.
+
+    Returns the number of PubChem requests issued.  Operations that cannot
+    be split per compound (classification, the optional endpoints) are left
+    to fetch_details, as are the compounds of a chunk whose bulk request
+    fails: prefetching is best effort and never raises for a chunk.
+    """
+    cids = sorted({c for c in cids if c is not None})
+    cache = tool._cache
+    if not cids or cache is None or tool.offline:
+        return 0
+    requests = 0
+    for template in DETAIL_PROFILES[profile]:
+        op = endpoint_of(template)
+        size = _BULK_CHUNKS.get(op)
+        if size is None:
+            continue
+        todo = [c for c in cids if cache.get(template.format(cid=c)) is None]
+        for chunk in _chunks(todo, size):
+            requests += 1
+            try:
+                split = _fetch_split(tool, op, template.format(cid=",".join(map(str, chunk))), chunk)
+            except Exception as e:
+                # 404: no compound in the chunk has this record; nothing to
+                # split, so each one's own request in fetch_details settles it
+                if not (isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 404):
+                    logger.warning("bulk %s request for %d CIDs failed: %s", op, len(chunk), e)
+                continue
+            for cid, record in split.items():
+                tool._store(template.format(cid=cid), record)
+    return requests
+
+def prepare_briefs(
+    cids: List[int],
+    tool: PubChemTool,
+    profile: str = "fast",
+    brief_tokens: Optional[int] = None,
+) -> Dict[int, CompoundBrief]:
+    """
+    Briefs for a chunk of compounds, summarised together so their assay
+    tables share one pass of title matching (see ``_summarise_many``).
+
+    Meant to follow ``prefetch_details``: records come from ``tool``'s
+    cache where possible and the rest are fetched on the fetch pool.  A
+    compound whose records cannot be fetched is left out; fetch_details
+    then builds its brief (and raises its error) as usual.
+    """
+    cids = sorted({c for c in cids if c is not None})
+    optional = {t.format(cid=c) for c in cids for t in _OPTIONAL_DETAIL_PATHS}
+    jobs = [(cid, path) for cid in cids for path in detail_paths(cid, profile)]
+
+    def fetch(job: tuple) -> Optional[Dict[str, Any]]:
+        try:
+            return _fetch_one(tool, job[1], job[1] in optional)
+        except Exception:
+            return None
+
+    records: Dict[int, Dict[str, Any]] = {cid: {} for cid in cids}
+    for (cid, path), record in zip(jobs, _get_fetch_pool().map(fetch, jobs)):
+        if record is None:
+            records.pop(cid, None)
+        elif cid in records:
+            records[cid][path] = record
+    summaries = _summarise_many(list(records.values()))
+    return {cid: CompoundBrief.from_summary(summary, brief_tokens)
+            for cid, summary in zip(records, summaries)}
+
+# Enhanced fibrosis-related terms based on research
 _FIBROSIS_TERMS = (
-    "fibro", "cardiac", "heart", "tgf", "brd4", "collagen", "myofibro"
+    # Direct fibrosis and cardiac terms
+    "fibro", "cardiac", "heart", "cardio", "myocard",
+
+    # Growth factors and signaling pathways critical in fibrosis
+    "tgf", "transforming growth factor", "smad", "wnt", "mapk", "nf-kb",
+    "gsk3", "ctgf", "pdgf", "fgf", "egf", "igf",
+
+    # Cell types and processes involved in fibrosis
+    "myofibro", "fibroblast", "epithelial-mesenchymal", "emt",
+    "endothelial-mesenchymal", "endmt", "inflamm",
+
+    # ECM components and remodeling
+    "collagen", "extracellular matrix", "ecm", "mmp", "timp",
+    "fibronectin", "laminin", "elastin", "proteoglycan",
+
+    # Receptors and signaling molecules important in fibrosis
+    "integrin", "angiotensin", "aldosterone", "endothelin",
+    "thrombospondin", "interleukin", "cytokine", "chemokine",
+
+    # Epigenetic regulators (important for capturing BRD4 inhibitors)
+    "brd4", "brd", "bromodomain", "bet", "epigenetic", "histone",
+    "acetyl", "methylation", "chromatin", "hdac", "sirtuin",
+
+    # Anti-fibrotic compounds
+    "pirfenidone", "nintedanib", "tranilast", "relaxin",
+
+    # Cardiomyopathy-related terms
+    "hypertrophy", "cardiomyopathy", "heart failure",
 )
+# Human NCBI Gene IDs worth showing the model when a compound cross-references
+# them (xrefs/GeneID), with the mechanism category each one points at.
+_FIBROSIS_GENES: Dict[int, tuple] = {
+    23476: ("BRD4", "brd4"),
+    7040: ("TGFB1", "tgf"), 7046: ("TGFBR1", "tgf"), 7048: ("TGFBR2", "tgf"),
+    4087: ("SMAD2", "tgf"), 4088: ("SMAD3", "tgf"), 4089: ("SMAD4", "tgf"),
+    1490: ("CCN2", None), 1277: ("COL1A1", None), 59: ("ACTA2", None),
+}
+# descriptions are depositor prose; keep the start, which names the mechanism
+_MAX_DESCRIPTION_CHARS = 500
+
+def _trie_pattern(terms) -> str:
+    """
+    Regex source matching any of ``terms``, factored into a prefix trie.
+
+    CPython's engine cannot skip ahead on a flat alternation, but a trie
+    branches on one character at a time, so each title is walked once.
+    Optional tails are greedy, so the longest term at a position wins.
+    """
+    trie: Dict[str, Any] = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: Dict[str, Any]) -> str:
+        alts = [re.escape(ch) + emit(sub) for ch, sub in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 and "" not in node else f"(?:{'|'.join(alts)})"
+        return f"{body}?" if "" in node else body
+
+    return emit(trie)
+
+class _TermMatcher:
+    """
+    Precompiled multi-category term matcher, built once at import.
+
+    ``categories(text)`` reports every category with a term occurring in
+    ``text``, exactly as ``any(t in text for t in terms)`` would per
+    category.  The scan looks ahead at every position for the longest term
+    starting there; each term knows all categories whose terms it contains,
+    which covers terms nested inside a longer match.
+    """
+
+    def __init__(self, categories: Dict[str, tuple]) -> None:
+        terms = sorted(set().union(*categories.values()))
+        source = _trie_pattern(terms)
+        self._any = re.compile(source)
+        self._each = re.compile(f"(?=({source}))")
+        self._term_categories = {
+            term: frozenset(
+                name for name, group in categories.items()
+                if any(t in term for t in group)
+            )
+            for term in terms
+        }
+
+    def categories(self, text: str) -> frozenset:
+        if not self._any.search(text):  # the common case: nothing relevant
+            return frozenset()
+        found: set = set()
+        for term in self._each.findall(text):
+            found |= self._term_categories[term]
+        return frozenset(found)
+
+_ASSAY_MATCHER = _TermMatcher({
+    "fibrosis": _FIBROSIS_TERMS,
+    "brd4": ("brd4", "bromodomain", "bet"),
+    "anti_fibrotic": ("anti-fibrotic", "antifibrotic", "fibrosis inhibit"),
+    "tgf": ("tgf", "transforming growth factor"),
+})
+_DESCRIPTION_MATCHER = _TermMatcher({
+    "fibrosis": _FIBROSIS_TERMS,
+    "anti_fibrotic": ("anti-fibrotic", "antifibrotic", "reduces fibrosis"),
+})
 
-def _summarise_pubchem(records: Dict[str, Any]) -> Dict[str, Any]:
+# Assay cap applied by select_assays: once 15 relevant assays are kept, the
+# first inactive row ends the scan of a table.
+_MAX_ASSAYS = 15
+
+def _keeps_row(row: Dict[str, Any], kept: List[Dict[str, Any]]) -> bool:
+    """Record ``row`` if relevant; False once the summary would stop reading."""
+    if "fibrosis" in _ASSAY_MATCHER.categories(row.get("Name", "").lower()):
+        kept.append(row)
+    return not (len(kept) >= _MAX_ASSAYS and row.get("ActivityOutcome", "") != "Active")
+
+def _keep_assay_rows(rows: Iterator[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Reduce a streamed assay table to the rows the summary uses: every
+    fibrosis-relevant row (all mechanism evidence is a subset of those) up
+    to the point where the summary's cap would stop.  Returning early stops
+    the download.
+    """
+    kept: List[Dict[str, Any]] = []
+    for row in rows:
+        if not _keeps_row(row, kept):
+            break
+    return {"AssayTable": {"Rows": kept}}
+
+async def _akeep_assay_rows(rows: AsyncIterator[Dict[str, Any]]) -> Dict[str, Any]:
+    kept: List[Dict[str, Any]] = []
+    async for row in rows:
+        if not _keeps_row(row, kept):
+            break
+    return {"AssayTable": {"Rows": kept}}
+
+def _as_list(value: Any) -> List[Any]:
+    return value if isinstance(value, list) else [value]
+
+def _assay_rows(blobs: List[Any]) -> List[List[Dict[str, Any]]]:
+    return [blob.get("AssayTable", {}).get("Rows", []) for blob in blobs]
+
+def _select_assays(tables: List[List[List[Dict[str, Any]]]]) -> List[Selection]:
+    return select_assays(tables, _ASSAY_MATCHER.categories, _MAX_ASSAYS)
+
+def _summarise_many(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    ``_summarise_pubchem`` for several compounds, selecting their assay
+    rows together so each distinct assay title is matched only once.
+    """
+    tables = [
+        _assay_rows([blob for path, blob in records.items() if "/assaysummary/" in path])
+        for records in batch
+    ]
+    return [_summarise_pubchem(records, selection)
+            for records, selection in zip(batch, _select_assays(tables))]
+
+def _summarise_pubchem(
+    records: Dict[str, Any], selection: Optional[Selection] = None
+) -> Dict[str, Any]:
     """
     Condense PubChem blobs to fields relevant for cardiac fibrosis analysis.
     
@@ -81,280 +874,272 @@ def _summarise_pubchem(records: Dict[str, Any]) -> Dict[str, Any]:
     - Bioactivity data particularly related to TGF-β and fibrosis pathways
     - Classifications and biological targets
     - Epigenetic mechanisms including BRD4 inhibition
+
+    ``selection`` is this compound's precomputed assay selection when
+    called from ``_summarise_many``.
     """
+    # Single dispatch pass: bucket every blob by the record kinds its path
+    # names, then condense each bucket below.
+    prop_blob = class_blob = None
+    assay_blobs, xref_blobs, description_blobs = [], [], []
+    for path, blob in records.items():
+        if prop_blob is None and "/property/" in path:
+            prop_blob = blob
+        if class_blob is None and "/classification/" in path:
+            class_blob = blob
+        if "/assaysummary/" in path:
+            assay_blobs.append(blob)
+        if "/xrefs/" in path:
+            xref_blobs.append(blob)
+        if "/description/" in path:
+            description_blobs.append(blob)
+
     summary: Dict[str, Any] = {}
-    
+    mechanisms: Dict[str, bool] = {}
+
+    def detect(flag: str) -> None:
+        # detected_mechanisms is attached the first time anything is found
+        summary.setdefault("detected_mechanisms", mechanisms)
+        mechanisms[flag] = True
+
     # Basic chemical properties
-    for path, blob in records.items():
-        if "/property/" in path:
-            props = blob.get("PropertyTable", {}).get("Properties", [{}])[0]
-            summary["formula"] = props.get("MolecularFormula")
-            summary["mol_weight"] = props.get("MolecularWeight")
-            summary["canonical_smiles"] = props.get("CanonicalSMILES")
-            summary["hydrogen_bond_donors"] = props.get("HBondDonorCount")
-            summary["hydrogen_bond_acceptors"] = props.get("HBondAcceptorCount")
-            summary["rotatable_bonds"] = props.get("RotatableBondCount")
-            summary["xlogp"] = props.get("XLogP")  # Lipophilicity
-            summary["topological_polar_surface_area"] = props.get("TPSA")
-            break
-    
+    if prop_blob is not None:
+        props = prop_blob.get("PropertyTable", {}).get("Properties", [{}])[0]
+        summary["formula"] = props.get("MolecularFormula")
+        summary["mol_weight"] = props.get("MolecularWeight")
+        summary["canonical_smiles"] = props.get("CanonicalSMILES")
+        summary["hydrogen_bond_donors"] = props.get("HBondDonorCount")
+        summary["hydrogen_bond_acceptors"] = props.get("HBondAcceptorCount")
+        summary["rotatable_bonds"] = props.get("RotatableBondCount")
+        summary["xlogp"] = props.get("XLogP")  # Lipophilicity
+        summary["topological_polar_surface_area"] = props.get("TPSA")
+
     # Chemical classification
-    for path, blob in records.items():
-        if "/classification/" in path:
-            class_tree = blob.get("HierarchicalClassificationTree", {})
-            class_node = class_tree.get("ClassificationNode", {})
-            
-            # Extract hierarchical classification
-            cl = class_node.get("ToOne", {})
-            levels = []
-            while isinstance(cl, dict) and "NodeName" in cl and len(levels) < 5:
-                levels.append(cl["NodeName"])
-                cl = cl.get("ToOne", {})
-            summary["classification"] = " ⭢ ".join(levels) if levels else None
-            
-            # Extract alternate classifications if available
-            summary["pharmacological_class"] = None
-            summary["mechanism_of_action"] = None
-            if "AlternateNodes" in class_node:
-                alt_nodes = class_node.get("AlternateNodes", {}).get("AlternateNode", [])
-                if not isinstance(alt_nodes, list):
-                    alt_nodes = [alt_nodes]
-                
-                for node in alt_nodes:
-                    category = node.get("CategoryName", "")
-                    node_name = node.get("NodeName", "")
-                    if "Pharmacologic" in category:
-                        summary["pharmacological_class"] = node_name
-                    elif "Mechanism" in category:
-                        summary["mechanism_of_action"] = node_name
-            break
-    
-    # Enhanced fibrosis-related terms based on research
-    _FIBROSIS_TERMS = [
-        # Direct fibrosis and cardiac terms
-        "fibro", "cardiac", "heart", "cardio", "myocard", 
-        
-        # Growth factors and signaling pathways critical in fibrosis
-        "tgf", "transforming growth factor", "smad", "wnt", "mapk", "nf-kb",
-        "gsk3", "ctgf", "pdgf", "fgf", "egf", "igf",
-        
-        # Cell types and processes involved in fibrosis
-        "myofibro", "fibroblast", "epithelial-mesenchymal", "emt",
-        "endothelial-mesenchymal", "endmt", "inflamm",
-        
-        # ECM components and remodeling
-        "collagen", "extracellular matrix", "ecm", "mmp", "timp",
-        "fibronectin", "laminin", "elastin", "proteoglycan",
-        
-        # Receptors and signaling molecules important in fibrosis
-        "integrin", "angiotensin", "aldosterone", "endothelin", 
-        "thrombospondin", "interleukin", "cytokine", "chemokine",
-        
-        # Epigenetic regulators (important for capturing BRD4 inhibitors)
-        "brd4", "brd", "bromodomain", "bet", "epigenetic", "histone",
-        "acetyl", "methylation", "chromatin", "hdac", "sirtuin",
-        
-        # Anti-fibrotic compounds
-        "pirfenidone", "nintedanib", "tranilast", "relaxin",
-        
-        # Cardiomyopathy-related terms
-        "hypertrophy", "cardiomyopathy", "heart failure"
-    ]
-    
-    # Fibrosis-related bioassays
+    if class_blob is not None:
+        class_tree = class_blob.get("HierarchicalClassificationTree", {})
+        class_node = class_tree.get("ClassificationNode", {})
+
+        # Extract hierarchical classification
+        cl = class_node.get("ToOne", {})
+        levels = []
+        while isinstance(cl, dict) and "NodeName" in cl and len(levels) < 5:
+            levels.append(cl["NodeName"])
+            cl = cl.get("ToOne", {})
+        summary["classification"] = " ⭢ ".join(levels) if levels else None
+
+        # Extract alternate classifications if available
+        summary["pharmacological_class"] = None
+        summary["mechanism_of_action"] = None
+        if "AlternateNodes" in class_node:
+            alt_nodes = _as_list(class_node.get("AlternateNodes", {}).get("AlternateNode", []))
+            for node in alt_nodes:
+                category = node.get("CategoryName", "")
+                node_name = node.get("NodeName", "")
+                if "Pharmacologic" in category:
+                    summary["pharmacological_class"] = node_name
+                elif "Mechanism" in category:
+                    summary["mechanism_of_action"] = node_name
+
+    # Fibrosis-related bioassays, capped at _MAX_ASSAYS (see select_assays)
+    if selection is None:
+        selection = _select_assays([_assay_rows(assay_blobs)])[0]
+    kept, evidence = selection
     assays = []
-    brd4_inhibitor_evidence = False
-    anti_fibrotic_evidence = False
-    tgf_beta_evidence = False
-    
-    for path, blob in records.items():
-        if "/assaysummary/" in path:
-            rows = blob.get("AssayTable", {}).get("Rows", [])
-            for row in rows:
-                title = row.get("Name", "").lower()
-                outcome = row.get("ActivityOutcome", "")
-                
-                # Check for BRD4 inhibitor evidence
-                if ("brd4" in title or "bromodomain" in title or "bet" in title) and outcome == "Active":
-                    brd4_inhibitor_evidence = True
-                
-                # Check for anti-fibrotic evidence
-                if any(term in title for term in ["anti-fibrotic", "antifibrotic", "fibrosis inhibit"]) and outcome == "Active":
-                    anti_fibrotic_evidence = True
-                
-                # Check for TGF-β activity
-                if ("tgf" in title or "transforming growth factor" in title) and outcome == "Active":
-                    tgf_beta_evidence = True
-                
-                # Include assays related to fibrosis terms
-                if any(t in title for t in _FIBROSIS_TERMS):
-                    assay_data = {
-                        "aid": row.get("AID"),
-                        "title": row.get("Name"),
-                        "outcome": outcome,
-                        "activity_value": row.get("ActivityValue"),
-                        "activity_unit": row.get("ActivityUnit"),
-                    }
-                    
-                    # Add assay type if available
-                    assay_type = row.get("AssayType")
-                    if assay_type:
-                        assay_data["assay_type"] = assay_type
-                    
-                    assays.append(assay_data)
-                
-                # Limit to reasonable number while prioritizing active results
-                if len(assays) >= 15 and outcome != "Active":
-                    break
-    
+    for row in kept:
+        assay_data = {
+            "aid": row.get("AID"),
+            "title": row.get("Name"),
+            "outcome": row.get("ActivityOutcome", ""),
+            "activity_value": row.get("ActivityValue"),
+            "activity_unit": row.get("ActivityUnit"),
+        }
+        assay_type = row.get("AssayType")
+        if assay_type:
+            assay_data["assay_type"] = assay_type
+        assays.append(assay_data)
+
     if assays:
         summary["assays"] = assays
-    
-    # Add detected mechanisms
-    detected_mechanisms = {}
-    if brd4_inhibitor_evidence:
-        detected_mechanisms["BRD4_inhibitor"] = True
-    if anti_fibrotic_evidence:
-        detected_mechanisms["anti_fibrotic"] = True
-    if tgf_beta_evidence:
-        detected_mechanisms["tgf_beta_modulator"] = True
-    
-    if detected_mechanisms:
-        summary["detected_mechanisms"] = detected_mechanisms
-    
-    # Target interactions - particularly important for fibrosis
+    for cat, flag in (("brd4", "BRD4_inhibitor"),
+                      ("anti_fibrotic", "anti_fibrotic"),
+                      ("tgf", "tgf_beta_modulator")):
+        if cat in evidence:
+            detect(flag)
+
+    # Genes the compound is cross-referenced to, as PUG-REST lists them by ID
     targets = []
-    for path, blob in records.items():
-        if "/target/" in path or "/protein/" in path:
-            target_data = blob.get("ProteinTargets", {}).get("Targets", [])
-            if not isinstance(target_data, list):
-                target_data = [target_data]
-                
-            for target in target_data:
-                target_name = target.get("Name", "").lower() if target.get("Name") else ""
-                important_targets = [
-                    "tgf", "smad", "integrin", "receptor", "kinase", "brd", 
-                    "bromodomain", "hdac", "acetyltransferase", "methyltransferase"
-                ]
-                if any(t in target_name for t in important_targets):
-                    target_info = {
-                        "name": target.get("Name"),
-                        "id": target.get("ID"),
-                        "interaction_type": target.get("InteractionType", "Unknown"),
-                    }
-                    targets.append(target_info)
-                    
-                    # Update mechanism info based on targets
-                    if "brd4" in target_name or "bromodomain" in target_name:
-                        if not "detected_mechanisms" in summary:
-                            summary["detected_mechanisms"] = {}
-                        summary["detected_mechanisms"]["BRD4_inhibitor"] = True
-                    
-                    if "tgf" in target_name or "transforming growth factor" in target_name:
-                        if not "detected_mechanisms" in summary:
-                            summary["detected_mechanisms"] = {}
-                        summary["detected_mechanisms"]["tgf_beta_modulator"] = True
-    
+    for blob in xref_blobs:
+        for info in _as_list(blob.get("InformationList", {}).get("Information", [])):
+            for gene_id in _as_list(info.get("GeneID", [])):
+                if gene_id not in _FIBROSIS_GENES:
+                    continue
+                symbol, cat = _FIBROSIS_GENES[gene_id]
+                targets.append({
+                    "name": symbol,
+                    "id": gene_id,
+                    "interaction_type": "GeneID cross-reference",
+                })
+                if cat == "brd4":
+                    detect("BRD4_inhibitor")
+                if cat == "tgf":
+                    detect("tgf_beta_modulator")
     if targets:
         summary["targets"] = targets
-    
-    # Pathways information
-    pathways = []
-    for path, blob in records.items():
-        if "/pathway/" in path:
-            pathway_data = blob.get("PathwayList", {}).get("Pathways", [])
-            if not isinstance(pathway_data, list):
-                pathway_data = [pathway_data]
-                
-            for pathway in pathway_data:
-                pathway_name = pathway.get("Name", "").lower() if pathway.get("Name") else ""
-                important_pathways = [
-                    "tgf", "smad", "wnt", "mapk", "fibrosis", "cardiac", "brd", 
-                    "bromodomain", "inflammatory", "nf-kb"
-                ]
-                if any(t in pathway_name for t in important_pathways):
-                    pathway_info = {
-                        "name": pathway.get("Name"),
-                        "id": pathway.get("ID"),
-                        "source": pathway.get("Source")
-                    }
-                    pathways.append(pathway_info)
-                    
-                    # Update mechanism info based on pathways
-                    if "fibrosis" in pathway_name:
-                        if not "detected_mechanisms" in summary:
-                            summary["detected_mechanisms"] = {}
-                        summary["detected_mechanisms"]["fibrosis_related"] = True
-    
-    if pathways:
-        summary["pathways"] = pathways
-    
-    # Literature mentions - search for fibrosis-related terms in title or abstract
-    literature_mentions = []
-    for path, blob in records.items():
-        if "/literature/" in path:
-            refs = blob.get("References", [])
-            if not isinstance(refs, list):
-                refs = [refs]
-            
-            for ref in refs:
-                title = ref.get("Title", "").lower() if ref.get("Title") else ""
-                abstract = ref.get("Abstract", "").lower() if ref.get("Abstract") else ""
-                
-                if any(t in title or t in abstract for t in _FIBROSIS_TERMS):
-                    lit_info = {
-                        "pmid": ref.get("PMID"),
-                        "title": ref.get("Title"),
-                        "year": ref.get("Year")
-                    }
-                    literature_mentions.append(lit_info)
-                    
-                    # Update mechanism info based on literature
-                    if any(t in title or t in abstract for t in ["anti-fibrotic", "antifibrotic", "reduces fibrosis"]):
-                        if not "detected_mechanisms" in summary:
-                            summary["detected_mechanisms"] = {}
-                        summary["detected_mechanisms"]["anti_fibrotic_literature"] = True
-    
-    if literature_mentions:
-        summary["literature_mentions"] = literature_mentions
-    
+
+    # Depositor descriptions that mention fibrosis-related biology
+    descriptions = []
+    for blob in description_blobs:
+        for info in _as_list(blob.get("InformationList", {}).get("Information", [])):
+            text = info.get("Description")
+            if not text:
+                continue
+            cats = _DESCRIPTION_MATCHER.categories(text.lower())
+            if "fibrosis" not in cats:
+                continue
+            descriptions.append({
+                "source": info.get("DescriptionSourceName"),
+                "text": text[:_MAX_DESCRIPTION_CHARS],
+            })
+            if "anti_fibrotic" in cats:
+                detect("anti_fibrotic_literature")
+    if descriptions:
+        summary["descriptions"] = descriptions
+
     return summary
 
-def analyze_fibrosis(state: FibrosisState, llm: ChatOpenAI) -> FibrosisState:
-    records = state.get("raw_records", {})
-    concise = _summarise_pubchem(records)
+# Bump whenever the prompt or verdict parsing changes meaning so verdicts
+# cached under the old wording are not reused.
+PROMPT_VERSION = "2"
+_UNPARSED_RATIONALE = "Could not parse LLM output"
 
-    llm_json = llm.bind(response_format={"type": "json_object"})
-    prompt = (
-        "You are a biomedical expert. For the compound described below, decide "
-        "whether its implications for reversing cardiac fibrosis are POSITIVE, "
-        "NEGATIVE, or INDETERMINATE, and produce quantitative relevance and "
-        "confidence scores.\n\n"
-        "Scoring guidelines:\n"
-        "  • relevance (0-100):\n"
-        "        0   = actively harmful / promotes fibrosis\n"
-        "       50   = neutral or unclear effect\n"
-        "      100   = strongly beneficial / anti-fibrotic\n"
-        "  • confidence (0-100):\n"
-        "        0   = completely unsure\n"
-        "      100   = absolutely certain\n\n"
-        "Decision label guidelines:\n"
-        "  • POSITIVE  = inhibits BRD4 or TGF-β signaling, reduces collagen "
-        "deposition or fibroblast activation.\n"
-        "  • NEGATIVE  = activates pro-fibrotic pathways or is cardiotoxic.\n"
-        "  • INDETERMINATE = evidence is insufficient or conflicting.\n\n"
-        f"COMPOUND_BRIEF = {json.dumps(concise, ensure_ascii=False)}\n\n"
-        "Return a JSON object with exactly these keys:\n"
-        "  conclusion  — one of POSITIVE, NEGATIVE, INDETERMINATE\n"
-        "  relevance   — integer 0-100\n"
-        "  confidence  — integer 0-100\n"
-        "  rationale   — brief explanation supporting the scores\n"
-    )
-    msg = llm_json.invoke(prompt)
+_GUIDELINES = (
+    "Scoring guidelines:\n"
+    "  • relevance (0-100):\n"
+    "        0   = actively harmful / promotes fibrosis\n"
+    "       50   = neutral or unclear effect\n"
+    "      100   = strongly beneficial / anti-fibrotic\n"
+    "  • confidence (0-100):\n"
+    "        0   = completely unsure\n"
+    "      100   = absolutely certain\n\n"
+    "Decision label guidelines:\n"
+    "  • POSITIVE  = inhibits BRD4 or TGF-β signaling, reduces collagen "
+    "deposition or fibroblast activation.\n"
+    "  • NEGATIVE  = activates pro-fibrotic pathways or is cardiotoxic.\n"
+    "  • INDETERMINATE = evidence is insufficient or conflicting.\n\n"
+)
+_VERDICT_KEYS = (
+    "  conclusion  — one of POSITIVE, NEGATIVE, INDETERMINATE\n"
+    "  relevance   — integer 0-100\n"
+    "  confidence  — integer 0-100\n"
+    "  rationale   — brief explanation supporting the scores\n"
+)
+
+# The instructions are a fixed system message and the brief comes last in
+# its own message, so every request shares one byte-identical prefix that
+# provider-side (and vLLM) prefix caches can reuse.
+_SYSTEM_PROMPT = (
+    "You are a biomedical expert. For the compound described in "
+    "COMPOUND_BRIEF, decide whether its implications for reversing cardiac "
+    "fibrosis are POSITIVE, NEGATIVE, or INDETERMINATE, and produce "
+    "quantitative relevance and confidence scores.\n\n"
+    + _GUIDELINES
+    + "Return a JSON object with exactly these keys:\n"
+    + _VERDICT_KEYS
+)
+
+def _fibrosis_prompt(concise: Dict[str, Any]) -> List[BaseMessage]:
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    return [
+        SystemMessage(_SYSTEM_PROMPT),
+        HumanMessage(f"COMPOUND_BRIEF = {json.dumps(concise, ensure_ascii=False)}"),
+    ]
+
+# ----  brief budget  ------------------------------------------------------
+# Upper bound on the brief's size in the prompt.  Scalars, classification
+# and detected mechanisms always stay; list sections are refilled in this
+# priority order until the budget is spent.
+BRIEF_TOKEN_BUDGET = 2000
+_TRIMMABLE = ("assays", "targets", "descriptions")
+
+def _estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English/JSON; close enough for budgeting
+    return len(text) // 4 + 1
+
+def _json_tokens(obj: Any) -> int:
+    return _estimate_tokens(json.dumps(obj, ensure_ascii=False))
+
+def _trim_summary(summary: Dict[str, Any], max_tokens: Optional[int]) -> Dict[str, Any]:
+    """
+    Fit ``summary`` into about ``max_tokens`` tokens (None = no limit).
+
+    Active assays go first, then the remaining assays, targets and
+    descriptions, each in its original order; the first entry that does
+    not fit ends the refill.  Kept entries keep their original positions
+    and ``omitted`` counts what was dropped per section.
+    """
+    if max_tokens is None or _json_tokens(summary) <= max_tokens:
+        return summary
+    fixed = {k: v for k, v in summary.items() if k not in _TRIMMABLE}
+    used = _json_tokens(fixed) + _json_tokens({"omitted": dict.fromkeys(_TRIMMABLE, 0)})
+    assays = summary.get("assays", [])
+    candidates = [("assays", i) for i, a in enumerate(assays) if a.get("outcome") == "Active"]
+    candidates += [("assays", i) for i, a in enumerate(assays) if a.get("outcome") != "Active"]
+    for section in _TRIMMABLE[1:]:
+        candidates += [(section, i) for i in range(len(summary.get(section, [])))]
+    kept: Dict[str, set] = {section: set() for section in _TRIMMABLE}
+    for section, i in candidates:
+        cost = _json_tokens(summary[section][i]) + 1
+        if used + cost > max_tokens:
+            break
+        kept[section].add(i)
+        used += cost
+
+    trimmed: Dict[str, Any] = {}
+    omitted: Dict[str, int] = {}
+    for key, value in summary.items():
+        if key not in _TRIMMABLE:
+            trimmed[key] = value
+            continue
+        items = [item for i, item in enumerate(value) if i in kept[key]]
+        if items:
+            trimmed[key] = items
+        if len(items) < len(value):
+            omitted[key] = len(value) - len(items)
+    trimmed["omitted"] = omitted
+    return trimmed
+
+_NO_USAGE = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+
+def _usage_of(msg: Any) -> Dict[str, int]:
+    """Token counts LangChain reports on the reply (zeros if it reports none)."""
+    meta = getattr(msg, "usage_metadata", None) or {}
+    details = meta.get("input_token_details") or {}
+    return {
+        "prompt_tokens": meta.get("input_tokens", 0),
+        "completion_tokens": meta.get("output_tokens", 0),
+        "cached_tokens": details.get("cache_read", 0) or 0,
+    }
+
+def _parse_verdict(msg: Any) -> FibrosisState:
     try:
         obj = json.loads(msg.content)
     except json.JSONDecodeError:
-        obj = {"conclusion": "Indeterminate", "rationale": "Could not parse LLM output"}
+        obj = None
+    if not _is_verdict(obj):
+        obj = {"conclusion": "Indeterminate", "rationale": _UNPARSED_RATIONALE}
+    return {**_verdict_from(obj), "usage": _usage_of(msg), "llm_requests": 1}
+
+def _is_verdict(obj: Any) -> bool:
+    """Whether ``obj`` has the verdict fields with types _verdict_from can use."""
+    if not isinstance(obj, dict) or not isinstance(obj.get("conclusion", ""), str):
+        return False
+    return all(
+        isinstance(obj[k], (int, float)) and not isinstance(obj[k], bool)
+        for k in ("relevance", "confidence") if k in obj
+    )
+
+def _verdict_from(obj: Dict[str, Any]) -> FibrosisState:
     return {
         "conclusion": obj.get("conclusion", "Indeterminate").title(),
         "relevance": obj.get("relevance", 50),
@@ -362,6 +1147,278 @@ def analyze_fibrosis(state: FibrosisState, llm: ChatOpenAI) -> FibrosisState:
         "rationale": obj.get("rationale", ""),
     }
 
+def _llm_identity(llm: Any) -> tuple:
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+    return model or type(llm).__name__, getattr(llm, "temperature", None)
+
+def _cached_verdict(
+    brief: CompoundBrief, llm: Any, verdict_cache: Optional[VerdictCache],
+    prompt_version: str = PROMPT_VERSION,
+) -> tuple:
+    if verdict_cache is None:
+        return None, None
+    key = verdict_key(*_llm_identity(llm), prompt_version, brief.digest)
+    return key, verdict_cache.get(key)
+
+def _find_verdict(
+    brief: CompoundBrief, llm: Any, verdict_cache: VerdictCache, versions: tuple,
+) -> Optional[FibrosisState]:
+    for version in dict.fromkeys(versions):
+        verdict = _cached_verdict(brief, llm, verdict_cache, version)[1]
+        if verdict is not None:
+            return verdict
+    return None
+
+def _brief_of(state: FibrosisState) -> CompoundBrief:
+    # no CID: fetch_details added nothing and the LLM sees an empty brief
+    return state.get("brief") or CompoundBrief.from_records({})
+
+def _remember_verdict(
+    verdict_cache: Optional[VerdictCache], key: Optional[str],
+    verdict: FibrosisState, llm: Any,
+) -> None:
+    if verdict_cache is not None and verdict["rationale"] != _UNPARSED_RATIONALE:
+        stored = {k: v for k, v in verdict.items() if k not in ("usage", "llm_requests")}
+        verdict_cache.set(key, stored, model=_llm_identity(llm)[0])
+
+def analyze_fibrosis(
+    state: FibrosisState, llm: ChatOpenAI, verdict_cache: Optional[VerdictCache] = None
+) -> FibrosisState:
+    brief = _brief_of(state)
+    key, verdict = _cached_verdict(brief, llm, verdict_cache)
+    if verdict is not None:
+        return {**verdict, "brief_hash": brief.digest, "verdict_cached": True}
+    llm_json = llm.bind(response_format={"type": "json_object"})
+    verdict = _parse_verdict(llm_json.invoke(_fibrosis_prompt(brief.summary)))
+    _remember_verdict(verdict_cache, key, verdict, llm)
+    return {**verdict, "brief_hash": brief.digest, "verdict_cached": False}
+
+async def _ascore_one(brief: CompoundBrief, llm: Any) -> FibrosisState:
+    llm_json = llm.bind(response_format={"type": "json_object"})
+    return _parse_verdict(await llm_json.ainvoke(_fibrosis_prompt(brief.summary)))
+
+async def aanalyze_fibrosis(
+    state: FibrosisState,
+    llm: ChatOpenAI,
+    verdict_cache: Optional[VerdictCache] = None,
+    scorer: Optional["BatchScorer"] = None,
+) -> FibrosisState:
+    brief = _brief_of(state)
+    # a batch scorer also reuses verdicts of the single-compound prompt
+    versions = (PROMPT_VERSION,) if scorer is None else (scorer.prompt_version, PROMPT_VERSION)
+    verdict = None
+    if verdict_cache is not None:
+        # the verdict cache is SQLite; keep its reads and writes off the loop
+        verdict = await asyncio.to_thread(_find_verdict, brief, llm, verdict_cache, versions)
+    if verdict is not None:
+        return {**verdict, "brief_hash": brief.digest, "verdict_cached": True}
+    if scorer is not None:
+        verdict = await scorer.ascore(brief)
+        version = verdict.pop("prompt_version", scorer.prompt_version)
+    else:
+        verdict = await _ascore_one(brief, llm)
+        version = PROMPT_VERSION
+    if verdict_cache is not None:
+        key = verdict_key(*_llm_identity(llm), version, brief.digest)
+        await asyncio.to_thread(_remember_verdict, verdict_cache, key, verdict, llm)
+    return {**verdict, "brief_hash": brief.digest, "verdict_cached": False}
+
+# ----  batched scoring  ---------------------------------------------------
+# For bulk screens several briefs share one request: the instructions are
+# sent once and the model returns one verdict per compound.  Briefs that
+# arrive within ``linger`` seconds of each other are packed together up to
+# ``max_batch`` compounds or ``max_tokens`` estimated prompt tokens.
+
+BATCH_PROMPT_VERSION = "batch-2"
+
+_BATCH_SYSTEM_PROMPT = (
+    "You are a biomedical expert. For each compound in COMPOUND_BRIEFS, "
+    "decide whether its implications for reversing cardiac fibrosis are "
+    "POSITIVE, NEGATIVE, or INDETERMINATE, and produce quantitative relevance "
+    "and confidence scores. Judge every compound on its own brief only.\n\n"
+    + _GUIDELINES
+    + "Return a JSON object with a single key \"results\": an array holding "
+    "one object per compound, each with exactly these keys:\n"
+    "  id          — the compound's id from COMPOUND_BRIEFS\n"
+    + _VERDICT_KEYS
+)
+
+def _batch_prompt(summaries: List[Dict[str, Any]]) -> List[BaseMessage]:
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    briefs = [{"id": i, "brief": s} for i, s in enumerate(summaries)]
+    return [
+        SystemMessage(_BATCH_SYSTEM_PROMPT),
+        HumanMessage(f"COMPOUND_BRIEFS = {json.dumps(briefs, ensure_ascii=False)}"),
+    ]
+
+_BATCH_OVERHEAD_TOKENS = _estimate_tokens(_BATCH_SYSTEM_PROMPT) + 8
+
+def _parse_batch(msg: Any, n: int) -> Optional[List[Optional[FibrosisState]]]:
+    """
+    Verdicts by position; None if the reply is unusable as a whole.  An
+    item that is malformed (or whose id cannot be matched) leaves its
+    position None, so only that compound is scored again on its own.
+    """
+    try:
+        results = json.loads(msg.content)["results"]
+    except (json.JSONDecodeError, KeyError, TypeError):
+        return None
+    if not isinstance(results, list):
+        return None
+    out: List[Optional[FibrosisState]] = [None] * n
+    for item in results:
+        if not _is_verdict(item) or "conclusion" not in item:
+            continue
+        i = item.get("id")
+        # models sometimes echo the id back as a string
+        if isinstance(i, str) and i.strip().isdigit():
+            i = int(i)
+        if isinstance(i, int) and not isinstance(i, bool) and 0 <= i < n and out[i] is None:
+            out[i] = _verdict_from(item)
+    return out
+
+class BatchScorer:
+    """
+    Scores briefs in multi-compound LLM requests (async callers only).
+
+    A batch whose reply cannot be parsed is split in half and retried;
+    compounds missing from an otherwise valid reply are scored alone with
+    the single-compound prompt.  ``stats`` counts requests made.
+    """
+
+    prompt_version = BATCH_PROMPT_VERSION
+
+    def __init__(
+        self,
+        llm: Any,
+        max_batch: int = 10,
+        max_tokens: int = 12_000,
+        linger: float = 0.1,
+    ) -> None:
+        self.llm = llm
+        self.max_batch = max_batch
+        self.max_tokens = max_tokens
+        self.linger = linger
+        self.stats = {"batch_requests": 0, "single_requests": 0}
+        self._pending: Dict[int, List[tuple]] = {}
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._tasks: set = set()
+
+    async def ascore(self, brief: CompoundBrief) -> FibrosisState:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(id(loop), [])
+        pending.append((brief, future))
+        if len(pending) >= self.max_batch:
+            self._flush(loop)
+        elif len(pending) == 1:
+            self._timers[id(loop)] = loop.call_later(self.linger, self._flush, loop)
+        return await future
+
+    def _flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        # a batch that filled up must not leave its timer to cut the next one short
+        timer = self._timers.pop(id(loop), None)
+        if timer is not None:
+            timer.cancel()
+        items = self._pending.pop(id(loop), [])
+        for batch in self._pack(items):
+            task = loop.create_task(self._score(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _pack(self, items: List[tuple]) -> List[List[tuple]]:
+        batches: List[List[tuple]] = []
+        batch: List[tuple] = []
+        tokens = _BATCH_OVERHEAD_TOKENS
+        for item in items:
+            cost = _estimate_tokens(json.dumps(item[0].summary, ensure_ascii=False))
+            if batch and (len(batch) >= self.max_batch or tokens + cost > self.max_tokens):
+                batches.append(batch)
+                batch, tokens = [], _BATCH_OVERHEAD_TOKENS
+            batch.append(item)
+            tokens += cost
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _score(self, batch: List[tuple]) -> None:
+        try:
+            verdicts = await self._score_briefs([brief for brief, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), verdict in zip(batch, verdicts):
+            if not future.done():
+                future.set_result(verdict)
+
+    async def _score_briefs(self, briefs: List[CompoundBrief]) -> List[FibrosisState]:
+        if len(briefs) == 1:
+            self.stats["single_requests"] += 1
+            verdict = await _ascore_one(briefs[0], self.llm)
+            # scored with the single-compound prompt, so cached under its version
+            return [{**verdict, "prompt_version": PROMPT_VERSION}]
+        self.stats["batch_requests"] += 1
+        llm_json = self.llm.bind(response_format={"type": "json_object"})
+        msg = await llm_json.ainvoke(_batch_prompt([b.summary for b in briefs]))
+        verdicts = _parse_batch(msg, len(briefs))
+        if verdicts is None:
+            # the failed request's tokens are not attributed to any compound
+            half = len(briefs) // 2
+            return (await self._score_briefs(briefs[:half])
+                    + await self._score_briefs(briefs[half:]))
+        usage = _usage_of(msg)
+        share = {k: round(v / len(briefs)) for k, v in usage.items()}
+        # tokens are shared out; the one request is counted on the first verdict
+        first = next((i for i, v in enumerate(verdicts) if v is not None), None)
+        verdicts = [v if v is None else {**v, "usage": share, "llm_requests": int(i == first)}
+                    for i, v in enumerate(verdicts)]
+        missing = [i for i, v in enumerate(verdicts) if v is None]
+        if missing:
+            retried = await asyncio.gather(*(self._score_briefs([briefs[i]]) for i in missing))
+            for i, (verdict,) in zip(missing, retried):
+                verdicts[i] = verdict
+        return verdicts
+
+
+# ----  rule-based fast path  ----------------------------------------------
+# Compounds PubChem cannot resolve, or whose brief holds nothing the model
+# could weigh for fibrosis, get the Indeterminate verdict without a model
+# call.  Anything with evidence, however weak, still goes to the model.
+_EVIDENCE_KEYS = (
+    "detected_mechanisms", "assays", "targets", "descriptions",
+    "pharmacological_class", "mechanism_of_action",
+)
+_RULE_RATIONALES = {
+    "no_cid": "No PubChem compound matched this name, so there is no evidence to assess.",
+    "no_evidence": "PubChem lists no fibrosis-related assays, gene cross-references, "
+                   "descriptions or mechanism annotations for this compound.",
+}
+
+def triage(state: FibrosisState) -> str:
+    """Path after fetch_details: "no_cid", "no_evidence" or "model"."""
+    if state.get("cid") is None:
+        return "no_cid"
+    brief = state.get("brief")
+    if brief is None or not any(brief.summary.get(k) for k in _EVIDENCE_KEYS):
+        return "no_evidence"
+    return "model"
+
+def rule_verdict(state: FibrosisState) -> FibrosisState:
+    route = triage(state)
+    return {
+        "conclusion": "Indeterminate",
+        "relevance": 50,
+        "confidence": 0,
+        "rationale": _RULE_RATIONALES[route],
+        "brief_hash": _brief_of(state).digest,
+        "verdict_cached": False,
+        "route": route,
+    }
+
+_route_lock = threading.Lock()
 
 def conclude(state: FibrosisState) -> Dict[str, Any]:
     return {
@@ -372,27 +1429,107 @@ def conclude(state: FibrosisState) -> Dict[str, Any]:
         "tool_trace": state.get("trace", []),
     }
 
-def build_graph(llm: ChatOpenAI | None = None):
-    llm = llm or ChatOpenAI(model="gpt-4o-mini", temperature=0)
-    tool = PubChemTool()
+def _default_llm() -> ChatOpenAI:
+    global _shared_llm
+    if _shared_llm is None:
+        with _evaluators_lock:
+            if _shared_llm is None:
+                from langchain_openai import ChatOpenAI
+
+                _shared_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+    return _shared_llm
+
+def _node_fields(update: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # token usage and routing facts worth keeping on a node's trace event
+    update = update or {}
+    fields = dict(update.get("usage") or {})
+    for key in ("verdict_cached", "llm_requests", "route"):
+        if key in update:
+            fields[key] = update[key]
+    return fields
+
+def _timed_node(name: str, func, afunc=None):
+    """``func`` (with async body ``afunc``) emitting a node event per run."""
+
+    def run(s):
+        with timed("node", name=name) as event:
+            update = func(s)
+            event.update(_node_fields(update))
+        return update
+
+    if afunc is None:
+        return run
+
+    async def arun(s):
+        with timed("node", name=name) as event:
+            update = await afunc(s)
+            event.update(_node_fields(update))
+        return update
+
+    from langchain_core.runnables import RunnableLambda
 
+    return RunnableLambda(run, afunc=arun)
+
+def build_graph(
+    llm: ChatOpenAI | None = None,
+    profile: str = "fast",
+    tool: PubChemTool | None = None,
+    verdict_cache: VerdictCache | None = None,
+    scorer: BatchScorer | None = None,
+    brief_tokens: Optional[int] = BRIEF_TOKEN_BUDGET,
+    fast_path: bool = True,
+    route_counts: Optional[collections.Counter] = None,
+    briefs: Optional[Dict[int, CompoundBrief]] = None,
+):
+    """
+    identify_cid -> fetch_details -> analyze_fibrosis | rule_verdict -> conclude.
+
+    With ``fast_path`` the rule layer (``triage``) answers unresolvable and
+    evidence-free compounds without the LLM; ``route_counts`` tallies the
+    path every compound took.  ``briefs`` holds briefs built ahead per CID
+    (see ``prepare_briefs``), which fetch_details uses instead of
+    summarising again.
+    """
+    from langgraph.graph import START, StateGraph
+
+    llm = llm or _default_llm()
+    tool = tool or PubChemTool()
+
+    def _route(s):
+        route = triage(s) if fast_path else "model"
+        if route_counts is not None:
+            with _route_lock:
+                route_counts[route] += 1
+        return "analyze_fibrosis" if route == "model" else "rule_verdict"
+
+    async def _aidentify(s):
+        return await aidentify_cid(s, tool)
+
+    async def _afetch(s):
+        return await afetch_details(s, tool, profile, brief_tokens, briefs)
+
+    async def _aanalyze(s):
+        return await aanalyze_fibrosis(s, llm, verdict_cache, scorer)
+
+    # Each node carries a sync and an async body, so the same compiled graph
+    # serves invoke() from threads and ainvoke() from an event loop.
+    # Every node reports its wall time (and token usage) as a trace event.
     g = StateGraph(FibrosisState)
-    g.add_node("identify_cid", lambda s: identify_cid(s, tool))
-    g.add_node("fetch_details", lambda s: fetch_details(s, tool))
-    g.add_node("analyze_fibrosis", lambda s: analyze_fibrosis(s, llm))
-    g.add_node("conclude", conclude)
+    g.add_node("identify_cid", _timed_node("identify_cid", lambda s: identify_cid(s, tool), _aidentify))
+    g.add_node("fetch_details", _timed_node("fetch_details", lambda s: fetch_details(s, tool, profile, brief_tokens, briefs), _afetch))
+    g.add_node("analyze_fibrosis", _timed_node("analyze_fibrosis", lambda s: analyze_fibrosis(s, llm, verdict_cache), _aanalyze))
+    g.add_node("rule_verdict", _timed_node("rule_verdict", rule_verdict))
+    g.add_node("conclude", _timed_node("conclude", conclude))
 
     g.add_edge(START, "identify_cid")
     g.add_edge("identify_cid", "fetch_details")
-    g.add_edge("fetch_details", "analyze_fibrosis")
+    g.add_conditional_edges("fetch_details", _route, ["analyze_fibrosis", "rule_verdict"])
     g.add_edge("analyze_fibrosis", "conclude")
+    g.add_edge("rule_verdict", "conclude")
     g.set_finish_point("conclude")
     return g.compile()
 
-def evaluate_drug(drug_name: str, llm: ChatOpenAI | None = None) -> Dict[str, Any]:
-    graph = build_graph(llm)
-    result: FibrosisState = graph.invoke({"drug_name": drug_name, "trace": []})
-
+def _canonical(result: FibrosisState) -> Dict[str, Any]:
     # ----  canonical output schema  --------------------------------------
     return {
         "conclusion": result.get("conclusion", "Indeterminate"),
@@ -400,4 +1537,253 @@ def evaluate_drug(drug_name: str, llm: ChatOpenAI | None = None) -> Dict[str, An
         "confidence": result.get("confidence", 0),
         "rationale" : result.get("rationale", "No rationale generated."),
         "tool_trace": result.get("tool_trace", result.get("trace", [])),
-    }
\ No newline at end of file
+        "usage": dict(result.get("usage", _NO_USAGE)),
+        "cid": result.get("cid"),
+        "brief_hash": result.get("brief_hash"),
+    }
+
+def _progress_event(node: str, update: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The astream() event for a finished graph node, if it has one."""
+    if node == "identify_cid":
+        return {"event": "cid", "data": {"cid": update.get("cid"), "path": update["trace"][-1]}}
+    if node == "fetch_details" and "brief" in update:
+        brief = update["brief"]
+        return {"event": "brief", "data": {"brief_hash": brief.digest, "summary": brief.summary}}
+    if node in ("analyze_fibrosis", "rule_verdict"):
+        keys = ("conclusion", "relevance", "confidence", "rationale", "verdict_cached", "route")
+        return {"event": "verdict", "data": {k: update[k] for k in keys if k in update}}
+    return None
+
+class FibrosisEvaluator:
+    """
+    The compiled graph together with its LLM and PubChem tool.
+
+    Built once and reused: the compiled graph keeps no per-run state, so a
+    single evaluator may be shared by any number of threads.  With
+    ``llm_batch`` > 1, concurrent ``aevaluate`` calls share multi-compound
+    LLM requests (see ``BatchScorer``); ``evaluate`` always scores alone.
+    """
+
+    def __init__(
+        self,
+        llm: ChatOpenAI | None = None,
+        profile: str = "fast",
+        tool: PubChemTool | None = None,
+        verdict_cache: VerdictCache | None = None,
+        result_ttl: float = 3600.0,
+        llm_batch: int = 1,
+        brief_tokens: Optional[int] = BRIEF_TOKEN_BUDGET,
+        fast_path: bool = True,
+    ) -> None:
+        self.llm = llm or _default_llm()
+        self.profile = profile
+        self.tool = tool or PubChemTool()
+        self.verdict_cache = verdict_cache if verdict_cache is not None else default_verdict_cache()
+        self.llm_batch = llm_batch
+        self.scorer = BatchScorer(self.llm, max_batch=llm_batch) if llm_batch > 1 else None
+        self.brief_tokens = brief_tokens
+        self.fast_path = fast_path
+        # compounds per path taken: "model", "no_cid", "no_evidence"
+        self.route_counts: collections.Counter = collections.Counter()
+        # briefs per CID built ahead for a batch (see prepare_briefs)
+        self.briefs: Dict[int, CompoundBrief] = {}
+        self.graph = build_graph(
+            self.llm, profile, self.tool, self.verdict_cache, self.scorer, brief_tokens,
+            fast_path, self.route_counts, self.briefs,
+        )
+        # Concurrent requests for one compound share a single evaluation:
+        # first by normalised name, then by CID once the name is resolved.
+        # Finished results are kept per CID for ``result_ttl`` seconds (0 = off);
+        # like verdicts, a reply that could not be parsed is not kept.
+        self.result_ttl = result_ttl
+        self._results = MemoryCache(max_entries=1024, ttls={}, default_ttl=result_ttl)
+        self._by_name, self._by_cid = SingleFlight(), SingleFlight()
+        self._aby_name, self._aby_cid = AsyncSingleFlight(), AsyncSingleFlight()
+
+    @staticmethod
+    def _as_requested(result: Dict[str, Any], path: str) -> Dict[str, Any]:
+        # a result shared across synonyms reports the caller's own lookup
+        trace = result["tool_trace"]
+        if trace and trace[0] != path and trace[0].startswith("/compound/name/"):
+            trace = [path] + trace[1:]
+        return {**result, "tool_trace": list(trace)}
+
+    def _run_for_cid(self, state: FibrosisState) -> Dict[str, Any]:
+        key = f"cid:{state['cid']}"
+        if self.result_ttl and (stored := self._results.get(key)) is not None:
+            return stored
+        result = _canonical(self.graph.invoke(state))
+        if self.result_ttl and result["rationale"] != _UNPARSED_RATIONALE:
+            self._results.set(key, result)
+        return result
+
+    async def _arun_for_cid(self, state: FibrosisState) -> Dict[str, Any]:
+        key = f"cid:{state['cid']}"
+        if self.result_ttl and (stored := self._results.get(key)) is not None:
+            return stored
+        result = _canonical(await self.graph.ainvoke(state))
+        if self.result_ttl and result["rationale"] != _UNPARSED_RATIONALE:
+            self._results.set(key, result)
+        return result
+
+    # The name is resolved here to coalesce by CID; the graph starts from
+    # that lookup, so identify_cid does not ask PubChem a second time.
+    def _evaluate(self, drug_name: str) -> Dict[str, Any]:
+        path = _cid_path(drug_name)
+        state: FibrosisState = {"drug_name": drug_name, "trace": []}
+        state.update(_cid_update(state, path, _lookup_cids(self.tool, path)))
+        if state["cid"] is None:
+            return _canonical(self.graph.invoke(state))
+        result = self._by_cid.do(state["cid"], lambda: self._run_for_cid(state))
+        return self._as_requested(result, path)
+
+    async def _aevaluate(self, drug_name: str) -> Dict[str, Any]:
+        path = _cid_path(drug_name)
+        state: FibrosisState = {"drug_name": drug_name, "trace": []}
+        state.update(_cid_update(state, path, await _alookup_cids(self.tool, path)))
+        if state["cid"] is None:
+            return _canonical(await self.graph.ainvoke(state))
+        result = await self._aby_cid.do(state["cid"], lambda: self._arun_for_cid(state))
+        return self._as_requested(result, path)
+
+    # ``trace_events`` holds what this call itself did (see metrics.py): a
+    # result served from the result cache or shared with a concurrent
+    # caller reports the lookups made here, not those of the original run.
+    def evaluate(self, drug_name: str) -> Dict[str, Any]:
+        with collect_events() as events:
+            result = self._by_name.do(normalize_name(drug_name), lambda: self._evaluate(drug_name))
+        # a spelling coalesced with another reports its own lookup too
+        result = self._as_requested(result, _cid_path(drug_name))
+        return {**result, "trace_events": events}
+
+    async def aevaluate(self, drug_name: str) -> Dict[str, Any]:
+        with collect_events() as events:
+            result = await self._aby_name.do(
+                normalize_name(drug_name), lambda: self._aevaluate(drug_name)
+            )
+        result = self._as_requested(result, _cid_path(drug_name))
+        return {**result, "trace_events": events}
+
+    async def astream(self, drug_name: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Evaluate ``drug_name`` and yield progress as ``{"event", "data"}``
+        dicts while the graph runs: ``cid`` once the name is resolved,
+        ``record`` as each detail record arrives, ``brief``, ``token`` for
+        each chunk of streamed LLM output, ``verdict``, then ``result`` with
+        the same payload ``aevaluate`` returns.  Streams always run the
+        graph; they are not coalesced with concurrent evaluations.
+        """
+        state: Dict[str, Any] = {"drug_name": drug_name, "trace": []}
+        with collect_events() as events:
+            async for event in self._astream(state):
+                yield event
+        yield {"event": "result", "data": {**_canonical(state), "trace_events": events}}
+
+    async def _astream(self, state: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        async for mode, chunk in self.graph.astream(
+            state, stream_mode=["updates", "custom", "messages"]
+        ):
+            if mode == "custom":
+                yield chunk
+            elif mode == "messages":
+                message, meta = chunk
+                if meta.get("langgraph_node") == "analyze_fibrosis" and message.content:
+                    yield {"event": "token", "data": {"text": message.content}}
+            else:
+                for node, update in chunk.items():
+                    state.update(update or {})
+                    event = _progress_event(node, update or {})
+                    if event is not None:
+                        yield event
+
+    def evaluate_many(
+        self, drug_names: List[str], chunk_size: int = 100, workers: int = 8
+    ) -> List[Dict[str, Any]]:
+        """
+        Evaluate a whole compound list chunk by chunk: each chunk's names are
+        resolved and its detail records fetched in bulk, then its compounds
+        run through the graph on ``workers`` threads.  A compound that cannot
+        be evaluated gets ``error`` in place of a verdict, as in the batch
+        runner's output; the rest of the list is unaffected.
+        """
+        names = list(drug_names)
+        # Bulk results are split into per-CID cache entries; give the batch a
+        # cache large enough to hold a chunk's in front of the shared one.
+        chunk_cache = MemoryCache(max_entries=max(512, 8 * chunk_size))
+        base = self.tool
+        tool = base.model_copy(update={
+            "cache": TieredCache(chunk_cache, base._cache) if base._cache is not None else chunk_cache,
+            "use_cache": True,
+        })
+        batch = FibrosisEvaluator(
+            self.llm, self.profile, tool, self.verdict_cache, self.result_ttl,
+            self.llm_batch, self.brief_tokens, self.fast_path,
+        )
+
+        def evaluate(name: str) -> Dict[str, Any]:
+            try:
+                return batch.evaluate(name)
+            except Exception as e:
+                return {"error": f"{type(e).__name__}: {e}"}
+
+        results: List[Dict[str, Any]] = []
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fibrosis-eval") as pool:
+            for chunk in _chunks(names, chunk_size):
+                cids = list(resolve_cids(chunk, tool).values())
+                prefetch_details(cids, tool, self.profile)
+                batch.briefs.update(prepare_briefs(cids, tool, self.profile, self.brief_tokens))
+                results += [{"drug_name": name, **result}
+                            for name, result in zip(chunk, pool.map(evaluate, chunk))]
+        with _route_lock:
+            self.route_counts.update(batch.route_counts)
+        return results
+
+# Evaluators keyed by (LLM, profile).  A caller-supplied LLM is keyed by
+# identity and held by its evaluator, so the id cannot be recycled while
+# the entry lives; the least recently used entries are dropped past the cap.
+_MAX_EVALUATORS = 16
+_evaluators: "collections.OrderedDict[tuple, FibrosisEvaluator]" = collections.OrderedDict()
+_evaluators_lock = threading.Lock()
+_shared_llm: Optional[ChatOpenAI] = None
+
+def get_evaluator(
+    llm: ChatOpenAI | None = None, profile: str = "fast"
+) -> FibrosisEvaluator:
+    key = (None if llm is None else id(llm), profile)
+    with _evaluators_lock:
+        evaluator = _evaluators.get(key)
+        if evaluator is not None:
+            _evaluators.move_to_end(key)
+            return evaluator
+    evaluator = FibrosisEvaluator(llm, profile)
+    with _evaluators_lock:
+        evaluator = _evaluators.setdefault(key, evaluator)
+        _evaluators.move_to_end(key)
+        while len(_evaluators) > _MAX_EVALUATORS:
+            _evaluators.popitem(last=False)
+    return evaluator
+
+def evaluate_drug(
+    drug_name: str, llm: ChatOpenAI | None = None, profile: str = "fast"
+) -> Dict[str, Any]:
+    return get_evaluator(llm, profile).evaluate(drug_name)
+
+async def aevaluate_drug(
+    drug_name: str, llm: ChatOpenAI | None = None, profile: str = "fast"
+) -> Dict[str, Any]:
+    return await get_evaluator(llm, profile).aevaluate(drug_name)
+
+def astream_drug(
+    drug_name: str, llm: ChatOpenAI | None = None, profile: str = "fast"
+) -> AsyncIterator[Dict[str, Any]]:
+    return get_evaluator(llm, profile).astream(drug_name)
+
+def evaluate_drugs(
+    drug_names: List[str],
+    llm: ChatOpenAI | None = None,
+    profile: str = "fast",
+    tool: PubChemTool | None = None,
+) -> List[Dict[str, Any]]:
+    if tool is not None:
+        return FibrosisEvaluator(llm, profile, tool).evaluate_many(drug_names)
+    return get_evaluator(llm, profile).evaluate_many(drug_names)
@@ -0,0 +1,55 @@
+"""
+Selection of fibrosis-relevant rows from PubChem assay tables.
+
+``select_assays`` applies the summary's assay rules to the tables of many
+compounds at once: which rows are kept, where the 15-assay cap stops the
+scan and which mechanism categories active rows give evidence for.  The
+expensive step is term matching on assay titles, and the same AIDs recur
+across compounds, so each distinct title is matched once per batch and
+every later row is a dictionary lookup.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, FrozenSet, List, Sequence, Set, Tuple
+
+Rows = Sequence[Dict[str, Any]]
+# (kept rows in table order, categories seen on scanned active rows)
+Selection = Tuple[List[Dict[str, Any]], Set[str]]
+
+
+def select_assays(
+    tables: Sequence[Sequence[Rows]],
+    categories: Callable[[str], FrozenSet[str]],
+    cap: int,
+    keep: str = "fibrosis",
+) -> List[Selection]:
+    """
+    Select assay rows for each compound in ``tables``.
+
+    ``tables[i]`` holds compound *i*'s assay tables (one row list per
+    assaysummary blob).  Rows whose lower-cased ``Name`` falls in the
+    ``keep`` category are kept; within a table, the first non-active row
+    seen once ``cap`` rows are kept ends that table.
+    """
+    memo: Dict[str, FrozenSet[str]] = {}
+
+    def select(blobs: Sequence[Rows]) -> Selection:
+        kept: List[Dict[str, Any]] = []
+        evidence: Set[str] = set()
+        for rows in blobs:
+            for row in rows:
+                name = row.get("Name", "")
+                cats = memo.get(name)
+                if cats is None:
+                    cats = memo[name] = categories(name.lower())
+                active = row.get("ActivityOutcome", "") == "Active"
+                if active:
+                    evidence |= cats
+                if keep in cats:
+                    kept.append(row)
+                if len(kept) >= cap and not active:
+                    break
+        return kept, evidence
+
+    return [select(blobs) for blobs in tables]
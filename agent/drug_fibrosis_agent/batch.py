@@ -0,0 +1,302 @@
+"""
+Resumable batch screening runner.
+
+    python -m drug_fibrosis_agent.batch aSMA_screening_results.tsv -o results.jsonl
+
+Reads drug names from a TSV/CSV, evaluates them on the async graph with
+separate concurrency limits for PubChem and the LLM, and appends one JSON
+line per compound as soon as it finishes.  The output file doubles as the
+checkpoint: re-running the same command skips every compound that already
+has a verdict and retries the ones that failed.  ``--store results.sqlite3``
+also appends every verdict to an indexed ``ResultStore`` for querying.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .agent import (
+    FibrosisEvaluator,
+    PubChemTool,
+    PubChemTransport,
+    prefetch_details,
+    prepare_briefs,
+    resolve_cids,
+)
+from .cache import MemoryCache, TieredCache, VerdictCache
+from .results import ResultStore
+from .usage import default_usage, requests_from_events, usage_from_events
+
+logger = logging.getLogger(__name__)
+
+
+def simplify_drug_name(name: str) -> str:
+    """'Givinostat, ITF2357 (hydrochloride)' → 'Givinostat' (as in mvp_eval)."""
+    if "," in name:
+        name = name.split(",")[0].strip()
+    if " (" in name:
+        name = name.split(" (")[0].strip()
+    return name
+
+
+def read_names(path: str, column: Optional[str] = None) -> List[str]:
+    """
+    Unique drug names from a TSV/CSV, in file order.  Without ``column`` the
+    ``drug_name`` column is used, falling back to simplified ``Synonyms``.
+    """
+    delimiter = "\t" if path.endswith((".tsv", ".tab")) else ","
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f, delimiter=delimiter)
+        fields = {h.strip().lower(): h for h in reader.fieldnames or []}
+        if column is not None:
+            key, simplify = column, False
+        elif "drug_name" in fields:
+            key, simplify = fields["drug_name"], False
+        elif "synonyms" in fields:
+            key, simplify = fields["synonyms"], True
+        else:
+            raise ValueError(f"{path}: no drug_name/Synonyms column; pass --column")
+        names = []
+        for row in reader:
+            name = (row.get(key) or "").strip()
+            if simplify:
+                name = simplify_drug_name(name)
+            if name:
+                names.append(name)
+    return list(dict.fromkeys(names))
+
+
+def completed_names(output: str) -> Set[str]:
+    """Names that already have a verdict in ``output`` (failures are retried)."""
+    done: Set[str] = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by a crash
+            if "error" not in rec and "drug_name" in rec:
+                done.add(rec["drug_name"])
+    return done
+
+
+class _GatedLLM:
+    """Caps the number of in-flight async LLM calls with a semaphore."""
+
+    def __init__(self, llm: Any, semaphore: asyncio.Semaphore) -> None:
+        self._llm = llm
+        self._semaphore = semaphore
+
+    @property
+    def model_name(self) -> Any:
+        return getattr(self._llm, "model_name", None)
+
+    @property
+    def temperature(self) -> Any:
+        return getattr(self._llm, "temperature", None)
+
+    def bind(self, **kwargs: Any) -> "_GatedLLM":
+        return _GatedLLM(self._llm.bind(**kwargs), self._semaphore)
+
+    def invoke(self, *args: Any, **kwargs: Any) -> Any:
+        return self._llm.invoke(*args, **kwargs)
+
+    async def ainvoke(self, *args: Any, **kwargs: Any) -> Any:
+        async with self._semaphore:
+            return await self._llm.ainvoke(*args, **kwargs)
+
+
+async def run_batch(
+    names: Iterable[str],
+    output: str,
+    llm: Any,
+    profile: str = "fast",
+    pubchem_concurrency: int = 4,
+    llm_concurrency: int = 4,
+    prefetch_chunk: int = 100,
+    tool: Optional[PubChemTool] = None,
+    verdict_cache: Optional[VerdictCache] = None,
+    llm_batch: int = 1,
+    store: Optional[ResultStore] = None,
+) -> Dict[str, int]:
+    """
+    Evaluate ``names`` not yet in ``output`` and append their results.
+
+    PubChem concurrency bounds the pooled connections (the shared rate
+    limiter still applies on top); LLM concurrency bounds in-flight model
+    calls, each scoring up to ``llm_batch`` compounds.  With ``store``, each
+    chunk's verdicts are also appended to it in one transaction.  Returns
+    counts of evaluated, failed and skipped compounds.
+    """
+    names = list(names)
+    done = completed_names(output)
+    todo = [n for n in names if n not in done]
+    stats = {"evaluated": 0, "failed": 0, "skipped": len(names) - len(todo)}
+    if not todo:
+        return stats
+
+    # a transport made here is closed here; a caller's tool keeps its own
+    transport = None
+    if tool is None:
+        transport = PubChemTransport(
+            max_connections=pubchem_concurrency,
+            max_keepalive_connections=pubchem_concurrency,
+        )
+    base = tool or PubChemTool(transport=transport)
+    # room for the chunk being evaluated and the one being prefetched
+    chunk_cache = MemoryCache(max_entries=max(512, 16 * prefetch_chunk))
+    tool = base.model_copy(update={
+        "cache": TieredCache(chunk_cache, base._cache) if base._cache is not None else chunk_cache,
+        "use_cache": True,
+    })
+    evaluator = FibrosisEvaluator(
+        _GatedLLM(llm, asyncio.Semaphore(llm_concurrency)), profile, tool, verdict_cache,
+        llm_batch=llm_batch,
+    )
+    # enough compounds in flight to fill every concurrent LLM batch
+    workers = pubchem_concurrency + llm_concurrency * max(1, llm_batch)
+    # usage is accounted per screen, named after the output file
+    usage, screen = default_usage(), os.path.basename(output)
+    model = getattr(llm, "model_name", None) or "unknown"
+    stored: List[Dict[str, Any]] = []
+
+    async def prefetch(chunk: List[str]) -> None:
+        # bulk-resolve a chunk so per-compound lookups hit the cache, then
+        # summarise its compounds together, all off the loop.  This is only
+        # a head start: if it fails, the chunk's compounds go the normal
+        # per-compound way and each succeeds or fails on its own.
+        try:
+            cids = list((await asyncio.to_thread(resolve_cids, chunk, tool)).values())
+            await asyncio.to_thread(prefetch_details, cids, tool, profile)
+            evaluator.briefs.update(await asyncio.to_thread(
+                prepare_briefs, cids, tool, profile, evaluator.brief_tokens))
+        except Exception as e:
+            logger.warning("prefetching %d names failed, fetching them one by one: %s",
+                           len(chunk), e)
+
+    chunks = [todo[i:i + prefetch_chunk] for i in range(0, len(todo), prefetch_chunk)]
+    ahead: Optional[asyncio.Future] = None
+    try:
+        with open(output, "a", encoding="utf-8") as out:
+
+            def write(rec: Dict[str, Any]) -> None:
+                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                out.flush()
+
+            async def evaluate(name: str) -> None:
+                start = time.perf_counter()
+                try:
+                    result = await evaluator.aevaluate(name)
+                except Exception as e:  # recorded and retried on the next run
+                    stats["failed"] += 1
+                    write({"drug_name": name, "error": f"{type(e).__name__}: {e}"})
+                    logger.warning("%s failed: %s", name, e)
+                    return
+                stats["evaluated"] += 1
+                events = result.pop("trace_events")
+                spent = usage_from_events(events)
+                usage.record(model, "batch", compounds=1, screen=screen,
+                             requests=requests_from_events(events), **spent)
+                # a cached or shared result carries the original run's usage;
+                # record what this compound itself spent, as /analyze_fibrosis does
+                rec = {"drug_name": name, **result, "usage": spent,
+                       "elapsed_s": round(time.perf_counter() - start, 3)}
+                write(rec)
+                if store is not None:
+                    stored.append(rec)
+                logger.info("[%d/%d] %s: %s", stats["evaluated"] + stats["failed"],
+                            len(todo), name, result["conclusion"])
+
+            if prefetch_chunk > 1:
+                ahead = asyncio.ensure_future(prefetch(chunks[0]))
+            for i, chunk in enumerate(chunks):
+                if ahead is not None:
+                    await ahead
+                    # the next chunk downloads while this one is evaluated
+                    if i + 1 < len(chunks):
+                        ahead = asyncio.ensure_future(prefetch(chunks[i + 1]))
+                    else:
+                        ahead = None
+
+                queue: asyncio.Queue = asyncio.Queue()
+                for name in chunk:
+                    queue.put_nowait(name)
+
+                async def worker() -> None:
+                    while not queue.empty():
+                        await evaluate(queue.get_nowait())
+
+                await asyncio.gather(*(worker() for _ in range(min(workers, len(chunk)))))
+                if stored:
+                    await asyncio.to_thread(store.append, stored, model, screen)
+                    stored = []
+    finally:
+        if ahead is not None and not ahead.done():
+            ahead.cancel()
+        if transport is not None:
+            await transport.aclose()
+    logger.info("routes: %s", dict(evaluator.route_counts))
+    spent = usage.snapshot(screen=screen)
+    logger.info("usage: %d prompt + %d completion tokens, $%.4f (%s per compound)",
+                spent["prompt_tokens"], spent["completion_tokens"], spent["cost"],
+                spent["cost_per_compound"])
+    usage.flush()
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m drug_fibrosis_agent.batch",
+        description="Screen a list of drugs for cardiac-fibrosis relevance.",
+    )
+    parser.add_argument("input", help="TSV/CSV with a drug_name or Synonyms column")
+    parser.add_argument("-o", "--output", default="agent_results.jsonl",
+                        help="JSONL results file; also the resume checkpoint")
+    parser.add_argument("--column", help="column holding the drug names")
+    parser.add_argument("--profile", default="fast", choices=["fast", "full"])
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--pubchem-concurrency", type=int, default=4)
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--llm-batch", type=int, default=1,
+                        help="compounds scored per LLM request (1 = one each)")
+    parser.add_argument("--prefetch-chunk", type=int, default=100,
+                        help="names resolved in bulk per round (1 disables)")
+    parser.add_argument("--verdict-cache", metavar="PATH",
+                        help="SQLite file of LLM verdicts reused across runs")
+    parser.add_argument("--store", metavar="PATH",
+                        help="SQLite result store to append verdicts to")
+    parser.add_argument("--limit", type=int, help="only the first N names")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    from langchain_openai import ChatOpenAI
+
+    names = read_names(args.input, args.column)[:args.limit]
+    llm = ChatOpenAI(model=args.model, temperature=args.temperature)
+    stats = asyncio.run(run_batch(
+        names, args.output, llm,
+        profile=args.profile,
+        pubchem_concurrency=args.pubchem_concurrency,
+        llm_concurrency=args.llm_concurrency,
+        prefetch_chunk=args.prefetch_chunk,
+        llm_batch=args.llm_batch,
+        verdict_cache=VerdictCache(args.verdict_cache) if args.verdict_cache else None,
+        store=ResultStore(args.store) if args.store else None,
+    ))
+    print(json.dumps(stats), file=sys.stderr)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,439 @@
+"""
+Response caches for PubChem PUG-REST lookups.
+
+Two tiers share one interface (``get`` / ``set`` / ``stats``):
+
+* ``MemoryCache`` – thread-safe in-process LRU, bounded by entry count.
+* ``DiskCache``   – SQLite file of zlib-compressed JSON, bounded by bytes,
+                    shared by every process pointing at the same path.
+
+``TieredCache`` stacks them, and ``default_cache()`` builds the process-wide
+instance from ``PUBCHEM_CACHE_PATH`` / ``PUBCHEM_CACHE_MAX_MB``.
+
+``VerdictCache`` stores parsed LLM verdicts keyed by a hash of the model
+settings, prompt version and canonical compound brief.
+"""
+
+from __future__ import annotations
+
+import collections
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+DAY = 24 * 60 * 60
+
+# Freshness per PUG-REST operation.  Name→CID mappings and computed
+# properties barely move; bioassay tables grow as depositions land.
+DEFAULT_TTLS: Dict[str, float] = {
+    "cids": 30 * DAY,
+    "property": 30 * DAY,
+    "classification": 7 * DAY,
+    "assaysummary": 1 * DAY,
+    "xrefs": 7 * DAY,
+    "description": 7 * DAY,
+}
+DEFAULT_TTL = 1 * DAY
+
+
+class CacheMiss(LookupError):
+    """Raised in cache-only (offline) mode when a path has not been cached."""
+
+
+def endpoint_of(path: str) -> str:
+    """PUG-REST operation of ``path``: '/compound/cid/1/property/X/JSON' → 'property'."""
+    parts = path.strip("/").split("/")
+    return parts[3] if len(parts) > 3 else parts[-1]
+
+
+def normalize_name(drug_name: str) -> str:
+    """Case- and whitespace-insensitive key for a drug name."""
+    return " ".join(drug_name.split()).casefold()
+
+
+def _ttl_for(path: str, ttls: Dict[str, float], default: float) -> float:
+    return ttls.get(endpoint_of(path), default)
+
+
+class MemoryCache:
+    """Thread-safe, entry-bounded LRU of decoded PubChem responses."""
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttls: Optional[Dict[str, float]] = None,
+        default_ttl: float = DEFAULT_TTL,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self._data: "collections.OrderedDict[str, tuple]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.time():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: str, value: Any) -> None:
+        expires = time.time() + _ttl_for(key, self.ttls, self.default_ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._data),
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    SQLite-backed cache of zlib-compressed PubChem JSON keyed by request path.
+
+    Entries expire per endpoint (see ``DEFAULT_TTLS``); once the stored
+    blobs exceed ``max_bytes`` the least recently read entries are evicted
+    down to ``low_water`` of the budget.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            key      TEXT PRIMARY KEY,
+            endpoint TEXT NOT NULL,
+            body     BLOB NOT NULL,
+            size     INTEGER NOT NULL,
+            created  REAL NOT NULL,
+            accessed REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = 512 * 1024 * 1024,
+        ttls: Optional[Dict[str, float]] = None,
+        default_ttl: float = DEFAULT_TTL,
+        low_water: float = 0.9,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        self.low_water = low_water
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self._SCHEMA)
+        self._bytes = self._stored_bytes()
+        self.hits = self.misses = self.expired = self.evictions = 0
+
+    def _stored_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, created, endpoint FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            body, created, endpoint = row
+            if created + self.ttls.get(endpoint, self.default_ttl) < now:
+                with self._conn:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._bytes -= len(body)
+                self.expired += 1
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE responses SET accessed = ? WHERE key = ?", (now, key)
+                )
+            self.hits += 1
+        return json.loads(zlib.decompress(body))
+
+    def set(self, key: str, value: Any) -> None:
+        body = zlib.compress(
+            json.dumps(value, separators=(",", ":")).encode("utf-8"), 6
+        )
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                # a rewritten key replaces its old blob rather than adding to it
+                old = self._conn.execute(
+                    "SELECT size FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses "
+                    "(key, endpoint, body, size, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, endpoint_of(key), body, len(body), now, now),
+                )
+            self._bytes += len(body) - (old[0] if old else 0)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Other processes write to the same file, so re-read the real total.
+        self._bytes = self._stored_bytes()
+        target = int(self.max_bytes * self.low_water)
+        while self._bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                if self._bytes <= target:
+                    break
+                victims.append((key,))
+                self._bytes -= size
+            with self._conn:
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+            self.evictions += len(victims)
+
+    def clear(self) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM responses")
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": self._bytes,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    """Memory LRU in front of a ``DiskCache``; disk hits are promoted."""
+
+    def __init__(self, memory: MemoryCache, disk: DiskCache) -> None:
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.memory.set(key, value)
+        self.disk.set(key, value)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"memory": self.memory.stats(), "disk": self.disk.stats()}
+
+
+_default_cache: Any = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache():
+    """
+    Process-wide cache used by every ``PubChemTool`` without its own.
+
+    In-memory only unless ``PUBCHEM_CACHE_PATH`` names a SQLite file, in
+    which case responses persist across runs (``PUBCHEM_CACHE_MAX_MB``
+    bounds its size, default 512).
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                memory = MemoryCache()
+                path = os.getenv("PUBCHEM_CACHE_PATH")
+                if path:
+                    max_mb = float(os.getenv("PUBCHEM_CACHE_MAX_MB", "512"))
+                    disk = DiskCache(path, max_bytes=int(max_mb * 1024 * 1024))
+                    _default_cache = TieredCache(memory, disk)
+                else:
+                    _default_cache = memory
+    return _default_cache
+
+
+def set_default_cache(cache) -> None:
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = cache
+
+
+# ----  LLM verdicts  -------------------------------------------------------
+def brief_digest(brief: Dict[str, Any]) -> str:
+    """
+    SHA-256 of the canonicalised compound brief (sorted keys, no whitespace),
+    so synonyms resolving to the same PubChem data hash identically.
+    """
+    payload = json.dumps(brief, sort_keys=True, separators=(",", ":"),
+                         ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def verdict_key(model: Any, temperature: Any, prompt_version: str, digest: str) -> str:
+    """Key of everything that determines an LLM verdict for one brief."""
+    payload = json.dumps([str(model), temperature, prompt_version, digest])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class VerdictCache:
+    """
+    SQLite store of parsed LLM verdicts keyed by ``verdict_key``.
+
+    ``path=None`` keeps the table in memory for the life of the process.
+    Past ``max_entries`` the least recently used verdicts are evicted.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS verdicts (
+            key      TEXT PRIMARY KEY,
+            model    TEXT,
+            verdict  TEXT NOT NULL,
+            created  REAL NOT NULL,
+            accessed REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS verdicts_accessed ON verdicts (accessed);
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 100_000) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or ":memory:", timeout=30, check_same_thread=False)
+        if path is not None:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self._SCHEMA)
+        self._entries = self._count()
+        self.hits = self.misses = self.evictions = 0
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT verdict FROM verdicts WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE verdicts SET accessed = ? WHERE key = ?", (time.time(), key)
+                )
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, verdict: Dict[str, Any], model: Any = None) -> None:
+        now = time.time()
+        row = (None if model is None else str(model), json.dumps(verdict, ensure_ascii=False))
+        with self._lock:
+            with self._conn:
+                # running entry count instead of a COUNT(*) per insert
+                inserted = self._conn.execute(
+                    "INSERT OR IGNORE INTO verdicts VALUES (?, ?, ?, ?, ?)", (key, *row, now, now)
+                ).rowcount
+                if inserted:
+                    self._entries += 1
+                else:
+                    self._conn.execute(
+                        "UPDATE verdicts SET model = ?, verdict = ?, created = ?, accessed = ? "
+                        "WHERE key = ?", (*row, now, now, key)
+                    )
+                if self._entries > self.max_entries:
+                    # other processes write to the same file; evict on the real count
+                    excess = self._count() - self.max_entries
+                    if excess > 0:
+                        self._conn.execute(
+                            "DELETE FROM verdicts WHERE key IN "
+                            "(SELECT key FROM verdicts ORDER BY accessed LIMIT ?)", (excess,)
+                        )
+                        self.evictions += excess
+                    self._entries = self._count()
+
+    def clear(self) -> None:
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM verdicts")
+            self._entries = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_default_verdict_cache: Optional[VerdictCache] = None
+
+
+def default_verdict_cache() -> Optional[VerdictCache]:
+    """Persistent verdict cache at ``VERDICT_CACHE_PATH``; None (off) if unset."""
+    global _default_verdict_cache
+    path = os.getenv("VERDICT_CACHE_PATH")
+    if path and _default_verdict_cache is None:
+        with _default_cache_lock:
+            if _default_verdict_cache is None:
+                _default_verdict_cache = VerdictCache(path)
+    return _default_verdict_cache
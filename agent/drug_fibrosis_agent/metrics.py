@@ -0,0 +1,278 @@
+"""
+Structured trace events and process-wide metrics for the fibrosis graph.
+
+Every graph node run and every PubChem lookup is reported as one event
+dict through ``emit``:
+
+    {"kind": "node", "name": "analyze_fibrosis", "status": "ok",
+     "start": <epoch s>, "duration_s": 0.81,
+     "prompt_tokens": 1520, "completion_tokens": 96, "cached_tokens": 1408}
+    {"kind": "http", "path": "/compound/cid/2244/assaysummary/JSON",
+     "endpoint": "assaysummary", "cache": "miss", "status": 200,
+     "start": <epoch s>, "duration_s": 0.42, "bytes": 183211,
+     "retries": 0, "limiter_wait_s": 0.13}
+
+Events go to the list opened by ``collect_events`` in the current context
+(``FibrosisEvaluator`` returns them as ``trace_events``), are folded into
+``default_metrics()`` -- served in the Prometheus text format by the API's
+``/metrics`` -- and are passed to any sinks added with ``add_sink``, such
+as the OpenTelemetry exporter from ``enable_otel``.
+"""
+
+from __future__ import annotations
+
+import bisect
+import contextlib
+import contextvars
+import importlib.util
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+Event = Dict[str, Any]
+Labels = Tuple[Tuple[str, str], ...]
+
+# seconds; PubChem lookups and LLM calls both fall well inside 60 s
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Metrics:
+    """Thread-safe labelled counters and histograms."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, text: str) -> None:
+        self._help[name] = text
+
+    def inc(self, name: str, amount: float = 1.0, **labels: Any) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = _Histogram(self.buckets)
+            hist.counts[bisect.bisect_left(self.buckets, value)] += 1
+            hist.sum += value
+            hist.count += 1
+
+    def value(self, name: str, **labels: Any) -> float:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            return self._counters.get(name, {}).get(key, 0.0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+
+        def fmt(labels: Labels, extra: Labels = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            body = ",".join(
+                '{}="{}"'.format(
+                    k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                )
+                for k, v in pairs
+            )
+            return "{" + body + "}"
+
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{fmt(labels)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, hist in sorted(series.items()):
+                    cumulative = 0
+                    for bound, n in zip(self.buckets + (float("inf"),), hist.counts):
+                        cumulative += n
+                        le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                        lines.append(f"{name}_bucket{fmt(labels, (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{fmt(labels)} {hist.sum:g}")
+                    lines.append(f"{name}_count{fmt(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _describe(metrics: Metrics) -> Metrics:
+    for name, text in (
+        ("fibrosis_node_duration_seconds", "Wall time of each fibrosis graph node."),
+        ("pubchem_requests_total", "PubChem lookups by endpoint, cache status and HTTP status."),
+        ("pubchem_request_duration_seconds", "Wall time of PubChem HTTP requests, retries included."),
+        ("pubchem_response_bytes_total", "Bytes downloaded from PubChem."),
+        ("pubchem_retries_total", "PubChem requests repeated after 503/429."),
+        ("pubchem_limiter_wait_seconds_total", "Time spent waiting on the PubChem rate limiter."),
+        ("llm_tokens_total", "LLM tokens used by analyze_fibrosis, by kind."),
+        ("llm_completion_duration_seconds",
+         "Wall time of /completion LLM calls, by backend and whether hedged."),
+    ):
+        metrics.describe(name, text)
+    return metrics
+
+
+_TOKEN_KINDS = ("prompt_tokens", "completion_tokens", "cached_tokens")
+
+
+def account(metrics: Metrics, event: Event) -> None:
+    """Fold one trace event into ``metrics``."""
+    kind = event.get("kind")
+    if kind == "node":
+        metrics.observe("fibrosis_node_duration_seconds", event["duration_s"],
+                        node=event["name"], status=event["status"])
+        for token_kind in _TOKEN_KINDS:
+            if event.get(token_kind):
+                metrics.inc("llm_tokens_total", event[token_kind], kind=token_kind[:-7])
+    elif kind == "http":
+        endpoint = event["endpoint"]
+        metrics.inc("pubchem_requests_total", endpoint=endpoint,
+                    cache=event["cache"], status=event.get("status") or "")
+        if event["cache"] == "miss":
+            metrics.observe("pubchem_request_duration_seconds", event["duration_s"],
+                            endpoint=endpoint)
+            metrics.inc("pubchem_response_bytes_total", event.get("bytes", 0), endpoint=endpoint)
+            if event.get("retries"):
+                metrics.inc("pubchem_retries_total", event["retries"], endpoint=endpoint)
+            if event.get("limiter_wait_s"):
+                metrics.inc("pubchem_limiter_wait_seconds_total", event["limiter_wait_s"])
+
+
+_default_metrics: Optional[Metrics] = None
+_default_metrics_lock = threading.Lock()
+
+
+def default_metrics() -> Metrics:
+    """Process-wide registry every event is folded into."""
+    global _default_metrics
+    if _default_metrics is None:
+        with _default_metrics_lock:
+            if _default_metrics is None:
+                _default_metrics = _describe(Metrics())
+    return _default_metrics
+
+
+def set_default_metrics(metrics: Metrics) -> None:
+    global _default_metrics
+    with _default_metrics_lock:
+        _default_metrics = _describe(metrics)
+
+
+# ----  events  ---------------------------------------------------------------
+
+_events: contextvars.ContextVar[Optional[List[Event]]] = contextvars.ContextVar(
+    "fibrosis_trace_events", default=None
+)
+_sinks: List[Callable[[Event], None]] = []
+
+
+def add_sink(sink: Callable[[Event], None]) -> None:
+    """Call ``sink(event)`` for every event from now on."""
+    _sinks.append(sink)
+
+
+def remove_sink(sink: Callable[[Event], None]) -> None:
+    _sinks.remove(sink)
+
+
+@contextlib.contextmanager
+def collect_events() -> Iterator[List[Event]]:
+    """
+    Collect the events emitted in this context into the yielded list.
+
+    Threads and tasks started from the context see the same list, so a
+    whole evaluation lands in one place; nested collectors do not share.
+    """
+    events: List[Event] = []
+    token = _events.set(events)
+    try:
+        yield events
+    finally:
+        _events.reset(token)
+
+
+def emit(event: Event) -> None:
+    events = _events.get()
+    if events is not None:
+        events.append(event)
+    account(default_metrics(), event)
+    for sink in list(_sinks):
+        sink(event)
+
+
+@contextlib.contextmanager
+def timed(kind: str, **fields: Any) -> Iterator[Event]:
+    """
+    Emit a ``kind`` event timing the ``with`` block.  Callers may add
+    fields to the yielded dict; ``status`` defaults to "ok", or "error"
+    when the block raises.
+    """
+    event: Event = {"kind": kind, **fields, "start": time.time()}
+    t0 = time.perf_counter()
+    try:
+        yield event
+    except BaseException:
+        event.setdefault("status", "error")
+        raise
+    finally:
+        event.setdefault("status", "ok")
+        event["duration_s"] = time.perf_counter() - t0
+        emit(event)
+
+
+# ----  OpenTelemetry  --------------------------------------------------------
+
+def otel_sink(tracer: Any = None) -> Callable[[Event], None]:
+    """
+    Sink turning each event into an OpenTelemetry span named after the
+    node or endpoint, with the event's fields as attributes.  Exporting
+    the spans is left to whatever SDK the application configured.
+    """
+    from opentelemetry import trace
+
+    tracer = tracer or trace.get_tracer("drug_fibrosis_agent")
+
+    def sink(event: Event) -> None:
+        name = event.get("name") or event.get("endpoint") or event["kind"]
+        start_ns = int(event["start"] * 1e9)
+        span = tracer.start_span(f"{event['kind']} {name}", start_time=start_ns)
+        span.set_attributes({k: v for k, v in event.items()
+                             if k != "start" and isinstance(v, (str, bool, int, float))})
+        span.end(end_time=start_ns + int(event.get("duration_s", 0.0) * 1e9))
+
+    return sink
+
+
+def enable_otel(tracer: Any = None) -> bool:
+    """Export events as OpenTelemetry spans if the API package is installed."""
+    if importlib.util.find_spec("opentelemetry") is None:
+        return False
+    add_sink(otel_sink(tracer))
+    return True
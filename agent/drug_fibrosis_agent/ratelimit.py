@@ -0,0 +1,226 @@
+"""
+Token-bucket rate limiting for PubChem PUG-REST.
+
+``TokenBucket`` is shared by threads and event loops within one process;
+``SharedTokenBucket`` keeps the bucket in a SQLite file so several worker
+processes draw from one budget.  Both adapt their refill rate to the
+``X-Throttling-Control`` header PubChem attaches to every response.
+"""
+
+from __future__ import annotations
+
+import abc
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+# PubChem asks for at most five requests per second per client.
+PUBCHEM_RATE = 5.0
+PUBCHEM_BURST = 3.0
+
+# Fraction of the base rate to fall back to for the worst status reported in
+# X-Throttling-Control, e.g. "Request Count status: Yellow (60%), ...".
+_STATUS_FACTORS = {"green": 1.0, "yellow": 0.5, "red": 0.2, "black": 0.05}
+_STATUS_RE = re.compile(r"status:\s*(green|yellow|red|black)", re.IGNORECASE)
+
+
+def throttle_factor(header: Optional[str]) -> Optional[float]:
+    """Rate multiplier for the worst status in ``header`` (None if absent)."""
+    if not header:
+        return None
+    statuses = _STATUS_RE.findall(header)
+    if not statuses:
+        return None
+    return min(_STATUS_FACTORS[s.lower()] for s in statuses)
+
+
+class _Bucket(abc.ABC):
+    """Common acquire / adapt logic; subclasses implement the storage."""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.base_rate = rate
+        self.capacity = capacity
+
+    @abc.abstractmethod
+    def _reserve(self, tokens: float) -> float:
+        """Take ``tokens`` (possibly on credit) and return the seconds to wait."""
+
+    @property
+    @abc.abstractmethod
+    def rate(self) -> float:
+        """Current refill rate in tokens per second."""
+
+    @abc.abstractmethod
+    def set_rate(self, rate: float) -> None:
+        """Replace the refill rate, in tokens per second."""
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens: float = 1.0) -> float:
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def observe(self, header: Optional[str]) -> None:
+        """Slow down on Yellow/Red/Black; creep back towards the base on Green."""
+        factor = throttle_factor(header)
+        if factor is None:
+            return
+        if factor < 1.0:
+            self.set_rate(min(self.rate, self.base_rate * factor))
+        elif self.rate < self.base_rate:
+            self.set_rate(min(self.base_rate, self.rate + 0.1 * self.base_rate))
+
+    def penalize(self) -> None:
+        """Back off hard after a 503/429 from the server."""
+        self.set_rate(max(self.base_rate * _STATUS_FACTORS["black"], self.rate * 0.5))
+
+    async def aobserve(self, header: Optional[str]) -> None:
+        self.observe(header)
+
+    async def apenalize(self) -> None:
+        self.penalize()
+
+
+class TokenBucket(_Bucket):
+    """
+    Thread-safe token bucket.  Callers reserve tokens under a lock and may
+    go into debt, so waiters are served in arrival order and sleep outside
+    the lock (``time.sleep`` for threads, ``asyncio.sleep`` for tasks).
+    """
+
+    def __init__(self, rate: float = PUBCHEM_RATE, capacity: float = PUBCHEM_BURST) -> None:
+        super().__init__(rate, capacity)
+        self._rate = rate
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def set_rate(self, rate: float) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self._rate = rate
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def _reserve(self, tokens: float) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self._rate)
+
+
+class SharedTokenBucket(_Bucket):
+    """
+    Token bucket persisted in a SQLite file so every process using the same
+    ``path`` shares one budget.  Each reservation is a short ``BEGIN
+    IMMEDIATE`` transaction; the adapted rate is stored alongside the tokens.
+    """
+
+    def __init__(
+        self, path: str, rate: float = PUBCHEM_RATE, capacity: float = PUBCHEM_BURST
+    ) -> None:
+        super().__init__(rate, capacity)
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bucket "
+            "(id INTEGER PRIMARY KEY CHECK (id = 1), tokens REAL, updated REAL, rate REAL)"
+        )
+        self._conn.execute(
+            "INSERT OR IGNORE INTO bucket VALUES (1, ?, ?, ?)", (capacity, time.time(), rate)
+        )
+
+    def _update(self, tokens: float, rate: Optional[float] = None) -> float:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                have, updated, current = self._conn.execute(
+                    "SELECT tokens, updated, rate FROM bucket WHERE id = 1"
+                ).fetchone()
+                now = time.time()
+                have = min(self.capacity, have + max(0.0, now - updated) * current)
+                have -= tokens
+                new_rate = current if rate is None else rate
+                self._conn.execute(
+                    "UPDATE bucket SET tokens = ?, updated = ?, rate = ? WHERE id = 1",
+                    (have, now, new_rate),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return max(0.0, -have / new_rate)
+
+    @property
+    def rate(self) -> float:
+        with self._lock:
+            return self._conn.execute("SELECT rate FROM bucket WHERE id = 1").fetchone()[0]
+
+    def set_rate(self, rate: float) -> None:
+        self._update(0.0, rate)
+
+    def _reserve(self, tokens: float) -> float:
+        return self._update(tokens)
+
+    async def aacquire(self, tokens: float = 1.0) -> float:
+        # the SQLite lock may be contended by other processes
+        wait = await asyncio.to_thread(self._reserve, tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    async def aobserve(self, header: Optional[str]) -> None:
+        if throttle_factor(header) is not None:
+            await asyncio.to_thread(self.observe, header)
+
+    async def apenalize(self) -> None:
+        await asyncio.to_thread(self.penalize)
+
+
+_default_limiter: Optional[_Bucket] = None
+_default_limiter_lock = threading.Lock()
+
+
+def default_limiter() -> _Bucket:
+    """
+    Process-wide PubChem limiter.  ``PUBCHEM_RATE_LIMIT`` overrides the
+    requests per second; ``PUBCHEM_RATE_LIMIT_PATH`` shares the budget with
+    other processes through a SQLite file.
+    """
+    global _default_limiter
+    if _default_limiter is None:
+        with _default_limiter_lock:
+            if _default_limiter is None:
+                rate = float(os.getenv("PUBCHEM_RATE_LIMIT", PUBCHEM_RATE))
+                path = os.getenv("PUBCHEM_RATE_LIMIT_PATH")
+                if path:
+                    _default_limiter = SharedTokenBucket(path, rate)
+                else:
+                    _default_limiter = TokenBucket(rate)
+    return _default_limiter
+
+
+def set_default_limiter(limiter: _Bucket) -> None:
+    global _default_limiter
+    with _default_limiter_lock:
+        _default_limiter = limiter
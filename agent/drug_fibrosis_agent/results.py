@@ -0,0 +1,281 @@
+"""
+SQLite store of evaluation results, one row per compound.
+
+Rows are keyed by normalised drug name and indexed by CID, conclusion,
+relevance and confidence, so ranking, filtering or exporting a whole
+screen is a single indexed query instead of a pass over thousands of
+``{drug}_evaluation.json`` files.  ``append`` writes a batch of results in
+one transaction; re-evaluating a compound replaces its row and keeps its
+first ``created`` time.
+
+    python -m drug_fibrosis_agent.results results.sqlite3 --load agent_results.jsonl
+    python -m drug_fibrosis_agent.results results.sqlite3 --load examples/givinostat_evaluation.json
+    python -m drug_fibrosis_agent.results results.sqlite3 --conclusion Positive --top 20
+    python -m drug_fibrosis_agent.results results.sqlite3 --export ranked.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from .cache import normalize_name
+
+# columns a query may sort on, and the default direction for each
+ORDER_COLUMNS = {
+    "relevance": "DESC", "confidence": "DESC", "updated": "DESC",
+    "created": "DESC", "drug_name": "ASC", "cid": "ASC",
+}
+_COLUMNS = ("name_key", "drug_name", "cid", "conclusion", "relevance", "confidence",
+            "rationale", "brief_hash", "model", "screen", "prompt_tokens",
+            "completion_tokens", "created", "updated", "result")
+# everything but the full JSON, for listings and exports
+_SUMMARY = _COLUMNS[1:-1]
+
+
+class ResultStore:
+    """
+    Evaluation results in a SQLite file (``path=None`` keeps them in memory).
+
+    Safe to share between threads; writes are serialised on one connection.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            name_key          TEXT PRIMARY KEY,
+            drug_name         TEXT NOT NULL,
+            cid               INTEGER,
+            conclusion        TEXT NOT NULL,
+            relevance         INTEGER,
+            confidence        INTEGER,
+            rationale         TEXT,
+            brief_hash        TEXT,
+            model             TEXT,
+            screen            TEXT,
+            prompt_tokens     INTEGER,
+            completion_tokens INTEGER,
+            created           REAL NOT NULL,
+            updated           REAL NOT NULL,
+            result            TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS results_cid ON results (cid);
+        CREATE INDEX IF NOT EXISTS results_conclusion ON results (conclusion, relevance);
+        CREATE INDEX IF NOT EXISTS results_relevance ON results (relevance);
+        CREATE INDEX IF NOT EXISTS results_confidence ON results (confidence);
+        CREATE INDEX IF NOT EXISTS results_screen ON results (screen);
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path or ":memory:", timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path is not None:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self._SCHEMA)
+
+    @staticmethod
+    def _row(result: Dict[str, Any], model: Optional[str], screen: Optional[str],
+             now: float) -> tuple:
+        usage = result.get("usage") or {}
+        full = {k: v for k, v in result.items() if k != "trace_events"}
+        return (
+            normalize_name(result["drug_name"]), result["drug_name"], result.get("cid"),
+            result.get("conclusion", "Indeterminate"), result.get("relevance"),
+            result.get("confidence"), result.get("rationale"), result.get("brief_hash"),
+            result.get("model", model), result.get("screen", screen),
+            usage.get("prompt_tokens"), usage.get("completion_tokens"), now, now,
+            json.dumps(full, ensure_ascii=False, default=str),
+        )
+
+    def append(
+        self,
+        results: Iterable[Dict[str, Any]],
+        model: Optional[str] = None,
+        screen: Optional[str] = None,
+    ) -> int:
+        """
+        Insert or replace ``results`` (each with a ``drug_name``) in one
+        transaction; rows with an ``error`` are skipped.  Returns rows written.
+        """
+        now = time.time()
+        rows = [self._row(r, model, screen, now) for r in results if "error" not in r]
+        if not rows:
+            return 0
+        placeholders = ", ".join("?" * len(_COLUMNS))
+        updates = ", ".join(f"{c} = excluded.{c}" for c in _COLUMNS[1:] if c != "created")
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT INTO results ({', '.join(_COLUMNS)}) VALUES ({placeholders}) "
+                f"ON CONFLICT (name_key) DO UPDATE SET {updates}",
+                rows,
+            )
+        return len(rows)
+
+    def put(self, drug_name: str, result: Dict[str, Any], **kwargs: Any) -> None:
+        self.append([{**result, "drug_name": drug_name}], **kwargs)
+
+    def get(self, drug_name: str) -> Optional[Dict[str, Any]]:
+        """The stored result for ``drug_name`` (any case or spacing)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM results WHERE name_key = ?", (normalize_name(drug_name),)
+            ).fetchone()
+        return None if row is None else json.loads(row["result"])
+
+    def by_cid(self, cid: int) -> List[Dict[str, Any]]:
+        """Stored results of every name that resolved to ``cid``."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT result FROM results WHERE cid = ? ORDER BY drug_name", (cid,)
+            ).fetchall()
+        return [json.loads(r["result"]) for r in rows]
+
+    def query(
+        self,
+        conclusion: Optional[str] = None,
+        min_relevance: Optional[int] = None,
+        min_confidence: Optional[int] = None,
+        screen: Optional[str] = None,
+        order_by: str = "relevance",
+        descending: Optional[bool] = None,
+        limit: Optional[int] = None,
+        full: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Rows matching every given filter, sorted by ``order_by`` (one of
+        ``ORDER_COLUMNS``; ties broken by confidence then name).  Rows hold
+        the summary columns, or the whole stored result with ``full``.
+        """
+        if order_by not in ORDER_COLUMNS:
+            raise ValueError(f"Cannot order by {order_by!r}; expected one of {sorted(ORDER_COLUMNS)}")
+        where, params = [], []
+        for clause, value in (("conclusion = ?", conclusion), ("relevance >= ?", min_relevance),
+                              ("confidence >= ?", min_confidence), ("screen = ?", screen)):
+            if value is not None:
+                where.append(clause)
+                params.append(value)
+        direction = ORDER_COLUMNS[order_by] if descending is None else ("DESC" if descending else "ASC")
+        sql = f"SELECT {'result' if full else ', '.join(_SUMMARY)} FROM results"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order_by} {direction}, confidence DESC, drug_name"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        if full:
+            return [json.loads(r["result"]) for r in rows]
+        return [dict(r) for r in rows]
+
+    def counts(self, screen: Optional[str] = None) -> Dict[str, int]:
+        """Compounds per conclusion."""
+        sql = "SELECT conclusion, COUNT(*) AS n FROM results"
+        params: List[Any] = []
+        if screen is not None:
+            sql += " WHERE screen = ?"
+            params.append(screen)
+        with self._lock:
+            rows = self._conn.execute(sql + " GROUP BY conclusion", params).fetchall()
+        return {r["conclusion"]: r["n"] for r in rows}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def export_csv(self, path: str, **filters: Any) -> int:
+        """Write ``query(**filters)`` to ``path`` as CSV; returns rows written."""
+        rows = self.query(**filters)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(_SUMMARY))
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+    def load_jsonl(self, path: str, model: Optional[str] = None,
+                   screen: Optional[str] = None, chunk: int = 1000) -> int:
+        """Bulk-load a batch results file (see ``batch.run_batch``)."""
+        written, buffer = 0, []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    buffer.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # a line cut short by a crash
+                if len(buffer) >= chunk:
+                    written += self.append(buffer, model, screen)
+                    buffer = []
+        return written + self.append(buffer, model, screen)
+
+    def load_evaluation_files(self, paths: Iterable[str], model: Optional[str] = None,
+                              screen: Optional[str] = None) -> int:
+        """
+        Bulk-load loose ``{drug}_evaluation.json`` files, which carry no
+        ``drug_name``; the name is taken from the file name.
+        """
+        results = []
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                result = json.load(f)
+            stem = os.path.basename(path).rsplit(".", 1)[0]
+            results.append({"drug_name": stem.removesuffix("_evaluation"), **result})
+        return self.append(results, model, screen)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m drug_fibrosis_agent.results",
+        description="Load, rank and export stored fibrosis evaluations.",
+    )
+    parser.add_argument("store", help="SQLite results file")
+    parser.add_argument("--load", metavar="FILE", action="append", default=[],
+                        help="append a batch .jsonl or a {drug}_evaluation.json (repeatable)")
+    parser.add_argument("--screen", help="screen name for loaded rows / filter for queries")
+    parser.add_argument("--conclusion", choices=["Positive", "Negative", "Indeterminate"])
+    parser.add_argument("--min-relevance", type=int)
+    parser.add_argument("--min-confidence", type=int)
+    parser.add_argument("--order-by", default="relevance", choices=sorted(ORDER_COLUMNS))
+    parser.add_argument("--top", type=int, help="only the first N rows")
+    parser.add_argument("--export", metavar="CSV", help="write the rows to a CSV file")
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.store)
+    for path in args.load:
+        # rows are tagged with --screen, or else the name of the file they came from
+        screen = args.screen or os.path.basename(path)
+        if path.endswith(".json"):
+            written = store.load_evaluation_files([path], screen=screen)
+        else:
+            written = store.load_jsonl(path, screen=screen)
+        print(f"{path}: {written} results", file=sys.stderr)
+    filters = dict(conclusion=args.conclusion, min_relevance=args.min_relevance,
+                   min_confidence=args.min_confidence, screen=args.screen,
+                   order_by=args.order_by, limit=args.top)
+    if args.export:
+        print(f"{args.export}: {store.export_csv(args.export, **filters)} rows", file=sys.stderr)
+    elif not args.load:
+        for row in store.query(**filters):
+            print(f"{row['relevance'] if row['relevance'] is not None else '-':>4} "
+                  f"{row['confidence'] if row['confidence'] is not None else '-':>4}  "
+                  f"{row['conclusion']:<14}{row['drug_name']}")
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
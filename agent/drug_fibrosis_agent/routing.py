@@ -0,0 +1,157 @@
+"""
+Hedged, latency-aware routing across interchangeable LLM backends.
+
+``HedgedRouter`` sends each request to the primary backend and, if it has
+not answered by a deadline taken from the primary's own recent latency
+(e.g. its p95), starts the same request on the next backend.  Whichever
+answers first wins and the other is cancelled, so a cold-starting or
+stalled primary costs at most the deadline instead of the whole request.
+A backend that fails outright hands over to the next one immediately.
+
+Backends are plain async callables, so the router is independent of
+litellm and can be exercised against local stubs.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence
+
+
+class LatencyWindow:
+    """Latencies of the last ``size`` successful calls, in seconds."""
+
+    def __init__(self, size: int = 200) -> None:
+        self._samples: Deque[float] = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Nearest-rank ``q`` quantile (0-1), or None without samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = min(len(samples) - 1, max(0, int(round(q * len(samples))) - 1))
+        return samples[rank]
+
+
+@dataclass
+class Backend:
+    """One way of answering a request: ``call(**request)`` returns the response."""
+
+    name: str
+    call: Callable[..., Awaitable[Any]]
+    latency: LatencyWindow = field(default_factory=LatencyWindow)
+
+
+@dataclass
+class Routed:
+    response: Any
+    backend: str
+    hedged: bool
+    latency: float
+
+
+class HedgedRouter:
+    """
+    Route to ``backends`` in order, hedging on the next one after a deadline.
+
+    The deadline is the primary's ``hedge_quantile`` latency once it has
+    ``min_samples`` successes (``initial_deadline`` before that), clamped to
+    ``[min_deadline, max_deadline]``.  ``stats`` counts wins per backend,
+    hedges started and failures.
+    """
+
+    def __init__(
+        self,
+        backends: Sequence[Backend],
+        hedge_quantile: float = 0.95,
+        initial_deadline: float = 5.0,
+        min_deadline: float = 0.25,
+        max_deadline: float = 30.0,
+        min_samples: int = 20,
+    ) -> None:
+        if not backends:
+            raise ValueError("HedgedRouter needs at least one backend")
+        self.backends: List[Backend] = list(backends)
+        self.hedge_quantile = hedge_quantile
+        self.initial_deadline = initial_deadline
+        self.min_deadline = min_deadline
+        self.max_deadline = max_deadline
+        self.min_samples = min_samples
+        self.stats: Dict[str, Any] = {
+            "wins": collections.Counter(), "hedges": 0, "failures": collections.Counter(),
+        }
+
+    def deadline(self, backend: Backend) -> float:
+        quantile = None
+        if len(backend.latency) >= self.min_samples:
+            quantile = backend.latency.percentile(self.hedge_quantile)
+        seconds = self.initial_deadline if quantile is None else quantile
+        return min(self.max_deadline, max(self.min_deadline, seconds))
+
+    async def _timed(self, backend: Backend, request: Dict[str, Any]) -> tuple:
+        start = time.perf_counter()
+        response = await backend.call(**request)
+        elapsed = time.perf_counter() - start
+        backend.latency.record(elapsed)
+        return backend, response, elapsed
+
+    async def acompletion(self, **request: Any) -> Routed:
+        """
+        Answer ``request`` from the first backend to succeed.
+
+        Raises the last backend's error if every backend fails.
+        """
+        pending: Dict[asyncio.Task, Backend] = {}
+        queue = list(self.backends)
+        error: Optional[BaseException] = None
+        hedged = False
+        start = time.perf_counter()
+
+        def launch() -> None:
+            backend = queue.pop(0)
+            task = asyncio.ensure_future(self._timed(backend, request))
+            pending[task] = backend
+
+        launch()
+        try:
+            while pending:
+                # only the newest attempt's deadline matters for hedging
+                newest = list(pending.values())[-1]
+                timeout = self.deadline(newest) if queue else None
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:  # deadline passed: hedge on the next backend
+                    self.stats["hedges"] += 1
+                    hedged = True
+                    launch()
+                    continue
+                for task in done:
+                    backend = pending.pop(task)
+                    if task.exception() is None:
+                        _, response, _ = task.result()
+                        self.stats["wins"][backend.name] += 1
+                        return Routed(response, backend.name, hedged,
+                                      time.perf_counter() - start)
+                    error = task.exception()
+                    self.stats["failures"][backend.name] += 1
+                if not pending and queue:  # failed outright: next one now
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        assert error is not None
+        raise error
@@ -0,0 +1,65 @@
+"""
+Single-flight call coalescing: concurrent callers asking for the same key
+share one execution and receive its result (or its exception).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Thread flavour: followers block on the leader's ``Future``."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return fut.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+        fut.set_result(result)
+        return result
+
+
+class AsyncSingleFlight:
+    """
+    Asyncio flavour: the first caller's coroutine runs as a task that later
+    callers await.  The task is shielded, so one waiter being cancelled does
+    not cancel the work the others are waiting on.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)  # tasks cannot be awaited from another loop
+        task = self._calls.get(slot)
+        if task is None:
+            task = loop.create_task(fn())
+            self._calls[slot] = task
+            task.add_done_callback(lambda _t: self._calls.pop(slot, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
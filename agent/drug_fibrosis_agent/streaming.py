@@ -0,0 +1,91 @@
+"""
+Incremental decoding of one JSON array out of a streamed response body.
+
+PubChem's assaysummary for a well-studied compound runs to tens of MB, yet
+only a handful of rows survive summarisation.  ``iter_json_array`` yields
+the array's items one by one as text chunks arrive, so callers can filter
+rows on the fly and stop reading once they have what they need.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, AsyncIterator, Iterable, Iterator, List
+
+_decoder = json.JSONDecoder()
+_SEPARATORS = " \t\r\n,"
+
+
+class _ArrayItemParser:
+    """Feeds text chunks; returns the complete items of ``"<key>": [...]``."""
+
+    def __init__(self, key: str) -> None:
+        self._start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._tail = len(key) + 64
+        self._buf = ""
+        self._in_array = False
+        self._eof = False
+        self.done = False
+
+    def feed(self, text: str) -> List[Any]:
+        if self.done:
+            return []
+        buf = self._buf + text
+        if not self._in_array:
+            m = self._start.search(buf)
+            if m is None:
+                # keep enough to catch a key split across two chunks
+                self._buf = buf[-self._tail:]
+                return []
+            buf, self._in_array = buf[m.end():], True
+
+        items: List[Any] = []
+        pos, end = 0, len(buf)
+        while True:
+            while pos < end and buf[pos] in _SEPARATORS:
+                pos += 1
+            if pos >= end:
+                break
+            if buf[pos] == "]":
+                self.done = True
+                break
+            try:
+                item, pos_after = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # item still incomplete; wait for the next chunk
+            if (isinstance(item, (int, float)) and not self._eof
+                    and (pos_after >= end or buf[pos_after] not in _SEPARATORS + "]")):
+                break  # a number may go on in the next chunk ("12" | "34")
+            items.append(item)
+            pos = pos_after
+        self._buf = buf[pos:]
+        return items
+
+    def close(self) -> List[Any]:
+        """The item held back at the end of a body cut short inside the array."""
+        if self.done or not self._in_array:
+            return []
+        self._eof = True
+        return self.feed("")
+
+
+def iter_json_array(chunks: Iterable[str], key: str) -> Iterator[Any]:
+    """Yield the items of the first ``"<key>": [...]`` array in ``chunks``."""
+    parser = _ArrayItemParser(key)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+        if parser.done:
+            return
+    yield from parser.close()
+
+
+async def aiter_json_array(chunks: AsyncIterator[str], key: str) -> AsyncIterator[Any]:
+    parser = _ArrayItemParser(key)
+    async for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+        if parser.done:
+            return
+    for item in parser.close():
+        yield item
@@ -0,0 +1,256 @@
+"""
+LLM usage and cost accounting.
+
+``UsageAccumulator.record`` is called on the request path and only appends
+to a ``collections.deque`` (atomic under the GIL), so recording never takes
+a lock.  Records are folded into per-window counters -- keyed by window,
+model, endpoint and screen -- when someone reads them (``snapshot``) or
+persists them (``flush``, which adds the counts folded since the previous
+flush to a SQLite file).  Costs use per-model prices from ``PRICES``.
+"""
+
+from __future__ import annotations
+
+import collections
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Price:
+    """US dollars per million tokens; cached prompt tokens bill at ``cached_input``."""
+
+    input: float
+    output: float
+    cached_input: Optional[float] = None
+
+
+PRICES: Dict[str, Price] = {
+    "llama3.1-modal": Price(input=0.25, output=0.25),
+    "gpt-4o-mini": Price(input=0.15, output=0.60, cached_input=0.075),
+    "gpt-4o": Price(input=2.50, output=10.00, cached_input=1.25),
+}
+
+
+def cost_of(
+    model: str, prompt_tokens: int = 0, completion_tokens: int = 0, cached_tokens: int = 0
+) -> Optional[float]:
+    """Dollar cost of one call, or None for a model without a price."""
+    price = PRICES.get(model)
+    if price is None:
+        return None
+    cached = min(cached_tokens, prompt_tokens)
+    cached_rate = price.input if price.cached_input is None else price.cached_input
+    return (
+        (prompt_tokens - cached) * price.input
+        + cached * cached_rate
+        + completion_tokens * price.output
+    ) / 1_000_000
+
+
+def usage_from_events(events: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    """Tokens actually spent by an evaluation, from its trace events."""
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    for event in events:
+        if event.get("kind") == "node":
+            for key in totals:
+                totals[key] += event.get(key, 0)
+    return totals
+
+
+def requests_from_events(events: Iterable[Dict[str, Any]]) -> int:
+    """
+    LLM requests an evaluation made: 0 for cached verdicts and rule routes,
+    and a request shared by a batch of compounds counts for one of them.
+    """
+    return sum(event.get("llm_requests", 0) for event in events
+               if event.get("kind") == "node")
+
+
+# counters per (window start, model, endpoint, screen)
+_FIELDS = ("requests", "compounds", "prompt_tokens", "completion_tokens",
+           "cached_tokens", "cost")
+Key = Tuple[float, str, str, str]
+
+
+class UsageAccumulator:
+    """
+    Usage counters bucketed into ``window``-second windows.
+
+    Windows older than ``retention`` seconds are dropped from memory once
+    flushed.  With ``path`` unset, ``flush`` is a no-op and the counters
+    live only in this process.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS usage (
+            window_start      REAL NOT NULL,
+            model             TEXT NOT NULL,
+            endpoint          TEXT NOT NULL,
+            screen            TEXT NOT NULL,
+            requests          INTEGER NOT NULL,
+            compounds         INTEGER NOT NULL,
+            prompt_tokens     INTEGER NOT NULL,
+            completion_tokens INTEGER NOT NULL,
+            cached_tokens     INTEGER NOT NULL,
+            cost              REAL NOT NULL,
+            PRIMARY KEY (window_start, model, endpoint, screen)
+        );
+    """
+
+    def __init__(
+        self, path: Optional[str] = None, window: float = 60.0, retention: float = 24 * 3600.0
+    ) -> None:
+        self.path = path
+        self.window = window
+        self.retention = retention
+        self._pending: Deque[tuple] = collections.deque()
+        self._windows: Dict[Key, List[float]] = {}
+        self._unflushed: Dict[Key, List[float]] = {}
+        self.unpriced: set = set()
+        self._lock = threading.Lock()  # readers only; record() never takes it
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def record(
+        self,
+        model: str,
+        endpoint: str,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cached_tokens: int = 0,
+        compounds: int = 0,
+        screen: Optional[str] = None,
+        requests: int = 1,
+    ) -> None:
+        """
+        Count ``requests`` LLM calls (default one) for ``compounds``
+        compounds; an evaluation answered without the model records 0.
+        """
+        self._pending.append((time.time(), model, endpoint, screen or "", requests,
+                              prompt_tokens, completion_tokens, cached_tokens, compounds))
+
+    def _fold(self) -> None:
+        # caller holds self._lock
+        pending = self._pending
+        while pending:
+            ts, model, endpoint, screen, requests, prompt, completion, cached, compounds = (
+                pending.popleft())
+            cost = cost_of(model, prompt, completion, cached)
+            if cost is None:
+                self.unpriced.add(model)
+                cost = 0.0
+            key = (ts - ts % self.window, model, endpoint, screen)
+            delta = (requests, compounds, prompt, completion, cached, cost)
+            tables = (self._windows, self._unflushed) if self.path else (self._windows,)
+            for table in tables:
+                counts = table.get(key)
+                if counts is None:
+                    counts = table[key] = [0] * len(_FIELDS)
+                for i, d in enumerate(delta):
+                    counts[i] += d
+        horizon = time.time() - self.retention
+        for key in [k for k in self._windows if k[0] < horizon and k not in self._unflushed]:
+            del self._windows[key]
+
+    def snapshot(
+        self, since: Optional[float] = None, screen: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Totals over the last ``since`` seconds (everything retained if None),
+        optionally for one ``screen``, broken down by model, endpoint and
+        screen, with tokens/sec and cost per compound.
+        """
+        now = time.time()
+        with self._lock:
+            self._fold()
+            rows = [(k, list(v)) for k, v in self._windows.items()
+                    if (since is None or k[0] + self.window > now - since)
+                    and (screen is None or k[3] == screen)]
+        total = [0] * len(_FIELDS)
+        groups: Dict[str, Dict[str, List[float]]] = {"model": {}, "endpoint": {}, "screen": {}}
+        for (start, model, endpoint, scr), counts in rows:
+            for group, name in (("model", model), ("endpoint", endpoint), ("screen", scr)):
+                if group == "screen" and not name:
+                    continue
+                acc = groups[group].setdefault(name, [0] * len(_FIELDS))
+                for i, c in enumerate(counts):
+                    acc[i] += c
+            for i, c in enumerate(counts):
+                total[i] += c
+        first = min((k[0] for k, _ in rows), default=now)
+        span = max(now - first, 1e-9) if since is None else since
+
+        def describe(counts: List[float]) -> Dict[str, Any]:
+            out = dict(zip(_FIELDS, counts))
+            compounds, cost = out["compounds"], out["cost"]
+            out["cost"] = round(cost, 6)
+            out["cost_per_compound"] = round(cost / compounds, 8) if compounds else None
+            return out
+
+        return {
+            "since_s": since,
+            "screen": screen,
+            **describe(total),
+            "tokens_per_s": (total[2] + total[3]) / span if rows else 0.0,
+            "by_model": {k: describe(v) for k, v in sorted(groups["model"].items())},
+            "by_endpoint": {k: describe(v) for k, v in sorted(groups["endpoint"].items())},
+            "by_screen": {k: describe(v) for k, v in sorted(groups["screen"].items())},
+            "unpriced_models": sorted(self.unpriced),
+        }
+
+    def flush(self) -> int:
+        """Add the counts folded since the last flush to ``path``; rows written."""
+        if self.path is None:
+            return 0
+        with self._lock:
+            self._fold()
+            rows, self._unflushed = self._unflushed, {}
+            if not rows:
+                return 0
+            if self._conn is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.executescript(self._SCHEMA)
+            updates = ", ".join(f"{f} = {f} + excluded.{f}" for f in _FIELDS)
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    f"ON CONFLICT (window_start, model, endpoint, screen) DO UPDATE SET {updates}",
+                    [key + tuple(counts) for key, counts in rows.items()],
+                )
+            return len(rows)
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_default_usage: Optional[UsageAccumulator] = None
+_default_usage_lock = threading.Lock()
+
+
+def default_usage() -> UsageAccumulator:
+    """
+    Process-wide accumulator; ``USAGE_DB_PATH`` names the SQLite file it
+    flushes to (in-memory only when unset).
+    """
+    global _default_usage
+    if _default_usage is None:
+        with _default_usage_lock:
+            if _default_usage is None:
+                _default_usage = UsageAccumulator(os.getenv("USAGE_DB_PATH"))
+    return _default_usage
+
+
+def set_default_usage(accumulator: UsageAccumulator) -> None:
+    global _default_usage
+    with _default_usage_lock:
+        _default_usage = accumulator
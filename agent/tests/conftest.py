@@ -0,0 +1,169 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from langchain_core.messages import AIMessage
+
+from drug_fibrosis_agent import PubChemTool
+
+# ------------------------------------------------------------------ #
+# PubChem stand-in                                                   #
+# ------------------------------------------------------------------ #
+class FakePubChem:
+    """
+    Answers ``PubChemTool._fetch``/``_afetch`` by parsing the request path.
+
+    "drug<N>" resolves to CID N + 1 and "unknown" to nothing.  Property and
+    assay requests may name several comma-separated CIDs and tag each row
+    with its CID, as PUG-REST does; every compound has one active fibrosis
+    assay, streamed through ``keep_rows`` when one is given.  Other records
+    are empty.  ``status(path)`` picks the HTTP status to fail a request
+    with (200 = answer it).
+    """
+
+    ASSAY_NAME = "TGF-beta cardiac fibroblast"
+
+    def __init__(self) -> None:
+        self.fetched = []
+        self.status = lambda path: 200
+
+    def fetch(self, tool, path, stream_rows=False, keep_rows=None):
+        self.fetched.append(path)
+        status = self.status(path)
+        if status != 200:
+            request = httpx.Request("GET", path)
+            raise httpx.HTTPStatusError(f"{status}", request=request,
+                                        response=httpx.Response(status, request=request))
+        kind, key, *rest = path.split("/")[2:]
+        if kind == "name":
+            return {"IdentifierList": {"CID": [] if key == "unknown" else [int(key[4:]) + 1]}}
+        cids = [int(c) for c in key.split(",")]
+        if rest[0] == "property":
+            return {"PropertyTable": {"Properties": [
+                {"CID": c, "MolecularFormula": f"C{c}"} for c in cids]}}
+        if rest[0] == "assaysummary":
+            rows = [{"CID": c, "AID": 1, "Name": self.ASSAY_NAME, "ActivityOutcome": "Active"}
+                    for c in cids]
+            return keep_rows(iter(rows)) if keep_rows else {"AssayTable": {"Rows": rows}}
+        return {}
+
+    async def afetch(self, tool, path, stream_rows=False):
+        return self.fetch(tool, path, stream_rows)
+
+    def bulk(self):
+        """Requests that named several CIDs at once."""
+        return [p for p in self.fetched if "," in p.split("/")[3]]
+
+
+@pytest.fixture
+def fake_pubchem(monkeypatch):
+    fake = FakePubChem()
+    monkeypatch.setattr(PubChemTool, "_fetch", lambda tool, *a, **k: fake.fetch(tool, *a, **k))
+    monkeypatch.setattr(PubChemTool, "_afetch", lambda tool, *a, **k: fake.afetch(tool, *a, **k))
+    return fake
+
+# ------------------------------------------------------------------ #
+# LLM stubs                                                          #
+# ------------------------------------------------------------------ #
+class DummyLLM:
+    """
+    Replies ``reply`` as JSON after ``delay`` seconds, sync or async.
+    Counts calls and the peak number of async calls in flight, and appends
+    "verdict" to ``log`` as each reply is sent.
+    """
+
+    def __init__(self, reply=None, delay=0.0, log=None):
+        self.reply = reply or {"conclusion": "Indeterminate", "rationale": "mock"}
+        self.delay = delay
+        self.log = log
+        self.calls = self.inflight = self.peak = 0
+
+    def bind(self, **_unused):
+        return self
+
+    def _answer(self, _messages):
+        if self.log is not None:
+            self.log.append("verdict")
+        return SimpleNamespace(content=json.dumps(self.reply))
+
+    def invoke(self, messages):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return self._answer(messages)
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        self.inflight += 1
+        self.peak = max(self.peak, self.inflight)
+        await asyncio.sleep(self.delay)
+        self.inflight -= 1
+        return self._answer(messages)
+
+
+class BatchLLM(DummyLLM):
+    """
+    Answers multi-compound prompts with a NEGATIVE "batch" verdict per
+    compound, recording each batch's size.  The first ``garbled`` batches
+    get an unparsable reply; ``skip_first`` leaves each batch's first
+    compound out of the reply.  Single-compound prompts get ``reply``.
+    """
+
+    def __init__(self, garbled=0, skip_first=False):
+        super().__init__()
+        self.garbled = garbled
+        self.skip_first = skip_first
+        self.sizes = []
+
+    async def ainvoke(self, messages):
+        text = messages[-1].content
+        if not text.startswith("COMPOUND_BRIEFS = "):
+            return await super().ainvoke(messages)
+        briefs = json.loads(text[len("COMPOUND_BRIEFS = "):])
+        self.sizes.append(len(briefs))
+        if len(self.sizes) <= self.garbled:
+            return SimpleNamespace(content="not json")
+        return SimpleNamespace(content=json.dumps({"results": [
+            {"id": b["id"], "conclusion": "NEGATIVE", "relevance": 10,
+             "confidence": 90, "rationale": "batch"}
+            for b in briefs[int(self.skip_first):]]}))
+
+
+class MeteredLLM(DummyLLM):
+    """A positive verdict carrying LangChain usage metadata."""
+
+    model_name, temperature = "stub", 0
+
+    def __init__(self, prompt_tokens=300, completion_tokens=40, cached_tokens=0):
+        super().__init__({"conclusion": "Positive", "relevance": 80})
+        self.usage = {
+            "input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "input_token_details": {"cache_read": cached_tokens},
+        }
+
+    def _answer(self, _messages):
+        return AIMessage(content=json.dumps(self.reply), usage_metadata=self.usage)
+
+
+@pytest.fixture
+def dummy_llm():
+    return DummyLLM()
+
+
+@pytest.fixture
+def make_llm():
+    return DummyLLM
+
+
+@pytest.fixture
+def make_batch_llm():
+    return BatchLLM
+
+
+@pytest.fixture
+def make_metered_llm():
+    return MeteredLLM
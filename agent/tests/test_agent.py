@@ -1,22 +1,50 @@
+import asyncio
 import json
 import os
+import random
+import threading
+import time
 from types import SimpleNamespace
 
+import httpx
 import pytest
-from drug_fibrosis_agent import evaluate_drug, PubChemTool
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
 
-class DummyLLM:
-    def bind(self, **_unused):
-        return self
-    def invoke(self, _prompt: str):
-        return SimpleNamespace(content=json.dumps({
-            "conclusion": "Indeterminate",
-            "rationale": "mock"
-        }))
+from drug_fibrosis_agent import (
+    FibrosisEvaluator,
+    PubChemTool,
+    PubChemTransport,
+    aevaluate_drug,
+    agent,
+    evaluate_drug,
+    evaluate_drugs,
+)
+from drug_fibrosis_agent.agent import (
+    BATCH_PROMPT_VERSION,
+    BRIEF_TOKEN_BUDGET,
+    PROMPT_VERSION,
+    _ASSAY_MATCHER,
+    _FIBROSIS_TERMS,
+    BatchScorer,
+    CompoundBrief,
+    _cid_path,
+    _fibrosis_prompt,
+    _json_tokens,
+    _llm_identity,
+    _parse_batch,
+    _parse_verdict,
+    _summarise_many,
+    _summarise_pubchem,
+    _trim_summary,
+    detail_paths,
+    fetch_details,
+    fetch_records,
+)
+from drug_fibrosis_agent.cache import MemoryCache, VerdictCache, verdict_key
+from drug_fibrosis_agent.usage import requests_from_events
 
-@pytest.fixture
-def dummy_llm():
-    return DummyLLM()
+# DummyLLM, the PubChem stand-in and the other stubs live in conftest.py
 
 # ------------------------------------------------------------------ #
 # Tests                                                              #
@@ -45,3 +73,419 @@ def test_jq1_integration():
     from langchain_openai import ChatOpenAI
     out = evaluate_drug("JQ1", llm=ChatOpenAI(model="gpt-4o-mini", temperature=0))
     assert out["conclusion"] in {"Positive", "Indeterminate"}
+
+def test_tools_share_pooled_transport():
+    a, b = PubChemTool(), PubChemTool()
+    assert a._transport is b._transport
+    client = a._transport.client
+    assert client is b._transport.client
+    assert not client.is_closed
+    assert str(client.base_url).startswith("https://pubchem.ncbi.nlm.nih.gov/rest/pug")
+
+def test_fetch_details_concurrent_and_ordered(monkeypatch):
+    inflight, peak = [0], [0]
+    lock = threading.Lock()
+
+    def slow_run(self, path):
+        with lock:
+            inflight[0] += 1
+            peak[0] = max(peak[0], inflight[0])
+        time.sleep(0.05)
+        with lock:
+            inflight[0] -= 1
+        return {"path": path}
+
+    monkeypatch.setattr(PubChemTool, "_run", slow_run)
+    records = fetch_records(42, PubChemTool())
+    assert peak[0] > 1
+    assert list(records) == detail_paths(42)
+    assert all(v == {"path": k} for k, v in records.items())
+    out = fetch_details({"cid": 42, "trace": ["/first"]}, PubChemTool())
+    assert out["trace"] == ["/first"] + detail_paths(42)
+    assert set(out) == {"brief", "trace"}  # raw records stay out of the state
+
+def test_full_profile_feeds_summary(monkeypatch):
+    fetched, missing = [], {"status": 404}
+
+    def fake_fetch(self, path, stream_rows=False):
+        fetched.append(path)
+        if "/xrefs/GeneID/" in path:
+            return {"InformationList": {"Information": [{"CID": 7, "GeneID": [1, 23476]}]}}
+        if "/description/" in path:
+            request = httpx.Request("GET", path)
+            raise httpx.HTTPStatusError("missing", request=request,
+                                        response=httpx.Response(missing["status"], request=request))
+        return {}
+
+    monkeypatch.setattr(PubChemTool, "_fetch", fake_fetch)
+    tool = PubChemTool(cache=MemoryCache())
+    fast = fetch_details({"cid": 7, "trace": []}, tool)
+    full = fetch_details({"cid": 7, "trace": []}, tool, profile="full")
+    assert len(fast["trace"]) == 3 and len(full["trace"]) == 5
+    summary = full["brief"].summary
+    assert summary["targets"] == [
+        {"name": "BRD4", "id": 23476, "interaction_type": "GeneID cross-reference"}]
+    assert summary["detected_mechanisms"]["BRD4_inhibitor"] is True
+
+    # a 404 means "no record" and is cached; anything else is an error
+    fetched.clear()
+    fetch_details({"cid": 7, "trace": []}, tool, profile="full")
+    assert fetched == []
+    missing["status"] = 500
+    with pytest.raises(httpx.HTTPStatusError):
+        fetch_details({"cid": 8, "trace": []}, tool, profile="full")
+
+def test_description_mentions_reach_summary():
+    text = "Givinostat is an HDAC inhibitor with antifibrotic activity in cardiac fibroblasts. "
+    summary = _summarise_pubchem({"/compound/cid/1/description/JSON": {"InformationList": {
+        "Information": [{"CID": 1, "Title": "Givinostat"},
+                        {"CID": 1, "Description": text * 20, "DescriptionSourceName": "ChEBI"},
+                        {"CID": 1, "Description": "A white powder.",
+                         "DescriptionSourceName": "HSDB"}]}}})
+    (mention,) = summary["descriptions"]
+    assert mention["source"] == "ChEBI" and mention["text"].startswith("Givinostat")
+    assert len(mention["text"]) == 500
+    assert summary["detected_mechanisms"]["anti_fibrotic_literature"] is True
+
+def test_tool_caches_responses(monkeypatch):
+    calls = []
+    transport = httpx.MockTransport(
+        lambda req: calls.append(req.url.path) or httpx.Response(200, json={"ok": 1})
+    )
+    tool = PubChemTool(transport=PubChemTransport(transport=transport), cache=MemoryCache())
+    assert tool.run("/compound/cid/1/xrefs/GeneID/JSON") == {"ok": 1}
+    assert tool.run("/compound/cid/1/xrefs/GeneID/JSON") == {"ok": 1}
+    assert len(calls) == 1
+
+def test_unknown_name_is_looked_up_once(dummy_llm):
+    calls = []
+    transport = httpx.MockTransport(
+        lambda req: calls.append(req.url.path) or httpx.Response(
+            404, json={"Fault": {"Code": "PUGREST.NotFound"}})
+    )
+    pooled = PubChemTransport(transport=transport, async_transport=transport)
+    for run in (FibrosisEvaluator.evaluate, lambda ev, n: asyncio.run(ev.aevaluate(n))):
+        calls.clear()
+        tool = PubChemTool(transport=pooled, cache=MemoryCache())
+        ev = FibrosisEvaluator(dummy_llm, tool=tool, result_ttl=0)
+        assert run(ev, "NoSuchDrug")["conclusion"] == "Indeterminate"
+        assert run(ev, "NoSuchDrug")["conclusion"] == "Indeterminate"
+        assert calls == ["/rest/pug/compound/name/NoSuchDrug/cids/JSON"]
+
+def test_evaluation_resolves_the_name_once(fake_pubchem, dummy_llm):
+    for run in (FibrosisEvaluator.evaluate, lambda ev, n: asyncio.run(ev.aevaluate(n))):
+        fake_pubchem.fetched.clear()
+        ev = FibrosisEvaluator(dummy_llm, tool=PubChemTool(use_cache=False), result_ttl=0)
+        out = run(ev, "drug1")
+        assert out["cid"] == 2
+        assert out["tool_trace"][0] == "/compound/name/drug1/cids/JSON"
+        lookups = [p for p in fake_pubchem.fetched if "/name/" in p]
+        assert lookups == ["/compound/name/drug1/cids/JSON"]
+
+def test_evaluate_drugs_batches_detail_lookups(monkeypatch, dummy_llm, fake_pubchem):
+    names = [f"drug{i}" for i in range(25)] + ["unknown"]
+    summarised = []
+    real_from_records = CompoundBrief.from_records.__func__
+    monkeypatch.setattr(CompoundBrief, "from_records", classmethod(
+        lambda cls, *a: summarised.append(a) or real_from_records(cls, *a)))
+    out = evaluate_drugs(names, llm=dummy_llm, tool=PubChemTool(use_cache=False))
+    # briefs were built for the whole list at once; only the unresolved
+    # name's empty brief is made on its own
+    assert summarised == [({},)]
+    assert out[0]["brief_hash"] == real_from_records(CompoundBrief, {
+        "/compound/cid/1/assaysummary/JSON": {"AssayTable": {"Rows": [
+            {"CID": 1, "AID": 1, "Name": fake_pubchem.ASSAY_NAME, "ActivityOutcome": "Active"}]}},
+        "/compound/cid/1/property/MolecularFormula,MolecularWeight,CanonicalSMILES/JSON":
+            {"PropertyTable": {"Properties": [{"CID": 1, "MolecularFormula": "C1"}]}},
+        "/compound/cid/1/classification/JSON": {},
+    }, BRIEF_TOKEN_BUDGET).digest
+    assert [r["drug_name"] for r in out] == names
+    assert out[0]["tool_trace"][-1] == "/compound/cid/1/assaysummary/JSON"
+    assert len(fake_pubchem.bulk()) == 1 + 3  # one property chunk, three assay chunks
+    # 26 name lookups + 4 bulk + 25 per-CID classifications, nothing repeated
+    assert len(fake_pubchem.fetched) == 26 + 4 + 25
+
+def test_evaluate_many_runs_chunks_concurrently(fake_pubchem, make_llm):
+    llm = make_llm(delay=0.1)
+    ev = FibrosisEvaluator(llm, tool=PubChemTool(use_cache=False),
+                           verdict_cache=VerdictCache())
+    names = [f"drug{i}" for i in range(20)]
+    start = time.perf_counter()
+    out = ev.evaluate_many(names, chunk_size=10, workers=10)
+    assert llm.calls == 20 and time.perf_counter() - start < 20 * 0.1 / 2
+    assert [r["drug_name"] for r in out] == names
+    assert all(r["rationale"] == "mock" for r in out)
+    # one bulk property request per chunk
+    assert sum("/property/" in p for p in fake_pubchem.bulk()) == 2
+
+def test_evaluate_many_fails_compounds_alone(fake_pubchem, dummy_llm):
+    def status(path):
+        key = path.split("/")[3]
+        if key == "bad":
+            return 400  # a malformed name
+        # a chunk none of whose compounds has assay data
+        return 404 if "," in key and "/assaysummary/" in path else 200
+
+    fake_pubchem.status = status
+    ev = FibrosisEvaluator(dummy_llm, tool=PubChemTool(use_cache=False), fast_path=False)
+    out = ev.evaluate_many(["drug1", "drug2", "bad", "drug3"])
+    assert [r["drug_name"] for r in out] == ["drug1", "drug2", "bad", "drug3"]
+    assert out[2]["error"].startswith("HTTPStatusError")
+    assert all(out[i]["rationale"] == "mock" for i in (0, 1, 3))
+
+def test_evaluator_compiles_once(monkeypatch, make_llm):
+    compiled = []
+    real_build = agent.build_graph
+    monkeypatch.setattr(agent, "build_graph",
+                        lambda *a, **k: compiled.append(1) or real_build(*a, **k))
+    monkeypatch.setattr(
+        PubChemTool, "_run", lambda self, path: {"IdentifierList": {"CID": []}}
+    )
+    llm = make_llm()
+    first = evaluate_drug("Reused1", llm=llm)
+    second = evaluate_drug("Reused2", llm=llm)
+    assert len(compiled) == 1
+    assert first.keys() == second.keys()
+    assert agent.get_evaluator(llm) is agent.get_evaluator(llm)
+
+# an assay table that gives a compound evidence worth sending to the model
+_FIBROSIS_ASSAY = {"AssayTable": {"Rows": [
+    {"AID": 1, "Name": "Cardiac fibroblast activation", "ActivityOutcome": "Active"}]}}
+
+def test_async_evaluations_overlap(monkeypatch, make_llm):
+    async def fake_arun(self, path):
+        await asyncio.sleep(0.05)
+        if "/name/" in path:
+            return {"IdentifierList": {"CID": [int(path.split("/")[3][5:]) + 1]}}
+        # evidence on every compound, so none is settled before the slow model
+        return _FIBROSIS_ASSAY if "/assaysummary/" in path else {}
+
+    monkeypatch.setattr(PubChemTool, "_arun", fake_arun)
+    llm = make_llm(delay=0.2)
+
+    async def main():
+        start = time.perf_counter()
+        outs = await asyncio.gather(*(aevaluate_drug(f"Async{i}", llm=llm) for i in range(8)))
+        return outs, time.perf_counter() - start
+
+    outs, elapsed = asyncio.run(main())
+    assert all(o["rationale"] == "mock" for o in outs)  # every one reached the LLM
+    assert len(outs[0]["tool_trace"]) == 4
+    # serially each takes 0.05 + 0.05 + 0.2 s; overlapped the whole set is ~0.3 s
+    assert elapsed < 2 * (0.05 + 0.05 + 0.2)
+
+def test_concurrent_synonyms_share_one_evaluation(monkeypatch, make_llm):
+    def fake_run(self, path):
+        if "/name/" in path:
+            return {"IdentifierList": {"CID": [99]}}
+        return _FIBROSIS_ASSAY if "/assaysummary/" in path else {}
+
+    async def fake_arun(self, path):
+        return fake_run(self, path)
+
+    monkeypatch.setattr(PubChemTool, "_run", fake_run)
+    monkeypatch.setattr(PubChemTool, "_arun", fake_arun)
+
+    llm = make_llm(delay=0.2)
+    ev = FibrosisEvaluator(llm, tool=PubChemTool(use_cache=False))
+    names = ["Givinostat", "givinostat ", "Givinostat HCl", "ITF2357"]
+    outs = [None] * len(names)
+    threads = [threading.Thread(target=lambda i=i: outs.__setitem__(i, ev.evaluate(names[i])))
+               for i in range(len(names))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert llm.calls == 1
+    assert outs[3]["tool_trace"][0] == "/compound/name/ITF2357/cids/JSON"
+    # spellings coalesced by name still report their own lookup
+    assert [o["tool_trace"][0] for o in outs] == [_cid_path(n) for n in names]
+
+    fresh_llm = make_llm(delay=0.2)
+
+    async def main():
+        fresh = FibrosisEvaluator(fresh_llm, tool=PubChemTool(use_cache=False))
+        return await asyncio.gather(*(fresh.aevaluate(n) for n in names))
+
+    aouts = asyncio.run(main())
+    assert len(aouts) == len(names)
+    assert [o["tool_trace"][0] for o in aouts] == [_cid_path(n) for n in names]
+    assert fresh_llm.calls == 1
+
+def test_unparsed_verdict_is_not_shared_with_synonyms(monkeypatch, make_llm):
+    def fake_run(self, path):
+        if "/name/" in path:  # two spellings of one compound
+            return {"IdentifierList": {"CID": [99]}}
+        return _FIBROSIS_ASSAY if "/assaysummary/" in path else {}
+
+    monkeypatch.setattr(PubChemTool, "_run", fake_run)
+    llm = make_llm({"conclusion": "positive", "relevance": 80, "rationale": "TGF-beta"})
+    replies = iter(["not json"])
+    llm._answer = lambda _messages: SimpleNamespace(content=next(replies, json.dumps(llm.reply)))
+    ev = FibrosisEvaluator(llm, tool=PubChemTool(use_cache=False), verdict_cache=VerdictCache())
+    assert ev.evaluate("Givinostat")["conclusion"] == "Indeterminate"
+    assert ev.evaluate("ITF2357")["conclusion"] == "Positive"
+    assert llm.calls == 2
+
+def test_term_matcher_agrees_with_substring_scan():
+    groups = {
+        "fibrosis": _FIBROSIS_TERMS,
+        "brd4": ("brd4", "bromodomain", "bet"),
+        "anti_fibrotic": ("anti-fibrotic", "antifibrotic", "fibrosis inhibit"),
+        "tgf": ("tgf", "transforming growth factor"),
+    }
+    vocab = list(_FIBROSIS_TERMS) + ["ctgf", "emtgf", "antifibrotic", "fibrosis inhibitor",
+                                     "between", "luciferase", "qhts", "cell"] * 2
+    rng = random.Random(7)
+    for _ in range(2000):
+        title = "".join(rng.choice(vocab) + rng.choice(["", " ", "-"]) for _ in range(rng.randint(0, 5)))
+        expected = {name for name, terms in groups.items() if any(t in title for t in terms)}
+        assert _ASSAY_MATCHER.categories(title) == expected, title
+
+def test_summarise_many_matches_per_compound():
+    rng = random.Random(11)
+    titles = ["TGF-beta cardiac fibroblast", "luciferase qHTS", "BRD4 bromodomain",
+              "anti-fibrotic collagen assay", "kinase panel", "fibrosis inhibitor screen"]
+    batch = []
+    for cid in range(30):
+        batch.append({
+            f"/compound/cid/{cid}/assaysummary/JSON": {"AssayTable": {"Rows": [
+                {"AID": i, "Name": rng.choice(titles),
+                 "ActivityOutcome": rng.choice(["Active", "Inactive"])}
+                for i in range(rng.randint(0, 80))]}},
+        })
+    assert _summarise_many(batch) == [_summarise_pubchem(records) for records in batch]
+
+def test_batched_scoring_splits_and_falls_back(monkeypatch, make_batch_llm):
+    async def fake_arun(self, path):
+        return {"IdentifierList": {"CID": []}}
+
+    monkeypatch.setattr(PubChemTool, "_arun", fake_arun)
+    # the first batch is unusable as a whole; later ones leave out a compound
+    llm = make_batch_llm(garbled=1, skip_first=True)
+    verdicts = VerdictCache()
+    ev = FibrosisEvaluator(llm, tool=PubChemTool(use_cache=False), llm_batch=10,
+                           fast_path=False, verdict_cache=verdicts)
+
+    async def main():
+        return await asyncio.gather(*(ev.aevaluate(f"drug{i}") for i in range(10)))
+
+    out = asyncio.run(main())
+    # 10 -> unparsable -> 5 + 5, each missing one compound scored alone
+    assert ev.scorer.stats == {"batch_requests": 3, "single_requests": 2}
+    assert [r["conclusion"] for r in out].count("Indeterminate") == 2
+    assert [r["rationale"] for r in out].count("batch") == 8
+    # each answered request is counted once however many compounds shared it
+    # (the unparsable first batch is not attributed to any compound)
+    assert sum(requests_from_events(r["trace_events"]) for r in out) == 2 + 2
+    # verdicts are cached under the version of the prompt that produced them
+    for r in out:
+        version = BATCH_PROMPT_VERSION if r["rationale"] == "batch" else PROMPT_VERSION
+        assert verdicts.get(verdict_key(*_llm_identity(llm), version, r["brief_hash"]))
+
+def test_parse_batch_drops_only_malformed_items():
+    reply = SimpleNamespace(content=json.dumps({"results": [
+        {"id": "0", "conclusion": "positive", "relevance": 90, "confidence": 70},
+        {"id": 1, "conclusion": None},
+        {"id": 2, "conclusion": "NEGATIVE", "relevance": "high"},
+        {"id": 3, "conclusion": "NEGATIVE", "relevance": 10.5, "rationale": "ok"},
+    ]}))
+    out = _parse_batch(reply, 4)
+    assert out[0]["conclusion"] == "Positive" and out[0]["relevance"] == 90
+    assert out[1] is None and out[2] is None
+    assert out[3]["rationale"] == "ok"
+    assert _parse_verdict(SimpleNamespace(content='{"conclusion": null}'))["conclusion"] == "Indeterminate"
+
+def test_batch_scorer_fills_batches_under_steady_arrivals(make_batch_llm):
+    llm = make_batch_llm()
+    scorer = BatchScorer(llm, max_batch=10, linger=0.1)
+
+    async def main():
+        tasks = []
+        # a batch fills in ~40 ms, well inside the linger of the one before
+        for i in range(50):
+            brief = CompoundBrief({"formula": f"C{i}"}, str(i))
+            tasks.append(asyncio.ensure_future(scorer.ascore(brief)))
+            await asyncio.sleep(0.004)
+        return await asyncio.gather(*tasks)
+
+    assert len(asyncio.run(main())) == 50
+    assert llm.sizes == [10] * 5
+
+def test_prompt_prefix_static_brief_trimmed_and_usage_recorded(monkeypatch, make_metered_llm):
+    a, b = _fibrosis_prompt({"formula": "C1"}), _fibrosis_prompt({"formula": "C2"})
+    assert a[0].content == b[0].content and "COMPOUND_BRIEF" not in a[0].content.split("\n")[-1]
+    assert a[-1].content.startswith("COMPOUND_BRIEF = ")
+
+    summary = {
+        "formula": "C22H24N4O3",
+        "detected_mechanisms": {"BRD4_inhibitor": True},
+        "assays": [{"aid": i, "title": "TGF-beta cardiac fibroblast assay " * 3,
+                    "outcome": "Active" if i % 4 == 3 else "Inactive"} for i in range(40)],
+        "descriptions": [{"source": "ChEBI", "text": "fibrosis " * 10} for _ in range(30)],
+    }
+    trimmed = _trim_summary(summary, 600)
+    assert _json_tokens(trimmed) <= 600
+    assert trimmed["detected_mechanisms"] == {"BRD4_inhibitor": True}
+    kept = trimmed["assays"]
+    active = [x for x in summary["assays"] if x["outcome"] == "Active"]
+    assert all(x in kept for x in active) and len(active) < len(kept) < 40
+    assert trimmed["omitted"] == {"assays": 40 - len(kept), "descriptions": 30}
+    assert _trim_summary(summary, None) is summary
+
+    monkeypatch.setattr(PubChemTool, "_run", lambda self, path: {"IdentifierList": {"CID": []}})
+    llm = make_metered_llm(prompt_tokens=420, completion_tokens=60, cached_tokens=384)
+    ev = FibrosisEvaluator(llm, tool=PubChemTool(use_cache=False), fast_path=False)
+    out = ev.evaluate("x")
+    assert out["usage"] == {"prompt_tokens": 420, "completion_tokens": 60, "cached_tokens": 384}
+
+def test_fast_path_skips_llm_without_evidence(monkeypatch, make_llm):
+    def fake_run(self, path):
+        name_or_cid = path.split("/")[3]
+        if "/name/" in path:
+            cids = {"unknown": [], "bare": [1], "active": [2]}[name_or_cid]
+            return {"IdentifierList": {"CID": cids}}
+        if "/assaysummary/" in path and name_or_cid == "2":
+            return _FIBROSIS_ASSAY
+        return {"PropertyTable": {"Properties": [{"MolecularFormula": "C1"}]}}
+
+    async def fake_arun(self, path):
+        return fake_run(self, path)
+
+    monkeypatch.setattr(PubChemTool, "_run", fake_run)
+    monkeypatch.setattr(PubChemTool, "_arun", fake_arun)
+    llm = make_llm()
+    ev = FibrosisEvaluator(llm, tool=PubChemTool(use_cache=False), result_ttl=0)
+    out = {n: ev.evaluate(n) for n in ("unknown", "bare", "active")}
+    assert llm.calls == 1
+    assert ev.route_counts == {"no_cid": 1, "no_evidence": 1, "model": 1}
+    assert out["unknown"]["conclusion"] == out["bare"]["conclusion"] == "Indeterminate"
+    assert "No PubChem compound" in out["unknown"]["rationale"]
+    assert out["active"]["rationale"] == "mock"
+
+    asyncio.run(ev.aevaluate("bare"))
+    assert llm.calls == 1 and ev.route_counts["no_evidence"] == 2
+
+def test_astream_emits_progress_and_tokens(monkeypatch):
+    async def fake_arun(self, path):
+        if "/name/" in path:
+            return {"IdentifierList": {"CID": [7]}}
+        return _FIBROSIS_ASSAY if "/assaysummary/" in path else {}
+
+    monkeypatch.setattr(PubChemTool, "_arun", fake_arun)
+    reply = '{"conclusion": "positive", "relevance": 80, "confidence": 60, "rationale": "TGF-beta"}'
+    llm = GenericFakeChatModel(messages=iter([AIMessage(content=reply)]))
+    ev = FibrosisEvaluator(llm, tool=PubChemTool(use_cache=False))
+
+    async def collect():
+        return [e async for e in ev.astream("JQ1")]
+
+    events = asyncio.run(collect())
+    kinds = [e["event"] for e in events]
+    assert kinds[0] == "cid" and events[0]["data"]["cid"] == 7
+    assert kinds[1:4] == ["record"] * 3 and kinds[4] == "brief"
+    tokens = [e["data"]["text"] for e in events if e["event"] == "token"]
+    assert len(tokens) > 1 and "".join(tokens) == reply
+    assert kinds[-2:] == ["verdict", "result"]
+    assert events[-1]["data"]["conclusion"] == "Positive"
+    assert events[-1]["data"]["tool_trace"][0] == "/compound/name/JQ1/cids/JSON"
@@ -0,0 +1,113 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from drug_fibrosis_agent import FibrosisEvaluator, PubChemTool
+from drug_fibrosis_agent import metrics as metrics_module
+from drug_fibrosis_agent.cache import VerdictCache
+from drug_fibrosis_agent.routing import Backend, HedgedRouter
+from drug_fibrosis_agent.usage import UsageAccumulator
+
+
+@pytest.fixture
+def client(monkeypatch, fake_pubchem, make_metered_llm):
+    # The lifespan (router and evaluator warm-up) does not run; analyses are
+    # served by an evaluator on the PubChem stand-in and a metered LLM stub
+    # with nothing cached, and usage and metrics start empty.
+    evaluator = FibrosisEvaluator(make_metered_llm(), tool=PubChemTool(use_cache=False),
+                                  verdict_cache=VerdictCache(), result_ttl=0)
+    monkeypatch.setattr(api, "get_evaluator", lambda: evaluator)
+    monkeypatch.setattr(api, "_evaluator", None)
+    monkeypatch.setattr(api, "usage", UsageAccumulator())
+    monkeypatch.setattr(metrics_module, "_default_metrics", None)
+    return TestClient(api.app)
+
+
+def _frames(text):
+    """(event, data) for each server-sent event frame in ``text``."""
+    frames = []
+    for block in text.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        frames.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return frames
+
+
+def test_stream_sends_progress_then_result(client):
+    r = client.get("/analyze_fibrosis/stream", params={"drug_name": "drug1"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    frames = [f for f in _frames(r.text) if f[0] != "token"]
+    assert [event for event, _ in frames] == [
+        "cid", "record", "record", "record", "brief", "verdict", "result"]
+    assert frames[0][1] == {"cid": 2, "path": "/compound/name/drug1/cids/JSON"}
+    assert frames[4][1]["summary"]["assays"][0]["title"] == "TGF-beta cardiac fibroblast"
+    assert frames[5][1]["conclusion"] == "Positive"
+    result = frames[-1][1]
+    assert result["conclusion"] == "Positive" and result["relevance"] == 80
+    assert result["tool_trace"][0] == "/compound/name/drug1/cids/JSON"
+
+
+def test_stream_reports_failure_as_error_event(client, fake_pubchem):
+    fake_pubchem.status = lambda path: 500
+    r = client.get("/analyze_fibrosis/stream", params={"drug_name": "drug1"})
+    assert r.status_code == 200  # the stream had started; the failure is an event
+    assert _frames(r.text) == [("error", {"detail": "500"})]
+
+
+def test_metrics_exposes_analysis_and_completion_series(client, monkeypatch):
+    async def openai(messages):
+        return SimpleNamespace(usage=SimpleNamespace(
+            prompt_tokens=12, completion_tokens=3, total_tokens=15))
+
+    monkeypatch.setattr(api, "completion_router", HedgedRouter([Backend("openai", openai)]))
+    monkeypatch.setattr(api, "COMPLETION_MODELS", {"openai": "gpt-4o-mini"})
+    messages = [{"role": "user", "content": "hi"}]
+    assert client.post("/completion", json={"messages": messages}).status_code == 200
+    assert client.post("/analyze_fibrosis", json={"drug_name": "drug1"}).status_code == 200
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = r.text.splitlines()
+    assert ("# HELP llm_completion_duration_seconds Wall time of /completion LLM calls, "
+            "by backend and whether hedged.") in lines
+    assert "# TYPE llm_completion_duration_seconds histogram" in lines
+    assert 'llm_completion_duration_seconds_count{backend="openai",hedged="False"} 1' in lines
+    assert 'fibrosis_node_duration_seconds_count{node="conclude",status="ok"} 1' in lines
+    assert 'llm_tokens_total{kind="prompt"} 300' in lines
+
+
+def test_usage_reports_what_analyses_spent(client):
+    r = client.post("/analyze_fibrosis", json={"drug_name": "drug1", "screen": "s1"})
+    assert r.status_code == 200
+    assert r.json()["usage"] == {"prompt_tokens": 300, "completion_tokens": 40,
+                                 "cached_tokens": 0}
+
+    snap = client.get("/usage", params={"screen": "s1"}).json()
+    assert (snap["requests"], snap["compounds"]) == (1, 1)
+    assert (snap["prompt_tokens"], snap["completion_tokens"]) == (300, 40)
+    assert list(snap["by_model"]) == ["stub"]
+    assert snap["by_endpoint"]["/analyze_fibrosis"]["compounds"] == 1
+    assert client.get("/usage", params={"screen": "s2"}).json()["compounds"] == 0
+
+
+def test_usage_is_recorded_for_the_serving_evaluator(client, monkeypatch):
+    serving = api.get_evaluator()
+    serving.llm.model_name = "serving"
+    monkeypatch.setattr(api, "_evaluator", serving)
+    # a different evaluator would be built now; the handler must not ask for one
+    monkeypatch.setattr(api, "get_evaluator", lambda: pytest.fail("get_evaluator called"))
+    assert client.post("/analyze_fibrosis", json={"drug_name": "drug1"}).status_code == 200
+    assert client.get("/analyze_fibrosis/stream", params={"drug_name": "drug2"}).status_code == 200
+    snap = client.get("/usage").json()
+    assert list(snap["by_model"]) == ["serving"] and snap["compounds"] == 2
+
+
+def test_completion_without_backend_is_unavailable(client, monkeypatch):
+    monkeypatch.setattr(api, "completion_router", None)
+    r = client.post("/completion", json={"messages": [{"role": "user", "content": "hi"}]})
+    assert r.status_code == 503
+    assert r.json() == {"detail": "No completion service configured"}
@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import pytest
+
+from drug_fibrosis_agent import MemoryCache, PubChemTool, PubChemTransport
+from drug_fibrosis_agent import cache as cache_module
+from drug_fibrosis_agent.batch import read_names, run_batch
+from drug_fibrosis_agent.results import ResultStore
+
+# the stand-in resolves and gives a fibrosis assay to every "drug<N>", so
+# each compound goes to the model
+_POSITIVE = {"conclusion": "Positive", "relevance": 80}
+
+def _failing(*names, status=500):
+    """``fake_pubchem.status`` failing the classification request of ``names``."""
+    cids = {f"/cid/{int(name[4:]) + 1}/classification/" for name in names}
+    return lambda path: status if any(c in path for c in cids) else 200
+
+def test_read_names_simplifies_synonyms(tmp_path):
+    src = tmp_path / "screen.tsv"
+    src.write_text("Synonyms\tHits\nGivinostat, ITF2357\t1\nJQ1 (+)\t\nGivinostat\t\n")
+    assert read_names(str(src)) == ["Givinostat", "JQ1"]
+
+def test_run_batch_resumes(tmp_path, fake_pubchem, make_llm):
+    out = tmp_path / "results.jsonl"
+    names = [f"drug{i}" for i in range(12)]
+    fake_pubchem.status = _failing("drug3")
+    llm = make_llm(_POSITIVE, delay=0.01)
+    stats = asyncio.run(run_batch(names, str(out), llm, llm_concurrency=2,
+                                  tool=PubChemTool(use_cache=False)))
+    assert stats == {"evaluated": 11, "failed": 1, "skipped": 0}
+    assert llm.peak == 2
+
+    fake_pubchem.status = lambda path: 200
+    stats = asyncio.run(run_batch(names, str(out), make_llm(_POSITIVE),
+                                  tool=PubChemTool(use_cache=False)))
+    assert stats == {"evaluated": 1, "failed": 0, "skipped": 11}
+    lines = [json.loads(l) for l in out.read_text().splitlines()]
+    assert sorted(l["drug_name"] for l in lines if "error" not in l) == sorted(names)
+
+def test_run_batch_appends_to_store(tmp_path, fake_pubchem, make_llm):
+    out = tmp_path / "screen.jsonl"
+    store = ResultStore()
+    fake_pubchem.status = _failing("drug2")
+    stats = asyncio.run(run_batch([f"drug{i}" for i in range(5)], str(out), make_llm(_POSITIVE),
+                                  tool=PubChemTool(use_cache=False), store=store))
+    assert stats["evaluated"] == 4
+    assert store.counts() == {"Positive": 4} and store.get("drug2") is None
+    row = store.query(limit=1)[0]
+    assert row["screen"] == "screen.jsonl" and row["relevance"] == 80 and row["cid"] is not None
+
+def test_run_batch_records_each_compounds_own_spend(tmp_path, fake_pubchem, make_metered_llm):
+    out = tmp_path / "screen.jsonl"
+    store = ResultStore()
+    # two spellings of CID 2: one runs the model, the other is served its result
+    asyncio.run(run_batch(["drug1", "drug01"], str(out), make_metered_llm(),
+                          tool=PubChemTool(use_cache=False),
+                          verdict_cache=cache_module.VerdictCache(), store=store))
+    lines = [json.loads(l) for l in out.read_text().splitlines()]
+    assert sorted(l["usage"]["prompt_tokens"] for l in lines) == [0, 300]
+    # reloading the file gives the same spend the run stored
+    reloaded = ResultStore()
+    reloaded.load_jsonl(str(out))
+    assert [reloaded.get(n)["usage"] for n in ("drug1", "drug01")] == \
+        [store.get(n)["usage"] for n in ("drug1", "drug01")]
+
+def test_run_batch_prefetches_next_chunk_during_evaluation(tmp_path, fake_pubchem, make_llm):
+    # name lookups and verdicts, in the order they happen
+    order = fake_pubchem.fetched
+    llm = make_llm(_POSITIVE, delay=0.05, log=order)
+    names = [f"drug{i}" for i in range(8)]
+    stats = asyncio.run(run_batch(names, str(tmp_path / "out.jsonl"), llm,
+                                  prefetch_chunk=4, tool=PubChemTool(use_cache=False)))
+    assert stats["evaluated"] == 8
+    # the second chunk was resolved before the first one's verdicts were in
+    verdicts = [i for i, x in enumerate(order) if x == "verdict"]
+    assert order.index("/compound/name/drug4/cids/JSON") < verdicts[3]
+
+def test_run_batch_closes_its_own_transport(tmp_path, monkeypatch, fake_pubchem, make_llm):
+    closed = []
+    real_aclose = PubChemTransport.aclose
+
+    async def aclose(self):
+        closed.append(self)
+        await real_aclose(self)
+
+    monkeypatch.setattr(PubChemTransport, "aclose", aclose)
+    monkeypatch.setattr(cache_module, "_default_cache", MemoryCache())
+    asyncio.run(run_batch(["drug1", "drug2"], str(tmp_path / "out.jsonl"), make_llm(_POSITIVE)))
+    assert len(closed) == 1
+    # a caller's tool is left open
+    asyncio.run(run_batch(["drug3"], str(tmp_path / "out.jsonl"), make_llm(_POSITIVE),
+                          tool=PubChemTool(use_cache=False)))
+    assert len(closed) == 1
+
+@pytest.mark.parametrize("status", [404, 500])
+def test_run_batch_survives_failed_prefetch(tmp_path, fake_pubchem, make_llm, status):
+    out = tmp_path / "out.jsonl"
+
+    def failing(path):
+        key = path.split("/")[3]
+        if key == "bad":
+            return 400  # a malformed name
+        return status if "," in key else 200
+
+    fake_pubchem.status = failing
+    names = [f"drug{i}" for i in range(4)] + ["bad"]
+    stats = asyncio.run(run_batch(names, str(out), make_llm(_POSITIVE),
+                                  tool=PubChemTool(use_cache=False)))
+    assert fake_pubchem.bulk()
+    # only the compound whose own lookup fails is lost
+    assert stats == {"evaluated": 4, "failed": 1, "skipped": 0}
+    rows = {rec["drug_name"]: rec for rec in map(json.loads, out.read_text().splitlines())}
+    assert rows["bad"]["error"].startswith("HTTPStatusError")
+    assert all(rows[n]["conclusion"] == "Positive" for n in names[:4])
@@ -0,0 +1,154 @@
+import time
+
+import httpx
+import pytest
+
+from drug_fibrosis_agent import PubChemTool, PubChemTransport
+from drug_fibrosis_agent.cache import (
+    CacheMiss,
+    DiskCache,
+    MemoryCache,
+    TieredCache,
+    endpoint_of,
+)
+
+def _counting_transport(calls):
+    return PubChemTransport(transport=httpx.MockTransport(
+        lambda req: calls.append(req.url.path) or httpx.Response(200, json={"p": req.url.path})
+    ))
+
+def test_endpoint_of():
+    assert endpoint_of("/compound/name/JQ1/cids/JSON") == "cids"
+    assert endpoint_of("/compound/cid/1/property/MolecularFormula/JSON") == "property"
+    assert endpoint_of("/compound/cid/1/assaysummary/JSON") == "assaysummary"
+
+def test_disk_cache_roundtrip_and_ttl(tmp_path):
+    cache = DiskCache(str(tmp_path / "pc.sqlite"), ttls={"assaysummary": 0.05})
+    cache.set("/compound/cid/1/assaysummary/JSON", {"AssayTable": {"Rows": []}})
+    cache.set("/compound/cid/1/property/X/JSON", {"PropertyTable": {}})
+    assert cache.get("/compound/cid/1/assaysummary/JSON") == {"AssayTable": {"Rows": []}}
+    time.sleep(0.1)
+    assert cache.get("/compound/cid/1/assaysummary/JSON") is None
+    assert cache.get("/compound/cid/1/property/X/JSON") == {"PropertyTable": {}}
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["expired"] == 1 and stats["entries"] == 1
+
+def test_disk_cache_evicts_least_recently_read(tmp_path):
+    cache = DiskCache(str(tmp_path / "pc.sqlite"), max_bytes=2_000)
+    blob = {"rows": list(range(200))}
+    for cid in range(10):
+        cache.set(f"/compound/cid/{cid}/property/X/JSON", {**blob, "cid": cid})
+        cache.get("/compound/cid/0/property/X/JSON")
+    assert cache.stats()["evictions"] > 0
+    assert cache.stats()["bytes"] <= 2_000
+    assert cache.get("/compound/cid/0/property/X/JSON") is not None
+    assert cache.get("/compound/cid/1/property/X/JSON") is None
+
+def test_rewrites_do_not_inflate_cache_size(tmp_path):
+    from drug_fibrosis_agent.cache import VerdictCache
+
+    cache = DiskCache(str(tmp_path / "pc.sqlite"), max_bytes=4_000)
+    for _ in range(50):
+        cache.set("/compound/cid/1/property/X/JSON", {"rows": list(range(200))})
+    stats = cache.stats()
+    assert stats["evictions"] == 0 and stats["entries"] == 1
+    assert stats["bytes"] == cache._stored_bytes()
+
+    verdicts = VerdictCache(max_entries=3)
+    for _ in range(5):
+        verdicts.set("same", {"conclusion": "Positive"})
+    assert verdicts.stats()["entries"] == 1 and verdicts.evictions == 0
+    for key in "abcd":
+        verdicts.set(key, {"conclusion": "Negative"})
+    assert verdicts.stats()["entries"] == 3 and verdicts.evictions == 2
+    assert verdicts.get("d") == {"conclusion": "Negative"}
+
+def test_repeat_screen_is_served_from_disk(tmp_path):
+    calls = []
+    path = str(tmp_path / "pc.sqlite")
+    warm = PubChemTool(transport=_counting_transport(calls),
+                       cache=TieredCache(MemoryCache(), DiskCache(path)))
+    warm.run("/compound/name/JQ1/cids/JSON")
+    assert len(calls) == 1
+
+    # a fresh process-equivalent: new memory tier, same file, no network allowed
+    cold = PubChemTool(transport=_counting_transport(calls),
+                       cache=TieredCache(MemoryCache(), DiskCache(path)), offline=True)
+    assert cold.run("/compound/name/JQ1/cids/JSON") == {"p": "/rest/pug/compound/name/JQ1/cids/JSON"}
+    assert len(calls) == 1
+    with pytest.raises(CacheMiss):
+        cold.run("/compound/name/Unseen/cids/JSON")
+
+def test_verdict_cache_skips_llm_for_identical_briefs(monkeypatch):
+    import json
+    from types import SimpleNamespace
+    from drug_fibrosis_agent import FibrosisEvaluator
+    from drug_fibrosis_agent.cache import VerdictCache
+
+    class CountingLLM:
+        model_name, temperature, calls = "stub", 0, 0
+        def bind(self, **_unused):
+            return self
+        def invoke(self, _prompt):
+            CountingLLM.calls += 1
+            return SimpleNamespace(content=json.dumps({"conclusion": "positive", "relevance": 90}))
+
+    def fake_run(self, path):
+        if "/name/" in path:  # two salt forms of one compound
+            return {"IdentifierList": {"CID": [5]}}
+        if "/assaysummary/" in path:
+            return {"AssayTable": {"Rows": [{"Name": "TGF-beta fibrosis", "ActivityOutcome": "Active"}]}}
+        return {"PropertyTable": {"Properties": [{"MolecularFormula": "C5"}]}} if "/property/" in path else {}
+
+    monkeypatch.setattr(PubChemTool, "_run", fake_run)
+    verdicts = VerdictCache()
+    ev = FibrosisEvaluator(CountingLLM(), verdict_cache=verdicts, result_ttl=0)
+    first, second = ev.evaluate("Drug HCl"), ev.evaluate("Drug")
+    assert CountingLLM.calls == 1
+    assert first["conclusion"] == second["conclusion"] == "Positive"
+    assert verdicts.stats()["hit_rate"] == 0.5
+
+def test_async_path_keeps_sqlite_off_the_event_loop(tmp_path):
+    import asyncio
+    import threading
+    from types import SimpleNamespace
+    from drug_fibrosis_agent.agent import CompoundBrief, aanalyze_fibrosis
+    from drug_fibrosis_agent.cache import VerdictCache
+
+    loop_threads = []
+
+    def note(method):
+        def wrapper(self, *args, **kwargs):
+            loop_threads.append(threading.current_thread() is threading.main_thread())
+            return method(self, *args, **kwargs)
+        return wrapper
+
+    class WatchedDisk(DiskCache):
+        get, set = note(DiskCache.get), note(DiskCache.set)
+
+    class WatchedVerdicts(VerdictCache):
+        get, set = note(VerdictCache.get), note(VerdictCache.set)
+
+    class AsyncLLM:
+        model_name, temperature = "stub", 0
+        def bind(self, **_unused):
+            return self
+        async def ainvoke(self, _prompt):
+            return SimpleNamespace(content='{"conclusion": "Positive", "rationale": "r"}')
+
+    mock = httpx.MockTransport(lambda req: httpx.Response(200, json={"ok": 1}))
+    tool = PubChemTool(transport=PubChemTransport(async_transport=mock),
+                       cache=TieredCache(MemoryCache(), WatchedDisk(str(tmp_path / "pc.sqlite"))))
+    brief = CompoundBrief.from_records({})
+
+    async def main():
+        await tool.arun("/compound/cid/1/property/X/JSON")  # miss, fetch, store
+        await tool.arun("/compound/cid/1/property/X/JSON")  # memory hit
+        state = {"brief": brief, "trace": []}
+        verdicts = WatchedVerdicts()
+        await aanalyze_fibrosis(state, AsyncLLM(), verdicts)
+        return await aanalyze_fibrosis(state, AsyncLLM(), verdicts)
+
+    assert asyncio.run(main())["verdict_cached"] is True
+    # disk get + set, verdict get + set, verdict get: all on worker threads
+    assert loop_threads == [False] * 5
@@ -0,0 +1,80 @@
+import asyncio
+
+import httpx
+
+from drug_fibrosis_agent import FibrosisEvaluator, MemoryCache, PubChemTool, PubChemTransport
+from drug_fibrosis_agent.cache import VerdictCache
+from drug_fibrosis_agent import metrics as metrics_module
+from drug_fibrosis_agent.metrics import Metrics, add_sink, remove_sink
+
+
+def _pubchem(request):
+    path = request.url.path
+    if "/name/" in path:
+        body = {"IdentifierList": {"CID": [7]}}
+    elif "/assaysummary/" in path:
+        body = {"AssayTable": {"Rows": [{"Name": "TGF-beta fibrosis", "ActivityOutcome": "Active"}]}}
+    else:
+        body = {"PropertyTable": {"Properties": [{"MolecularFormula": "C7"}]}}
+    return httpx.Response(200, json=body, headers={"X-Throttling-Control": "status: Green (0%)"})
+
+
+def _tool(cache):
+    async def ahandler(request):
+        return _pubchem(request)
+
+    return PubChemTool(cache=cache, transport=PubChemTransport(
+        transport=httpx.MockTransport(_pubchem), async_transport=httpx.MockTransport(ahandler),
+    ))
+
+
+def test_render_prometheus_text():
+    m = Metrics(buckets=(0.1, 1.0))
+    m.inc("hits_total", endpoint="assaysummary")
+    m.inc("hits_total", 2, endpoint="assaysummary")
+    m.observe("latency_seconds", 0.5, node='say "hi"')
+    text = m.render()
+    assert 'hits_total{endpoint="assaysummary"} 3' in text
+    assert 'latency_seconds_bucket{node="say \\"hi\\"",le="0.1"} 0' in text
+    assert 'latency_seconds_bucket{node="say \\"hi\\"",le="+Inf"} 1' in text
+    assert 'latency_seconds_count{node="say \\"hi\\""} 1' in text
+    assert "# TYPE latency_seconds histogram" in text
+
+
+def test_evaluation_reports_node_and_http_events(monkeypatch, make_metered_llm):
+    metrics = Metrics()
+    # swapped in for this test only; later tests get the original registry
+    monkeypatch.setattr(metrics_module, "_default_metrics", metrics)
+    seen = []
+    add_sink(seen.append)
+    try:
+        cache = MemoryCache()
+        out = FibrosisEvaluator(make_metered_llm(), tool=_tool(cache), verdict_cache=VerdictCache(),
+                                result_ttl=0).evaluate("Drug")
+    finally:
+        remove_sink(seen.append)
+    events = out["trace_events"]
+    assert events == seen
+    nodes = [e["name"] for e in events if e["kind"] == "node"]
+    assert nodes == ["identify_cid", "fetch_details", "analyze_fibrosis", "conclude"]
+    analyze = next(e for e in events if e.get("name") == "analyze_fibrosis")
+    assert (analyze["prompt_tokens"], analyze["completion_tokens"]) == (300, 40)
+    assert analyze["verdict_cached"] is False and analyze["duration_s"] >= 0
+
+    http = [e for e in events if e["kind"] == "http"]
+    # the graph starts from the evaluator's name lookup instead of repeating it
+    misses = [e for e in http if e["cache"] == "miss"]
+    assert len(misses) == len(http) == 4 and all(e["status"] == 200 for e in misses)
+    assert all(e["bytes"] > 0 for e in misses if e["endpoint"] != "assaysummary")
+    assert all(e["retries"] == 0 and e["limiter_wait_s"] >= 0 for e in misses)
+    assert out["tool_trace"] == [e["path"] for e in http]
+
+    assert metrics.value("pubchem_requests_total", endpoint="assaysummary",
+                         cache="miss", status=200) == 1
+    assert metrics.value("llm_tokens_total", kind="prompt") == 300
+    assert 'fibrosis_node_duration_seconds_count{node="conclude",status="ok"} 1' in metrics.render()
+
+    # a second run is served from the response cache and says so
+    again = asyncio.run(FibrosisEvaluator(make_metered_llm(), tool=_tool(cache), result_ttl=0)
+                        .aevaluate("Drug"))
+    assert {e["cache"] for e in again["trace_events"] if e["kind"] == "http"} == {"hit"}
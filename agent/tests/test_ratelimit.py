@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from drug_fibrosis_agent import PubChemTool, PubChemTransport
+from drug_fibrosis_agent.cache import MemoryCache
+from drug_fibrosis_agent.ratelimit import (
+    SharedTokenBucket, TokenBucket, _Bucket, throttle_factor,
+)
+
+def test_throttle_factor_uses_worst_status():
+    header = ("Request Count status: Green (0%), Request Time status: Yellow (55%), "
+              "Service status: Green (20%)")
+    assert throttle_factor(header) == 0.5
+    assert throttle_factor(None) is None
+
+def test_buckets_must_implement_storage():
+    class Partial(_Bucket):
+        def _reserve(self, tokens):
+            return 0.0
+
+    with pytest.raises(TypeError):
+        Partial(1.0, 1.0)
+
+def test_bucket_caps_rate_across_threads():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=bucket.acquire) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert time.perf_counter() - start >= 19 / 50 * 0.9
+
+def test_bucket_is_asyncio_aware():
+    bucket = TokenBucket(rate=50, capacity=1)
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(*(bucket.aacquire() for _ in range(10)))
+        return time.perf_counter() - start
+
+    assert asyncio.run(main()) >= 9 / 50 * 0.9
+
+def test_shared_bucket_spans_instances(tmp_path):
+    path = str(tmp_path / "bucket.sqlite")
+    a, b = SharedTokenBucket(path, rate=20, capacity=1), SharedTokenBucket(path, rate=20, capacity=1)
+    assert a.acquire() == 0
+    assert b.acquire() > 0  # the second "process" sees the first one's spend
+    a.set_rate(10)
+    assert b.rate == 10
+
+def test_tool_adapts_and_retries_on_503():
+    responses = iter([
+        httpx.Response(503, headers={"Retry-After": "0"}),
+        httpx.Response(200, json={"ok": True},
+                       headers={"X-Throttling-Control": "Request Count status: Red (90%)"}),
+    ])
+    bucket = TokenBucket(rate=1000, capacity=5)
+    tool = PubChemTool(
+        transport=PubChemTransport(transport=httpx.MockTransport(lambda req: next(responses))),
+        cache=MemoryCache(), limiter=bucket,
+    )
+    assert tool.run("/compound/cid/1/property/X/JSON") == {"ok": True}
+    assert bucket.rate <= 1000 * 0.2
+
+def test_shared_bucket_adapts_off_the_event_loop(tmp_path):
+    responses = iter([
+        httpx.Response(503, headers={"Retry-After": "0"}),
+        httpx.Response(200, json={"ok": True},
+                       headers={"X-Throttling-Control": "Request Count status: Red (90%)"}),
+    ])
+    threads = []
+
+    class WatchedBucket(SharedTokenBucket):
+        def _update(self, tokens, rate=None):
+            threads.append(threading.get_ident())
+            return super()._update(tokens, rate)
+
+    bucket = WatchedBucket(str(tmp_path / "bucket.sqlite"), rate=1000, capacity=5)
+    mock = httpx.MockTransport(lambda req: next(responses))
+    tool = PubChemTool(
+        transport=PubChemTransport(transport=mock, async_transport=mock),
+        cache=MemoryCache(), limiter=bucket,
+    )
+    assert asyncio.run(tool.arun("/compound/cid/1/property/X/JSON")) == {"ok": True}
+    assert bucket.rate <= 1000 * 0.2
+    # acquires, the 503 penalty and the Red observation all left the loop thread
+    assert len(threads) == 4 and threading.get_ident() not in threads
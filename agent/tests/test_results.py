@@ -0,0 +1,71 @@
+import csv
+import json
+
+import pytest
+
+from drug_fibrosis_agent.results import ResultStore, main
+
+
+def _result(name, conclusion="Positive", relevance=80, confidence=70, cid=None, **extra):
+    return {"drug_name": name, "conclusion": conclusion, "relevance": relevance,
+            "confidence": confidence, "cid": cid, "rationale": "r", "brief_hash": "h", **extra}
+
+
+def test_upsert_by_normalised_name_keeps_created(tmp_path):
+    store = ResultStore(str(tmp_path / "results.sqlite3"))
+    assert store.append([_result("JQ1", cid=46907762)], model="gpt-4o-mini", screen="s1") == 1
+    first = store.query()[0]
+    store.append([_result(" jq1 ", relevance=95, cid=46907762), {"drug_name": "x", "error": "boom"}])
+    assert len(store) == 1
+    row = store.query()[0]
+    assert row["relevance"] == 95 and row["created"] == first["created"]
+    assert row["updated"] >= first["updated"]
+    assert store.get("JQ1")["relevance"] == 95
+    assert [r["drug_name"] for r in store.by_cid(46907762)] == [" jq1 "]
+    assert store.get("missing") is None
+    store.close()
+
+
+def test_filtered_queries_over_many_rows():
+    store = ResultStore()
+    conclusions = ["Positive", "Negative", "Indeterminate"]
+    store.append(_result(f"drug{i}", conclusions[i % 3], i % 101, (i * 7) % 101, cid=i)
+                 for i in range(10_000))
+    assert len(store) == 10_000
+    assert sum(store.counts().values()) == 10_000
+
+    top = store.query(conclusion="Positive", min_relevance=90, min_confidence=50, limit=25)
+    assert len(top) == 25
+    assert all(r["conclusion"] == "Positive" and r["relevance"] >= 90
+               and r["confidence"] >= 50 for r in top)
+    assert [r["relevance"] for r in top] == sorted((r["relevance"] for r in top), reverse=True)
+
+    by_conf = store.query(order_by="confidence", descending=False, limit=3)
+    assert [r["confidence"] for r in by_conf] == [0, 0, 0]
+    assert store.query(conclusion="Negative", limit=1, full=True)[0]["rationale"] == "r"
+    with pytest.raises(ValueError):
+        store.query(order_by="relevance; DROP TABLE results")
+
+
+def test_load_jsonl_and_export_csv(tmp_path, capsys):
+    src = tmp_path / "screen.jsonl"
+    rows = [_result("a", relevance=10), _result("b", "Negative", 30),
+            {"drug_name": "c", "error": "boom"}]
+    src.write_text("".join(json.dumps(r) + "\n" for r in rows) + '{"drug_name": "trunc')
+    db, out = str(tmp_path / "r.sqlite3"), tmp_path / "ranked.csv"
+
+    assert main([db, "--load", str(src)]) == 0
+    assert main([db, "--export", str(out), "--screen", "screen.jsonl"]) == 0
+    exported = list(csv.DictReader(out.open()))
+    assert [r["drug_name"] for r in exported] == ["b", "a"]
+    assert exported[0]["screen"] == "screen.jsonl"
+
+    loose = tmp_path / "Givinostat_evaluation.json"
+    loose.write_text(json.dumps({k: v for k, v in _result("x", relevance=5).items()
+                                 if k != "drug_name"}))
+    assert main([db, "--load", str(loose)]) == 0
+    assert ResultStore(db).get("givinostat")["relevance"] == 5
+    assert ResultStore(db).query(screen="Givinostat_evaluation.json")[0]["drug_name"] == "Givinostat"
+
+    assert main([db, "--conclusion", "Positive", "--min-relevance", "10"]) == 0
+    assert capsys.readouterr().out.split() == ["10", "70", "Positive", "a"]
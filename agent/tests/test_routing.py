@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from drug_fibrosis_agent.routing import Backend, HedgedRouter, LatencyWindow
+
+
+def stub(name, delay, fail=False, log=None):
+    async def call(**request):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(f"{name} cancelled")
+            raise
+        if fail:
+            raise RuntimeError(f"{name} down")
+        return {"from": name, **request}
+    return Backend(name, call)
+
+
+def test_latency_window_percentile():
+    window = LatencyWindow(size=100)
+    assert window.percentile(0.95) is None
+    for ms in range(1, 101):
+        window.record(ms / 1000)
+    assert window.percentile(0.5) == 0.05
+    assert window.percentile(0.95) == 0.095
+
+
+def test_fast_primary_wins_without_hedging():
+    router = HedgedRouter([stub("modal", 0.01), stub("openai", 0.01)], initial_deadline=0.5)
+    out = asyncio.run(router.acompletion(messages=[]))
+    assert (out.backend, out.hedged, out.response["from"]) == ("modal", False, "modal")
+    assert router.stats["hedges"] == 0
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    log = []
+    router = HedgedRouter(
+        [stub("modal", 5.0, log=log), stub("openai", 0.02)],
+        initial_deadline=0.05, min_deadline=0.01,
+    )
+    out = asyncio.run(asyncio.wait_for(router.acompletion(messages=[]), 1.0))
+    assert (out.backend, out.hedged) == ("openai", True)
+    assert out.latency < 0.5
+    assert log == ["modal cancelled"]
+    assert router.stats["wins"] == {"openai": 1} and router.stats["hedges"] == 1
+
+
+def test_deadline_follows_primary_latency():
+    primary = stub("modal", 0.0)
+    router = HedgedRouter([primary, stub("openai", 0.0)], initial_deadline=9.0,
+                          min_deadline=0.01, min_samples=5)
+    assert router.deadline(primary) == 9.0
+    for _ in range(10):
+        primary.latency.record(0.2)
+    assert router.deadline(primary) == 0.2
+
+
+def test_failure_falls_through_and_all_failing_raises():
+    router = HedgedRouter([stub("modal", 0.0, fail=True), stub("openai", 0.01)])
+    out = asyncio.run(router.acompletion(messages=[]))
+    assert (out.backend, out.hedged) == ("openai", False)
+    assert router.stats["failures"] == {"modal": 1}
+
+    broken = HedgedRouter([stub("modal", 0.0, fail=True), stub("openai", 0.0, fail=True)])
+    with pytest.raises(RuntimeError, match="openai down"):
+        asyncio.run(broken.acompletion(messages=[]))
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import random
+
+import httpx
+
+from drug_fibrosis_agent import PubChemTool, PubChemTransport
+from drug_fibrosis_agent.agent import (
+    _keep_assay_rows, _split_assays, _summarise_pubchem, prefetch_details,
+)
+from drug_fibrosis_agent.cache import MemoryCache
+from drug_fibrosis_agent.streaming import aiter_json_array, iter_json_array
+
+
+def _split(text, rng):
+    cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, 40)))
+    return [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+
+
+def _assay_table(n):
+    names = ["TGF-beta cardiac fibroblast", "luciferase qHTS", "BRD4 bromodomain",
+             "anti-fibrotic collagen assay", "kinase panel"]
+    rows = [{"AID": i, "Name": names[i % len(names)] + ' "x" [1]',
+             "ActivityOutcome": "Active" if i % 3 else "Inactive"} for i in range(n)]
+    return {"AssayTable": {"Columns": {"Column": ["AID"]}, "Rows": rows}}
+
+
+def test_iter_json_array_any_chunking():
+    blob = _assay_table(60)
+    text = json.dumps(blob, indent=1)
+    rng = random.Random(3)
+    for _ in range(50):
+        chunks = _split(text, rng)
+        assert list(iter_json_array(chunks, "Rows")) == blob["AssayTable"]["Rows"]
+
+    async def agen():
+        for c in _split(text, rng):
+            yield c
+
+    async def collect():
+        return [row async for row in aiter_json_array(agen(), "Rows")]
+
+    assert asyncio.run(collect()) == blob["AssayTable"]["Rows"]
+
+
+def test_scalars_split_across_chunks_stay_whole():
+    assert list(iter_json_array(['{"Rows":[12', '34, 5]}'], "Rows")) == [1234, 5]
+    assert list(iter_json_array(['{"Rows":[1.', '5e', '2, tr', 'ue]}'], "Rows")) == [150.0, True]
+    # a body cut short inside the array still yields its last number
+    assert list(iter_json_array(['{"Rows":[7, 8'], "Rows")) == [7, 8]
+
+    async def agen():
+        for c in ['{"Rows":[12', '34, 5', '6]}']:
+            yield c
+
+    async def collect():
+        return [row async for row in aiter_json_array(agen(), "Rows")]
+
+    assert asyncio.run(collect()) == [1234, 56]
+
+
+def test_streamed_assays_summarise_like_full_table():
+    blob = _assay_table(2000)
+    body = json.dumps(blob).encode()
+    sent = []
+
+    def handler(request):
+        def chunks():
+            for i in range(0, len(body), 4096):
+                sent.append(i)
+                yield body[i:i + 4096]
+        return httpx.Response(200, content=chunks())
+
+    path = "/compound/cid/1/assaysummary/JSON"
+    transport = PubChemTransport(transport=httpx.MockTransport(handler))
+    tool = PubChemTool(transport=transport, use_cache=False)
+    streamed = tool._run(path)
+    assert _summarise_pubchem({path: streamed}) == _summarise_pubchem({path: blob})
+    assert len(streamed["AssayTable"]["Rows"]) < len(blob["AssayTable"]["Rows"])
+    assert len(sent) < len(body) // 4096  # stopped reading early
+
+    # decoded whole or split from a bulk request, the same rows are cached
+    plain = PubChemTool(transport=transport, use_cache=False, stream_assays=False)
+    assert plain._run(path) == streamed
+    bulk = {"AssayTable": {"Rows": [
+        {"CID": cid, **row} for row in blob["AssayTable"]["Rows"] for cid in (1, 2)]}}
+    split = _split_assays(bulk, [1, 2])
+    assert split[1] == {"AssayTable": {"Rows": [
+        {"CID": 1, **row} for row in streamed["AssayTable"]["Rows"]]}}
+
+    async def ahandler(request):
+        async def chunks():
+            for i in range(0, len(body), 4096):
+                yield body[i:i + 4096]
+        return httpx.Response(200, content=chunks())
+
+    async_transport = PubChemTransport(async_transport=httpx.MockTransport(ahandler))
+    atool = PubChemTool(transport=async_transport, use_cache=False)
+    assert asyncio.run(atool._arun(path)) == streamed
+
+
+def test_bulk_assays_split_while_streaming():
+    rows = _assay_table(2000)["AssayTable"]["Rows"]
+    bulk = {"AssayTable": {"Rows": [{"CID": cid, **row} for row in rows for cid in (1, 2)]}}
+    body = json.dumps(bulk).encode()
+    sent = []
+
+    def handler(request):
+        if "/property/" in request.url.path:
+            return httpx.Response(200, json={"PropertyTable": {"Properties": []}})
+
+        def chunks():
+            for i in range(0, len(body), 4096):
+                sent.append(i)
+                yield body[i:i + 4096]
+        return httpx.Response(200, content=chunks())
+
+    cache = MemoryCache()
+    tool = PubChemTool(transport=PubChemTransport(transport=httpx.MockTransport(handler)),
+                       cache=cache)
+    assert prefetch_details([1, 2], tool) == 2
+    # each CID is cached with the rows it would keep on its own request
+    kept = _keep_assay_rows(iter(rows))["AssayTable"]["Rows"]
+    for cid in (1, 2):
+        assert cache.get(f"/compound/cid/{cid}/assaysummary/JSON") == {
+            "AssayTable": {"Rows": [{"CID": cid, **row} for row in kept]}}
+    assert len(sent) < len(body) // 4096  # stopped once both CIDs were done
@@ -0,0 +1,98 @@
+import sqlite3
+import threading
+
+import pytest
+
+from drug_fibrosis_agent.usage import (
+    UsageAccumulator, cost_of, requests_from_events, usage_from_events,
+)
+
+
+def test_cost_uses_each_models_prices():
+    assert cost_of("llama3.1-modal", 1_000_000, 1_000_000) == pytest.approx(0.50)
+    # OpenAI bills cached prompt tokens at half the input price
+    assert cost_of("gpt-4o-mini", 1_000_000, 0, cached_tokens=400_000) == pytest.approx(0.12)
+    assert cost_of("gpt-4o-mini", 0, 1_000_000) == pytest.approx(0.60)
+    assert cost_of("no-such-model", 10, 10) is None
+
+
+def test_usage_from_events_counts_only_spent_tokens():
+    events = [
+        {"kind": "http", "cache": "hit"},
+        {"kind": "node", "name": "fetch_details"},
+        {"kind": "node", "name": "analyze_fibrosis", "prompt_tokens": 900,
+         "completion_tokens": 80, "cached_tokens": 512},
+    ]
+    assert usage_from_events(events) == {
+        "prompt_tokens": 900, "completion_tokens": 80, "cached_tokens": 512}
+    assert usage_from_events([]) == {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+
+
+def test_requests_count_only_model_calls():
+    events = [
+        {"kind": "node", "name": "analyze_fibrosis", "prompt_tokens": 300, "llm_requests": 1},
+        {"kind": "node", "name": "analyze_fibrosis", "prompt_tokens": 300, "llm_requests": 0},
+        {"kind": "node", "name": "rule_verdict", "route": "no_cid"},
+        {"kind": "http", "cache": "miss"},
+    ]
+    assert requests_from_events(events) == 1
+    acc = UsageAccumulator()
+    acc.record("gpt-4o-mini", "batch", 300, 20, compounds=1, requests=1)
+    acc.record("gpt-4o-mini", "batch", 300, 20, compounds=1, requests=0)  # shared batch call
+    acc.record("gpt-4o-mini", "batch", compounds=1, requests=0)  # verdict cache hit
+    snap = acc.snapshot()
+    assert snap["requests"] == 1 and snap["compounds"] == 3
+
+
+def test_concurrent_records_are_all_counted():
+    acc = UsageAccumulator()
+
+    def worker(i):
+        for _ in range(500):
+            acc.record("gpt-4o-mini", "/analyze_fibrosis", 1000, 100, compounds=1,
+                       screen=f"screen{i % 2}")
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    snap = acc.snapshot()
+    assert snap["requests"] == snap["compounds"] == 4000
+    assert snap["prompt_tokens"] == 4_000_000 and snap["tokens_per_s"] > 0
+    assert snap["cost"] == pytest.approx(4000 * cost_of("gpt-4o-mini", 1000, 100))
+    assert snap["cost_per_compound"] == pytest.approx(cost_of("gpt-4o-mini", 1000, 100))
+    assert set(snap["by_screen"]) == {"screen0", "screen1"}
+    assert acc.snapshot(screen="screen0")["compounds"] == 2000
+
+
+def test_snapshot_breakdown_and_unpriced_models():
+    acc = UsageAccumulator()
+    acc.record("llama3.1-modal", "/completion", 2000, 500)
+    acc.record("gpt-4o-mini", "/completion", 1000, 100)
+    acc.record("mystery", "/analyze_fibrosis", 10, 10, compounds=1)
+    snap = acc.snapshot(since=60)
+    assert set(snap["by_model"]) == {"llama3.1-modal", "gpt-4o-mini", "mystery"}
+    assert snap["by_endpoint"]["/completion"]["requests"] == 2
+    assert snap["by_endpoint"]["/completion"]["cost_per_compound"] is None
+    assert snap["by_model"]["mystery"]["cost"] == 0
+    assert snap["unpriced_models"] == ["mystery"]
+
+
+def test_flush_adds_new_counts_to_sqlite(tmp_path):
+    path = tmp_path / "usage.sqlite3"
+    acc = UsageAccumulator(str(path), window=3600)
+    assert acc.flush() == 0
+    acc.record("gpt-4o-mini", "batch", 1000, 100, compounds=1, screen="s1")
+    acc.record("gpt-4o-mini", "batch", 1000, 100, compounds=1, screen="s1")
+    assert acc.flush() == 1
+    acc.record("gpt-4o-mini", "batch", 500, 50, compounds=1, screen="s1")
+    acc.close()
+
+    rows = sqlite3.connect(path).execute(
+        "SELECT SUM(requests), SUM(compounds), SUM(prompt_tokens), SUM(completion_tokens) "
+        "FROM usage WHERE screen = 's1'"
+    ).fetchone()
+    assert rows == (3, 3, 2500, 250)
+    # in-memory totals are unaffected by flushing
+    assert acc.snapshot()["prompt_tokens"] == 2500